@@ -1,8 +1,106 @@
 """核心 Agent 类"""
-from typing import List, Dict, Optional
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, List, Dict, Optional
 from kimi_client import KimiClient
 from tools import SearchTool, AnalysisTool, EducationKnowledgeBase
 from config import Config
+from context_packer import pack_context
+from memory import ConversationMemory
+from question_classifier import RouteLatency, get_default_classifier
+
+
+# 出现这些词的步骤需要用到前面所有步骤的结果
+DEPENDENCY_MARKERS = ("上一步", "前面", "以上", "上述", "综合", "汇总", "总结", "整合")
+
+_CN_DIGITS = {"一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9, "十": 10}
+_STEP_LABEL = re.compile(r"^第[一二三四五六七八九十\d]+步[:：]?\s*")
+_STEP_REF = re.compile(r"(?:步骤\s*(\d+))|(?:第([一二三四五六七八九十\d]+)步)")
+
+
+def _parse_step_number(text: str) -> int:
+    if text.isdigit():
+        return int(text)
+    return _CN_DIGITS.get(text, 0)
+
+
+def build_step_dependencies(steps: List[str]) -> Dict[int, List[int]]:
+    """
+    根据步骤描述构建依赖关系（DAG）
+    
+    - 显式引用"步骤N"/"第N步"的，依赖第 N 步
+    - 含有"综合""上述"等汇总类词语的，依赖之前的所有步骤
+    - 其余步骤只依赖原始问题，可以并行执行
+    
+    Args:
+        steps: 规划步骤列表
+    
+    Returns:
+        {步骤序号: [依赖的步骤序号]}，序号从 1 开始
+    """
+    dependencies = {}
+    for i, step in enumerate(steps, 1):
+        body = _STEP_LABEL.sub("", step.strip())
+        deps = set()
+        for digits, cn in _STEP_REF.findall(body):
+            n = _parse_step_number(digits or cn)
+            if 0 < n < i:
+                deps.add(n)
+        if any(marker in body for marker in DEPENDENCY_MARKERS):
+            deps.update(range(1, i))
+        dependencies[i] = sorted(deps)
+    return dependencies
+
+
+class RetrievalContext:
+    """
+    单次运行内的检索上下文
+    
+    同一个查询只真正检索一次，之后的步骤（以及并行执行的步骤）
+    直接复用结果；并发请求同一查询时，后来者等待第一个完成。
+    """
+    
+    def __init__(self, resolver: Callable[[str], Optional[str]]):
+        """
+        Args:
+            resolver: 实际执行检索的函数 resolver(query) -> 检索结果
+        """
+        self._resolver = resolver
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Future] = {}
+        self.lookups = 0
+    
+    def get(self, query: str) -> Optional[str]:
+        """
+        获取查询的检索结果
+        
+        Args:
+            query: 检索查询
+        
+        Returns:
+            检索到的信息
+        """
+        with self._lock:
+            self.lookups += 1
+            future = self._entries.get(query)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._entries[query] = future
+        
+        if owner:
+            try:
+                future.set_result(self._resolver(query))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+    
+    @property
+    def resolved(self) -> int:
+        """实际执行检索的次数"""
+        return len(self._entries)
 
 
 class EducationAgent:
@@ -13,7 +111,9 @@ class EducationAgent:
         self.search_tool = SearchTool()
         self.analysis_tool = AnalysisTool()
         self.knowledge_base = EducationKnowledgeBase()
-        self.conversation_history = []
+        self.memory = ConversationMemory(summarizer=self.llm.summarize_conversation)
+        self.classifier = get_default_classifier()
+        self.route_latency = RouteLatency()
     
     def plan(self, question: str) -> List[str]:
         """
@@ -32,26 +132,47 @@ class EducationAgent:
             print(f"  {i}. {step}")
         return steps
     
-    def retrieve(self, question: str, step: str) -> Optional[str]:
+    def retrieve(self, question: str, step: str,
+                 retrieval: Optional[RetrievalContext] = None) -> Optional[str]:
         """
         检索相关信息
         
         Args:
             question: 原始问题
             step: 当前步骤
+            retrieval: 本次运行的检索上下文，提供时复用已有检索结果
         
         Returns:
             检索到的信息
         """
         print(f"\n🔍 正在检索：{step}")
+        if retrieval is not None:
+            return retrieval.get(question)
+        return self._search(question)
+    
+    def _search(self, question: str) -> Optional[str]:
+        """
+        依次检索知识库和网络
+        
+        Args:
+            question: 检索查询
         
+        Returns:
+            检索到的信息
+        """
         # 1. 先搜索知识库
         kb_result = self.knowledge_base.search(question)
         if kb_result:
             print(f"  ✓ 从知识库找到相关信息")
             return kb_result
         
-        # 2. 网络搜索
+        # 2. 知识库向量检索（匹配换了说法的问题）
+        semantic_hits = self.knowledge_base.semantic_search(question)
+        if semantic_hits:
+            print(f"  ✓ 从知识库语义匹配到 {len(semantic_hits)} 条信息")
+            return "\n".join(hit["content"] for hit in semantic_hits)
+        
+        # 3. 网络搜索
         search_results = self.search_tool.search(question)
         if search_results:
             print(f"  ✓ 找到 {len(search_results)} 条搜索结果")
@@ -78,7 +199,9 @@ class EducationAgent:
         print(f"✅ 分析完成")
         return answer
     
-    def execute_step(self, question: str, step: str, iteration: int) -> Dict:
+    def execute_step(self, question: str, step: str, iteration: int,
+                     dependency_context: Optional[str] = None,
+                     retrieval: Optional[RetrievalContext] = None) -> Dict:
         """
         执行单个步骤
         
@@ -86,6 +209,8 @@ class EducationAgent:
             question: 原始问题
             step: 当前步骤
             iteration: 迭代次数
+            dependency_context: 所依赖步骤的分析结果（并行模式下使用）
+            retrieval: 本次运行的检索上下文
         
         Returns:
             步骤执行结果
@@ -95,7 +220,9 @@ class EducationAgent:
         print(f"{'='*50}")
         
         # 检索信息
-        context = self.retrieve(question, step)
+        context = self.retrieve(question, step, retrieval)
+        if dependency_context:
+            context = f"{context}\n\n{dependency_context}" if context else dependency_context
         
         # 分析问题
         if "检索" in step or "搜索" in step or "查找" in step:
@@ -112,44 +239,76 @@ class EducationAgent:
             "iteration": iteration
         }
     
-    def run(self, question: str) -> Dict:
+    def route(self, question: str) -> Dict:
+        """
+        判断问题是否需要规划
+        
+        Args:
+            question: 用户问题
+        
+        Returns:
+            {"route": "simple" / "complex", "probability": 需要规划的概率}
+        """
+        decision = self.classifier.classify(question)
+        label = "简单问题，直接回答" if decision["route"] == "simple" else "复杂问题，先规划再执行"
+        print(f"🧭 路由：{label}（复杂概率 {decision['probability']:.2f}）")
+        return decision
+    
+    def run(self, question: str, parallel: bool = False, route: str = "auto") -> Dict:
         """
         运行 Agent 处理问题
         
+        简单的知识性问题不经过规划，检索后一次调用直接回答；
+        其余问题走"规划 -> 逐步执行 -> 综合"的完整流程。
+        
         Args:
             question: 用户问题
+            parallel: 是否按依赖关系并行执行相互独立的步骤
+            route: auto 由分类器判断；simple / complex 强制走对应路径
         
         Returns:
-            完整的结果
+            完整的结果，routing 字段记录路由决策和耗时
         """
         print(f"\n{'='*60}")
         print(f"🎓 中小学教学助手 Agent")
         print(f"{'='*60}")
         print(f"问题：{question}\n")
         
+        start = time.perf_counter()
+        routing = self.route(question) if route == "auto" else {"route": route, "probability": None}
+        if routing["route"] == "simple":
+            return self._run_direct(question, routing, start)
+        
         # 1. 规划
         steps = self.plan(question)
         
         if not steps:
             return {
                 "question": question,
-                "error": "规划失败"
+                "error": "规划失败",
+                "routing": routing
             }
         
-        # 2. 执行步骤
-        results = []
-        for i, step in enumerate(steps, 1):
-            if i > Config.MAX_ITERATIONS:
+        # 2. 执行步骤（同一次运行内检索结果共享）
+        retrieval = RetrievalContext(self._search)
+        if parallel:
+            if len(steps) > Config.MAX_ITERATIONS:
                 print(f"\n⚠️ 达到最大迭代次数限制")
-                break
-            
-            result = self.execute_step(question, step, i)
-            results.append(result)
-            
-            # 如果已经得到足够信息，可以提前结束
-            if result.get("analysis"):
-                # 可以添加提前终止逻辑
-                pass
+            results = self._run_steps_parallel(question, steps[:Config.MAX_ITERATIONS], retrieval)
+        else:
+            results = []
+            for i, step in enumerate(steps, 1):
+                if i > Config.MAX_ITERATIONS:
+                    print(f"\n⚠️ 达到最大迭代次数限制")
+                    break
+                
+                result = self.execute_step(question, step, i, retrieval=retrieval)
+                results.append(result)
+                
+                # 如果已经得到足够信息，可以提前结束
+                if result.get("analysis"):
+                    # 可以添加提前终止逻辑
+                    pass
         
         # 3. 综合所有结果生成最终回答
         print(f"\n{'='*60}")
@@ -157,24 +316,111 @@ class EducationAgent:
         print(f"{'='*60}")
         
         # 汇总所有分析结果
-        all_context = "\n\n".join([
+        sections = [
             f"步骤 {r['iteration']}: {r['step']}\n分析：{r['analysis']}"
             for r in results if r.get("analysis")
-        ])
+        ]
+        
+        # 检索资料在各步骤中已经用过，这里直接复用，不再重新检索
+        retrieved = retrieval.get(question)
+        if retrieved:
+            sections.insert(0, f"检索资料：\n{retrieved}")
+        print(f"  ✓ 检索 {retrieval.resolved} 次，复用 {retrieval.lookups - retrieval.resolved} 次")
+        
+        # 步骤越多上下文越长，按相关性去重后裁剪到 token 预算内
+        packed = pack_context(question, sections, budget=Config.CONTEXT_TOKEN_BUDGET)
+        all_context = "\n\n".join(text for _, text in packed)
+        print(f"  ✓ 上下文保留 {len(packed)}/{len(sections)} 段")
         
         final_answer = self.analyze(question, all_context)
+        prefix_stats = self.llm.prefix_cache.stats()
+        print(f"  ✓ 提示词 token：缓存命中 {prefix_stats['cached_tokens']}，未命中 {prefix_stats['uncached_tokens']}")
         
+        elapsed = time.perf_counter() - start
+        self.route_latency.record("complex", elapsed)
         return {
             "question": question,
             "steps": steps,
             "results": results,
-            "final_answer": final_answer
+            "final_answer": final_answer,
+            "routing": {**routing, "seconds": round(elapsed, 3)}
+        }
+    
+    def _run_direct(self, question: str, routing: Dict, start: float) -> Dict:
+        """
+        简单问题：检索后一次调用回答，不规划
+        
+        Args:
+            question: 用户问题
+            routing: 路由决策
+            start: 本次运行的开始时间（perf_counter）
+        
+        Returns:
+            与 run 相同结构的结果（steps / results 为空）
+        """
+        final_answer = self.analyze(question, self._search(question))
+        elapsed = time.perf_counter() - start
+        saved = self.route_latency.estimated_saving(elapsed)
+        self.route_latency.record("simple", elapsed)
+        if saved is not None:
+            print(f"  ✓ 跳过规划，用时 {elapsed:.2f}s，比完整流程约省 {saved:.2f}s")
+        else:
+            print(f"  ✓ 跳过规划，用时 {elapsed:.2f}s")
+        return {
+            "question": question,
+            "steps": [],
+            "results": [],
+            "final_answer": final_answer,
+            "routing": {**routing, "seconds": round(elapsed, 3), "saved_seconds": saved}
         }
     
+    def _run_steps_parallel(self, question: str, steps: List[str],
+                            retrieval: Optional[RetrievalContext] = None) -> List[Dict]:
+        """
+        按依赖关系并行执行步骤
+        
+        依赖已全部完成的步骤立即提交到线程池，依赖步骤的分析结果
+        作为额外上下文传入。
+        
+        Args:
+            question: 原始问题
+            steps: 规划步骤列表
+            retrieval: 本次运行的检索上下文
+        
+        Returns:
+            按步骤顺序排列的执行结果
+        """
+        dependencies = build_step_dependencies(steps)
+        done: Dict[int, Dict] = {}
+        pending = {}
+        
+        with ThreadPoolExecutor(max_workers=Config.STEP_WORKERS) as executor:
+            while len(done) < len(steps):
+                for i, step in enumerate(steps, 1):
+                    if i in done or i in pending or not all(d in done for d in dependencies[i]):
+                        continue
+                    dependency_context = "\n\n".join(
+                        f"步骤 {d}: {done[d]['step']}\n分析：{done[d]['analysis']}"
+                        for d in dependencies[i] if done[d].get("analysis")
+                    )
+                    pending[i] = executor.submit(
+                        self.execute_step, question, step, i, dependency_context or None, retrieval
+                    )
+                
+                finished, _ = wait(set(pending.values()), return_when=FIRST_COMPLETED)
+                for i, future in list(pending.items()):
+                    if future in finished:
+                        done[i] = future.result()
+                        del pending[i]
+        
+        return [done[i] for i in sorted(done)]
+    
     def chat(self, question: str) -> str:
         """
         简单对话接口（直接回答，不进行复杂规划）
         
+        带多轮记忆：最近几轮原文 + 更早轮次的摘要，历史长度有上限。
+        
         Args:
             question: 用户问题
         
@@ -191,5 +437,23 @@ class EducationAgent:
                 context = "\n".join([r.get("snippet", "") for r in search_results])
         
         # 使用 LLM 生成回答
-        answer = self.llm.analyze(question, context)
+        answer = self.llm.analyze(question, context, history=self.memory.messages())
+        self.memory.add_turn(question, answer)
         return answer
+    
+    def get_conversation_history(self) -> List[Dict[str, str]]:
+        """
+        获取完整对话记录
+        
+        Returns:
+            [{"user": ..., "assistant": ...}]
+        """
+        return list(self.memory.transcript)
+    
+    def clear_history(self):
+        """清空对话记忆，开始新的话题"""
+        self.memory.clear()
+
+    def close(self):
+        """释放对话记忆的后台摘要线程"""
+        self.memory.close()
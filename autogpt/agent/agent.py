@@ -1,7 +1,11 @@
-from typing import Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
 
 from ..config import Config
-from ..tools.search import web_search
+from ..tools import EducationKnowledgeBase
+from ..tools.search import search_concurrently, merge_hits, step_queries
+from ..question_classifier import RouteLatency, get_default_classifier
 from .planner import Planner
 from .answerer import Answerer
 
@@ -9,21 +13,113 @@ from .answerer import Answerer
 class TeachingAgent:
     """面向中小学教学问题的规划-检索-生成一体 Agent。"""
 
-    def __init__(self, config: Config | None = None):
+    def __init__(self, config: Config | None = None, client=None):
+        """client 为 None 时使用 KimiClient；也可以传入 LLMRouter 等提供 chat() 的客户端。"""
         self.config = config or Config()
-        self.planner = Planner(config=self.config)
-        self.answerer = Answerer(config=self.config)
+        self.planner = Planner(client=client, config=self.config)
+        self.answerer = Answerer(client=client, config=self.config)
+        self.classifier = get_default_classifier()
+        self.route_latency = RouteLatency()
+        # 问题检索、派生检索与规划并发时使用的常驻线程池，跨多次 run() 复用
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="teaching-agent")
 
-    def run(self, question: str, max_results: int = 6) -> Dict[str, Any]:
-        plan_steps = self.planner.make_plan(question)
-        # 以问题为主检索，也可将每个步骤关键词化进一步扩展，这里实现简版
-        hits = web_search(question, max_results=max_results)
+    def close(self):
+        """关闭常驻线程池；之后不应再调用 run()。"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _search_question(self, question: str, max_results: int) -> Dict[str, Any]:
+        """只依赖问题本身的检索：先查本地知识库（向量检索），没有命中再做网络检索。"""
+        start = time.perf_counter()
+        kb_hits = [
+            {"title": f"{hit['subject']}/{hit['topic']}", "url": "", "snippet": hit["content"]}
+            for hit in EducationKnowledgeBase.semantic_search(question, top_k=max_results)
+        ]
+        if kb_hits:
+            return {"hits": kb_hits, "from_kb": True, "seconds": time.perf_counter() - start}
+        # 经由共享检索线程池执行，复用其中线程上的检索会话；出错或超时时为空列表
+        hits = search_concurrently([question], max_results=max_results, timeout=self.config.SEARCH_TIMEOUT)[0]
+        return {"hits": hits, "from_kb": False, "seconds": time.perf_counter() - start}
+
+    def _search_steps(self, question: str, plan_steps: List[str], max_results: int) -> Dict[str, Any]:
+        """按计划步骤派生查询并发检索，返回各查询的结果列表。"""
+        start = time.perf_counter()
+        results = search_concurrently(
+            step_queries(question, plan_steps),
+            max_results=max_results,
+            max_workers=self.config.SEARCH_WORKERS,
+            timeout=self.config.SEARCH_TIMEOUT,
+        )
+        return {"results": results, "seconds": time.perf_counter() - start}
+
+    def run(
+        self,
+        question: str,
+        max_results: int = 6,
+        fan_out: bool = True,
+        pipelined: bool = True,
+        route: str = "auto",
+    ) -> Dict[str, Any]:
+        """
+        规划 → 检索 → 生成。
+
+        route 为 auto 时由本地分类器判断问题复杂度，简单问题跳过规划和派生检索，
+        检索后直接生成；simple / complex 强制走对应路径。
+        pipelined 为 True 时，问题检索与规划并发执行，二者都完成后再生成答案；
+        fan_out 为 True 且知识库未命中时，按计划步骤派生查询补充检索：
+        pipelined 模式下计划一出来就发出，与仍在进行的问题检索重叠，
+        否则在问题检索之后再发一轮。
+        返回结果中的 timings 记录各阶段耗时（秒），routing 记录路由决策和估算节省的时间。
+        """
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        routing = self.classifier.classify(question) if route == "auto" else {"route": route, "probability": None}
+        simple = routing["route"] == "simple"
+
+        step_results = None
+        if simple:
+            plan_steps: List[str] = []
+            first_round = self._search_question(question, max_results)
+        elif pipelined:
+            search_future = self._executor.submit(self._search_question, question, max_results)
+            plan_steps = self.planner.make_plan(question)
+            timings["plan"] = time.perf_counter() - start
+            fan_out_future = None
+            # 问题检索已确定命中知识库时不再派生检索，否则立即发出，不等问题检索返回
+            if fan_out and not (search_future.done() and search_future.result()["from_kb"]):
+                fan_out_future = self._executor.submit(self._search_steps, question, plan_steps, max_results)
+            first_round = search_future.result()
+            if fan_out_future is not None:
+                step_results = fan_out_future.result()
+        else:
+            plan_steps = self.planner.make_plan(question)
+            timings["plan"] = time.perf_counter() - start
+            first_round = self._search_question(question, max_results)
+            if fan_out and not first_round["from_kb"]:
+                step_results = self._search_steps(question, plan_steps, max_results)
+        timings["search"] = first_round["seconds"]
+
+        hits: List[Dict[str, str]] = first_round["hits"]
+        if step_results is not None and not first_round["from_kb"]:
+            # 原始问题的结果排在最前，步骤派生查询的结果按 RRF 合并
+            hits = merge_hits([hits] + step_results["results"], max_results=max_results)
+            timings["fan_out_search"] = step_results["seconds"]
+
+        synth_start = time.perf_counter()
         answer = self.answerer.synthesize(question, plan_steps, hits)
+        timings["synthesize"] = time.perf_counter() - synth_start
+        timings["total"] = time.perf_counter() - start
+
+        if simple:
+            routing["saved_seconds"] = self.route_latency.estimated_saving(timings["total"])
+        self.route_latency.record(routing["route"], timings["total"])
+
         return {
             "question": question,
             "plan": plan_steps,
             "search": hits,
             "answer": answer,
+            "timings": {stage: round(seconds, 3) for stage, seconds in timings.items()},
+            "routing": routing,
         }
 
 
@@ -1,6 +1,7 @@
 from typing import List, Dict
 
 from ..config import Config
+from ..context_packer import pack_context
 from ..kimi_client import KimiClient
 
 
@@ -15,14 +16,18 @@ SYNTHESIS_PROMPT = (
 
 class Answerer:
     def __init__(self, client: KimiClient | None = None, config: Config | None = None):
-        self.client = client or KimiClient(config)
+        # KimiClient 直接读取 Config 类属性，不接收配置对象
+        self.client = client or KimiClient()
         self.config = config or Config()
 
     def synthesize(self, question: str, plan_steps: List[str], search_hits: List[Dict[str, str]]) -> str:
         sys = {"role": "system", "content": self.config.SYSTEM_PROMPT}
 
+        # 按与问题的相关性挑选摘要并去重，整体控制在 token 预算内
+        packed = pack_context(question, [hit.get("snippet", "") for hit in search_hits],
+                              budget=self.config.CONTEXT_TOKEN_BUDGET)
         search_bullets = "\n".join(
-            [f"- {hit.get('title','')} — {hit.get('snippet','')[:200]}... ({hit.get('url','')})" for hit in search_hits]
+            [f"- {search_hits[i].get('title','')} — {snippet} ({search_hits[i].get('url','')})" for i, snippet in packed]
         ) or "(无检索结果)"
 
         plan_bullets = "\n".join([f"- {s}" for s in plan_steps]) or "- 制定基础回答结构"
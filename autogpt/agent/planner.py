@@ -13,7 +13,8 @@ PLANNER_PROMPT = (
 
 class Planner:
     def __init__(self, client: KimiClient | None = None, config: Config | None = None):
-        self.client = client or KimiClient(config)
+        # KimiClient 直接读取 Config 类属性，不接收配置对象
+        self.client = client or KimiClient()
         self.config = config or Config()
 
     def make_plan(self, question: str) -> List[str]:
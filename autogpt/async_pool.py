@@ -0,0 +1,75 @@
+"""异步 LLM 连接池：KimiClient / DoubaoClient 共享的 httpx 连接池与并发信号量"""
+import asyncio
+from typing import Optional
+
+import httpx
+
+from config import Config
+
+
+class AsyncLLMPool:
+    """
+    异步调用共享资源
+
+    - 一个 httpx.AsyncClient，复用 keep-alive 连接
+    - 一个信号量，限制同时在途的补全请求数，避免打爆服务端配额
+
+    httpx 客户端和 asyncio 信号量都绑定创建时的事件循环，
+    因此在检测到事件循环变化（例如多次 asyncio.run）时会重新创建。
+    """
+
+    def __init__(self,
+                 max_concurrency: int = Config.LLM_MAX_CONCURRENCY,
+                 max_connections: int = Config.LLM_MAX_CONNECTIONS,
+                 timeout: float = 60.0):
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _ensure_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # 旧循环上的连接无法复用，直接丢弃
+            self._loop = loop
+            self._http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """当前事件循环上的共享 HTTP 客户端"""
+        self._ensure_loop()
+        return self._http_client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """当前事件循环上的并发信号量"""
+        self._ensure_loop()
+        return self._semaphore
+
+    async def aclose(self):
+        """关闭连接池"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._loop = None
+        self._http_client = None
+        self._semaphore = None
+
+
+_default_pool: Optional[AsyncLLMPool] = None
+
+
+def get_async_pool() -> AsyncLLMPool:
+    """获取进程内默认共享的连接池"""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = AsyncLLMPool()
+    return _default_pool
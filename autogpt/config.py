@@ -39,10 +39,66 @@ class Config:
     KIMI_MODEL = os.getenv("KIMI_MODEL", "kimi-k2-0905-preview")
     KIMI_API_BASE = os.getenv("KIMI_API_BASE", "https://api.moonshot.cn/v1")
     
+    # 提示词前缀缓存：auto（服务端自动缓存）/ moonshot（显式注册）/ local（本地模拟）/ off
+    PREFIX_CACHE_MODE = os.getenv("PREFIX_CACHE_MODE", "auto")
+    PREFIX_CACHE_MODEL = os.getenv("PREFIX_CACHE_MODEL", KIMI_MODEL)  # 显式缓存所属的模型，默认与对话模型一致
+    PREFIX_CACHE_TTL = int(os.getenv("PREFIX_CACHE_TTL", "3600"))  # 秒
+    PREFIX_CACHE_MIN_TOKENS = int(os.getenv("PREFIX_CACHE_MIN_TOKENS", "0"))  # 前缀短于该值时不注册
+    
     # Agent 配置
     MAX_ITERATIONS = 10  # 最大迭代次数
+    STEP_WORKERS = int(os.getenv("STEP_WORKERS", "4"))  # 并行执行步骤时的线程数
+    SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))  # 多查询并发检索的线程数
+    SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "8"))  # 单轮检索超时（秒）
+    SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "1") == "1"
+    SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", ".cache/search_results.sqlite3")  # 为空则只用内存缓存
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600)))  # 秒
     TEMPERATURE = 0.7  # 模型温度
     MAX_TOKENS = 2000  # 最大 token 数
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))  # 拼接上下文的 token 预算
+    MEMORY_KEEP_TURNS = int(os.getenv("MEMORY_KEEP_TURNS", "4"))  # 多轮对话保留原文的轮数
+    MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "1500"))  # 对话历史的 token 上限
+    MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "400"))  # 对话摘要的 token 上限
+
+    # 网页抓取配置
+    FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "5"))  # 单个页面超时（秒）
+    FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(256 * 1024)))  # 每个页面最多读取的字节数
+    FETCH_MAX_CHARS = int(os.getenv("FETCH_MAX_CHARS", "2000"))  # 每个页面最多保留的正文字符数
+    FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", "2"))  # 同一域名同时在途的请求数
+    FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "32"))
+
+    # 问题复杂度分类：简单问题跳过规划，直接一次调用回答
+    CLASSIFIER_PATH = os.getenv("CLASSIFIER_PATH", ".cache/question_classifier.json")  # 为空则只在内存中训练
+    CLASSIFIER_THRESHOLD = float(os.getenv("CLASSIFIER_THRESHOLD", "0.5"))  # 复杂概率不低于该值时走规划路径
+
+    # 多模型路由配置
+    ROUTER_HEDGE_AFTER = float(os.getenv("ROUTER_HEDGE_AFTER")) if os.getenv("ROUTER_HEDGE_AFTER") else None  # 秒，为空则用主服务商的 p95
+    ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))  # 连续失败多少次后熔断
+    ROUTER_COOLDOWN = float(os.getenv("ROUTER_COOLDOWN", "30"))  # 熔断冷却时间（秒）
+
+    # 异步调用配置
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))  # 同时在途的补全请求数
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))  # 共享连接池大小
+
+    # 响应缓存配置
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_responses.sqlite3")  # 为空则只用内存缓存
+    LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # 秒
+    LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512"))
+    LLM_CACHE_DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "20000"))
+
+    # 知识库索引目录（为空则只在内存中构建）
+    KB_INDEX_DIR = os.getenv("KB_INDEX_DIR", ".cache")
+    # 磁盘知识库存储文件（kb_store.py 生成），设置后替代内置知识库
+    KB_STORE_PATH = os.getenv("KB_STORE_PATH", "")
+    # 知识库命中的最低要求：命中查询词项（bigram）的比例和个数，达不到时视为没有命中、转为网络搜索
+    KB_MIN_COVERAGE = float(os.getenv("KB_MIN_COVERAGE", "0.3"))
+    KB_MIN_TERMS = int(os.getenv("KB_MIN_TERMS", "2"))
+
+    # 向量检索配置（需要 numpy）
+    VECTOR_SEARCH_ENABLED = os.getenv("VECTOR_SEARCH_ENABLED", "1") == "1"
+    VECTOR_DIM = int(os.getenv("VECTOR_DIM", "512"))
+    VECTOR_MIN_SCORE = float(os.getenv("VECTOR_MIN_SCORE", "0.3"))  # 低于该余弦相似度视为不相关
     
     # 教学领域特定配置
     EDUCATION_DOMAIN = "中小学教学"
@@ -0,0 +1,138 @@
+"""
+上下文打包：按相关性挑选段落，去重后装入固定的 token 预算
+
+用于拼接检索结果、步骤分析等多段上下文，避免提示词随检索条数
+和迭代次数无限增长。token 数用字符数估算，不依赖具体模型的分词器。
+"""
+import math
+import re
+from typing import List, Optional, Sequence, Set, Tuple
+
+from config import Config
+from kb_index import tokenize
+
+_CJK = re.compile(r"[㐀-鿿豈-﫿　-〿＀-￯]")
+# 截断时优先停在这些字符之后
+_SENTENCE_END = re.compile(r"[。！？；.!?;\n]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 token 数
+
+    中文字符（含全角标点）按每字 1 个 token，其余字符按每 4 个 1 个 token，
+    与 Kimi / 豆包等模型的实际计数大致相当，偏保守。
+
+    Args:
+        text: 文本内容
+
+    Returns:
+        估算的 token 数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    把文本截断到不超过 max_tokens，尽量停在句末
+
+    Args:
+        text: 文本内容
+        max_tokens: token 上限
+
+    Returns:
+        截断后的文本，发生截断时以"…"结尾
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # 二分查找能放下的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = text[:low]
+    ends = [m.end() for m in _SENTENCE_END.finditer(prefix)]
+    # 句末离截断点不太远时停在句末，否则直接截断
+    if ends and ends[-1] >= low * 0.6:
+        prefix = prefix[:ends[-1]]
+    return prefix.rstrip() + "…"
+
+
+def _relevance(query_terms: Set[str], passage_terms: Set[str]) -> float:
+    if not query_terms or not passage_terms:
+        return 0.0
+    return len(query_terms & passage_terms) / len(query_terms)
+
+
+def _is_redundant(terms: Set[str], selected: List[Set[str]], threshold: float) -> bool:
+    # 大部分词项已包含在某个已选段落中，视为重复
+    for other in selected:
+        if terms and len(terms & other) / len(terms) >= threshold:
+            return True
+    return False
+
+
+def pack_context(query: str,
+                 passages: Sequence[str],
+                 budget: Optional[int] = None,
+                 priorities: Optional[Sequence[float]] = None,
+                 dedupe_threshold: float = 0.8,
+                 min_tokens: int = 32) -> List[Tuple[int, str]]:
+    """
+    在 token 预算内挑选上下文段落
+
+    - 相关性：段落词项对查询词项的覆盖率（kb_index.tokenize 分词），乘以调用方给的权重
+    - 去重：段落词项有 dedupe_threshold 以上已出现在更相关的段落中时丢弃
+    - 预算：按相关性从高到低放入，放不下的段落截断到剩余预算，
+      剩余预算不足 min_tokens 时停止
+
+    Args:
+        query: 查询（一般是原始问题）
+        passages: 候选段落
+        budget: token 预算，默认 Config.CONTEXT_TOKEN_BUDGET
+        priorities: 每个段落的权重，默认都为 1
+        dedupe_threshold: 重复判定阈值
+        min_tokens: 截断后段落的最少 token 数
+
+    Returns:
+        [(段落下标, 段落文本)]，按原始顺序排列，文本可能被截断
+    """
+    budget = Config.CONTEXT_TOKEN_BUDGET if budget is None else budget
+    priorities = list(priorities) if priorities is not None else [1.0] * len(passages)
+    query_terms = set(tokenize(query))
+
+    candidates = []
+    for i, text in enumerate(passages):
+        text = (text or "").strip()
+        if not text:
+            continue
+        terms = set(tokenize(text))
+        # 相关性相同时靠前的段落优先
+        score = priorities[i] * (0.1 + _relevance(query_terms, terms))
+        candidates.append((score, -i, i, text, terms))
+    candidates.sort(reverse=True)
+
+    packed: List[Tuple[int, str]] = []
+    selected_terms: List[Set[str]] = []
+    remaining = budget
+    for _, _, i, text, terms in candidates:
+        if remaining < min_tokens:
+            break
+        if _is_redundant(terms, selected_terms, dedupe_threshold):
+            continue
+        cost = estimate_tokens(text)
+        if cost > remaining:
+            text = truncate_to_tokens(text, remaining)
+            cost = estimate_tokens(text)
+        packed.append((i, text))
+        selected_terms.append(terms)
+        remaining -= cost
+
+    packed.sort()
+    return packed
@@ -6,22 +6,198 @@
 
 import argparse
 import json
-from typing import Dict, Any, List, Optional
+import os
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from doubao_client import DoubaoClient, DoubaoConfig
+from doubao_batch import run_batch
+from llm_router import create_default_router
+from structured_output import describe_schema, parse_structured
 import sys
 
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+# 接入点不支持 JSON 模式时，400 错误信息中会出现这些字样
+_JSON_MODE_UNSUPPORTED_MARKERS = ("response_format", "json_object", "json mode")
+
+
+def _json_mode_unsupported(error: Exception) -> bool:
+    """
+    是否为"不支持 response_format"导致的 400
+
+    兼容 requests.HTTPError（错误信息在 response.text 中）和 openai 的
+    BadRequestError（错误信息在异常消息中）。其他 400（参数错误、内容审核等）返回 False。
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 400:
+        return False
+    try:
+        body = response.text if response is not None else ""
+    except Exception:
+        body = ""
+    text = f"{body} {error}".lower()
+    return any(marker in text for marker in _JSON_MODE_UNSUPPORTED_MARKERS)
+
+TEACHING_PLAN_SCHEMA = {
+    "type": "object",
+    "required": ["topic", "grade_level", "duration", "objectives", "key_points", "steps"],
+    "properties": {
+        "topic": {"type": "string"},
+        "grade_level": {"type": "string"},
+        "duration": {"type": "integer"},
+        "objectives": _STRING_LIST,
+        "key_points": _STRING_LIST,
+        "materials": _STRING_LIST,
+        "steps": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["phase", "duration", "activities"],
+                "properties": {
+                    "phase": {"type": "string"},
+                    "duration": {"type": "integer"},
+                    "activities": _STRING_LIST,
+                    "purpose": {"type": "string"}
+                }
+            }
+        },
+        "assessment": {"type": "string"},
+        "homework": {"type": "string"}
+    }
+}
+
+EXPERIMENT_GUIDE_SCHEMA = {
+    "type": "object",
+    "required": ["experiment_name", "subject", "objectives", "materials", "steps"],
+    "properties": {
+        "experiment_name": {"type": "string"},
+        "subject": {"type": "string"},
+        "objectives": _STRING_LIST,
+        "principles": {"type": "string"},
+        "materials": _STRING_LIST,
+        "safety_precautions": _STRING_LIST,
+        "steps": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["step", "action"],
+                "properties": {
+                    "step": {"type": "integer"},
+                    "action": {"type": "string"},
+                    "notes": {"type": "string"}
+                }
+            }
+        },
+        "data_recording": {"type": "string"},
+        "analysis": {"type": "string"},
+        "conclusions": {"type": "string"},
+        "extensions": {"type": "string"}
+    }
+}
+
 class DoubaoTeachingAgent:
     """基于豆包大模型的教学智能助手"""
 
-    def __init__(self, api_key: str, endpoint_id: str):
-        config = DoubaoConfig(
-            api_key=api_key,
-            endpoint_id=endpoint_id,
-            model=endpoint_id
-        )
-        self.client = DoubaoClient(config)
+    def __init__(self, api_key: str, endpoint_id: str, client=None):
+        """
+        Args:
+            api_key: 豆包 API 密钥
+            endpoint_id: 推理接入点ID
+            client: 自定义客户端（如 LLMRouter），需提供 chat_completion / chat_completion_stream，
+                默认使用 DoubaoClient
+        """
+        if client is None:
+            config = DoubaoConfig(
+                api_key=api_key,
+                endpoint_id=endpoint_id,
+                model=endpoint_id
+            )
+            client = DoubaoClient(config)
+        self.client = client
+        # 接入点不支持 response_format 时自动关闭
+        self.json_mode = True
+
+    def _complete(self,
+                  messages: List[Dict[str, str]],
+                  temperature: float,
+                  on_token: Optional[Callable[[str], None]] = None,
+                  **kwargs) -> Tuple[str, Dict[str, Any]]:
+        """
+        调用模型并返回完整内容和token统计
+
+        Args:
+            messages: 对话消息列表
+            temperature: 温度参数
+            on_token: 增量回调；提供时走流式接口，每收到一段内容就回调一次
+            **kwargs: 透传给客户端的其他参数（如 response_format）
 
-    def generate_teaching_plan(self, topic: str, grade_level: str = "初中", duration: int = 45) -> Dict[str, Any]:
+        Returns:
+            (完整内容, usage)
+        """
+        if on_token is None:
+            response = self.client.chat_completion(messages, temperature=temperature, **kwargs)
+            return response["choices"][0]["message"]["content"], response.get("usage", {})
+
+        content, usage = "", {}
+        for chunk in self.client.chat_completion_stream(messages, temperature=temperature, **kwargs):
+            if chunk["delta"]:
+                on_token(chunk["delta"])
+            if "usage" in chunk:
+                content, usage = chunk["content"], chunk["usage"]
+        return content, usage
+
+    def _complete_json(self,
+                       messages: List[Dict[str, str]],
+                       temperature: float,
+                       on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        以 JSON 模式调用模型（response_format=json_object），保证输出是一个 JSON 对象
+
+        接入点的模型不支持 JSON 模式时请求会被直接拒绝（400，不产生生成开销），
+        此后改用普通模式，由提示词约束输出格式。只有错误信息表明 response_format
+        不受支持时才切换，其他 400 照常抛出。使用 LLMRouter 时 400 不会被
+        故障切换吞掉（见 llm_router.is_client_error），同样在这里处理。
+        """
+        if self.json_mode:
+            try:
+                return self._complete(messages, temperature, on_token,
+                                      response_format={"type": "json_object"})
+            except Exception as e:
+                if not _json_mode_unsupported(e):
+                    raise
+                self.json_mode = False
+        return self._complete(messages, temperature, on_token)
+
+    @staticmethod
+    def _parse_result(content: str, schema: Dict[str, Any], fallback: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        容错解析结构化输出
+
+        代码块、多余逗号、截断等问题就地修复，保留已生成的内容；
+        校验不通过的字段记录在 validation_errors 中，不再整段作废。
+
+        Args:
+            content: 模型输出
+            schema: 输出 schema
+            fallback: 完全无法解析时返回的基础字段
+
+        Returns:
+            解析结果
+        """
+        try:
+            result, errors, repaired = parse_structured(content, schema)
+        except ValueError:
+            result, errors, repaired = None, [], False
+        if not isinstance(result, dict):
+            return {**fallback, "raw_content": content, "error": "JSON解析失败"}
+        if errors:
+            result["validation_errors"] = errors
+        if repaired:
+            result["repaired"] = True
+        return result
+
+    def generate_teaching_plan(self, topic: str, grade_level: str = "初中", duration: int = 45,
+                               on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """
         生成教学计划
 
@@ -29,6 +205,7 @@ class DoubaoTeachingAgent:
             topic: 教学主题
             grade_level: 年级水平
             duration: 课时长度(分钟)
+            on_token: 流式增量回调(可选)
 
         Returns:
             教学计划
@@ -36,57 +213,10 @@ class DoubaoTeachingAgent:
         prompt = f"""
 请为{grade_level}学生设计一个关于"{topic}"的{duration}分钟教学计划。
 
-要求按以下格式输出JSON：
-
-{{
-    "topic": "{topic}",
-    "grade_level": "{grade_level}",
-    "duration": {duration},
-    "objectives": [
-        "教学目标1",
-        "教学目标2",
-        "教学目标3"
-    ],
-    "key_points": [
-        "重点1",
-        "重点2",
-        "难点1"
-    ],
-    "materials": [
-        "教学材料1",
-        "教学材料2"
-    ],
-    "steps": [
-        {{
-            "phase": "导入",
-            "duration": 5,
-            "activities": ["活动描述"],
-            "purpose": "目的说明"
-        }},
-        {{
-            "phase": "新授课",
-            "duration": 25,
-            "activities": ["活动描述"],
-            "purpose": "目的说明"
-        }},
-        {{
-            "phase": "练习",
-            "duration": 10,
-            "activities": ["活动描述"],
-            "purpose": "目的说明"
-        }},
-        {{
-            "phase": "总结",
-            "duration": 5,
-            "activities": ["活动描述"],
-            "purpose": "目的说明"
-        }}
-    ],
-    "assessment": "评价方式",
-    "homework": "作业安排"
-}}
-
-请确保输出有效的JSON格式。
+只输出一个JSON对象，字段如下：
+{describe_schema(TEACHING_PLAN_SCHEMA)}
+
+steps 依次为导入、新授课、练习、总结等环节，各环节 duration 之和为 {duration}。
 """
 
         try:
@@ -95,21 +225,13 @@ class DoubaoTeachingAgent:
                 {"role": "user", "content": prompt}
             ]
 
-            response = self.client.chat_completion(messages, temperature=0.3)
-            content = response["choices"][0]["message"]["content"]
+            content, _ = self._complete_json(messages, temperature=0.3, on_token=on_token)
 
-            # 尝试解析JSON
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                # 如果解析失败，返回原始内容
-                return {
-                    "topic": topic,
-                    "grade_level": grade_level,
-                    "duration": duration,
-                    "raw_content": content,
-                    "error": "JSON解析失败"
-                }
+            return self._parse_result(content, TEACHING_PLAN_SCHEMA, {
+                "topic": topic,
+                "grade_level": grade_level,
+                "duration": duration
+            })
         except Exception as e:
             return {
                 "error": f"生成教学计划失败: {str(e)}",
@@ -118,7 +240,8 @@ class DoubaoTeachingAgent:
                 "duration": duration
             }
 
-    def answer_teaching_question(self, question: str, context: str = "", subject: str = "通用") -> Dict[str, Any]:
+    def answer_teaching_question(self, question: str, context: str = "", subject: str = "通用",
+                                 on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """
         回答教学问题
 
@@ -126,6 +249,7 @@ class DoubaoTeachingAgent:
             question: 问题
             context: 上下文
             subject: 学科
+            on_token: 流式增量回调(可选)
 
         Returns:
             答案结果
@@ -153,15 +277,14 @@ class DoubaoTeachingAgent:
                 {"role": "user", "content": prompt}
             ]
 
-            response = self.client.chat_completion(messages, temperature=0.5)
-            answer = response["choices"][0]["message"]["content"]
+            answer, usage = self._complete(messages, temperature=0.5, on_token=on_token)
 
             return {
                 "question": question,
                 "subject": subject,
                 "context": context,
                 "answer": answer,
-                "usage": response.get("usage", {})
+                "usage": usage
             }
         except Exception as e:
             return {
@@ -170,13 +293,15 @@ class DoubaoTeachingAgent:
                 "subject": subject
             }
 
-    def generate_experiment_guide(self, experiment_name: str, subject: str = "物理") -> Dict[str, Any]:
+    def generate_experiment_guide(self, experiment_name: str, subject: str = "物理",
+                                  on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """
         生成实验指导
 
         Args:
             experiment_name: 实验名称
             subject: 学科
+            on_token: 流式增量回调(可选)
 
         Returns:
             实验指导
@@ -184,38 +309,10 @@ class DoubaoTeachingAgent:
         prompt = f"""
 请为{subject}实验"{experiment_name}"生成详细的实验指导方案。
 
-请按以下格式输出JSON：
-
-{{
-    "experiment_name": "{experiment_name}",
-    "subject": "{subject}",
-    "objectives": [
-        "实验目标1",
-        "实验目标2"
-    ],
-    "principles": "实验原理说明",
-    "materials": [
-        "器材1（数量）",
-        "器材2（数量）"
-    ],
-    "safety_precautions": [
-        "安全注意事项1",
-        "安全注意事项2"
-    ],
-    "steps": [
-        {{
-            "step": 1,
-            "action": "具体操作步骤",
-            "notes": "注意事项"
-        }}
-    ],
-    "data_recording": "数据记录方法和表格设计",
-    "analysis": "数据分析方法",
-    "conclusions": "预期结论和讨论要点",
-    "extensions": "拓展思考或变式实验"
-}}
-
-请确保输出有效的JSON格式。
+只输出一个JSON对象，字段如下：
+{describe_schema(EXPERIMENT_GUIDE_SCHEMA)}
+
+materials 中注明数量，steps 按操作顺序编号。
 """
 
         try:
@@ -224,18 +321,12 @@ class DoubaoTeachingAgent:
                 {"role": "user", "content": prompt}
             ]
 
-            response = self.client.chat_completion(messages, temperature=0.4)
-            content = response["choices"][0]["message"]["content"]
+            content, _ = self._complete_json(messages, temperature=0.4, on_token=on_token)
 
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                return {
-                    "experiment_name": experiment_name,
-                    "subject": subject,
-                    "raw_content": content,
-                    "error": "JSON解析失败"
-                }
+            return self._parse_result(content, EXPERIMENT_GUIDE_SCHEMA, {
+                "experiment_name": experiment_name,
+                "subject": subject
+            })
         except Exception as e:
             return {
                 "error": f"生成实验指导失败: {str(e)}",
@@ -259,22 +350,52 @@ def main():
                        help="豆包端点ID")
     parser.add_argument("--pretty", action="store_true", help="美化输出")
     parser.add_argument("--test", action="store_true", help="测试连接")
+    parser.add_argument("--stream", action="store_true", help="流式输出，边生成边打印")
+    parser.add_argument("--batch", help="批量模式：JSONL/CSV 请求文件")
+    parser.add_argument("--output", help="批量模式输出 JSONL（默认 <输入文件>.out.jsonl）")
+    parser.add_argument("--workers", type=int, default=4, help="批量模式并发数")
+    parser.add_argument("--rate-limit", type=float, default=0, help="批量模式每分钟最大请求数(0不限)")
+    parser.add_argument("--no-resume", action="store_true", help="批量模式不跳过已完成的请求，覆盖输出文件")
+    parser.add_argument("--router", action="store_true", help="同时使用豆包和 Kimi，按延迟自动选择并故障切换")
 
     args = parser.parse_args()
 
     # 创建教学助手
-    agent = DoubaoTeachingAgent(args.api_key, args.endpoint)
+    doubao = DoubaoClient(DoubaoConfig(api_key=args.api_key, endpoint_id=args.endpoint, model=args.endpoint))
+    client = create_default_router(doubao_client=doubao) if args.router else doubao
+    agent = DoubaoTeachingAgent(args.api_key, args.endpoint, client=client)
+    on_token = print_token if args.stream else None
 
     # 测试连接
     if args.test:
         print("🔧 测试豆包大模型连接...")
-        if agent.client.test_connection():
+        if doubao.test_connection():
             print("✅ 连接成功！")
             return
         else:
             print("❌ 连接失败！")
             return
 
+    # 批量模式
+    if args.batch:
+        output = args.output or f"{os.path.splitext(args.batch)[0]}.out.jsonl"
+        print(f"📦 批量处理: {args.batch} -> {output}")
+
+        def report(record):
+            status = "❌" if "error" in record["result"] else "✅"
+            print(f"{status} [{record['request']['type']}] {record['request']['topic']} ({record['elapsed']}s)")
+
+        stats = run_batch(
+            agent, args.batch, output,
+            workers=args.workers,
+            requests_per_minute=args.rate_limit,
+            resume=not args.no_resume,
+            on_result=report
+        )
+        print(f"完成: 共 {stats['total']} 条，跳过 {stats['skipped']}，"
+              f"成功 {stats['succeeded']}，失败 {stats['failed']}")
+        return
+
     # 如果没有提供问题，进入交互模式
     if not args.question:
         print("🎓 豆包大模型教学智能助手")
@@ -294,8 +415,12 @@ def main():
                     print_help()
                     continue
 
-                result = agent.answer_teaching_question(question)
-                print_result(result, args.pretty)
+                result = agent.answer_teaching_question(question, on_token=on_token)
+                if on_token:
+                    print()
+                    print_usage(result)
+                else:
+                    print_result(result, args.pretty)
 
             except KeyboardInterrupt:
                 print("\n👋 再见！")
@@ -309,18 +434,26 @@ def main():
     try:
         if args.type == "answer":
             result = agent.answer_teaching_question(
-                args.question, args.context, args.subject
+                args.question, args.context, args.subject, on_token=on_token
             )
         elif args.type == "plan":
             result = agent.generate_teaching_plan(
-                args.question, args.grade, args.duration
+                args.question, args.grade, args.duration, on_token=on_token
             )
         elif args.type == "experiment":
             result = agent.generate_experiment_guide(
-                args.question, args.subject
+                args.question, args.subject, on_token=on_token
             )
 
-        print_result(result, args.pretty)
+        if on_token:
+            # 内容已经流式打印过，这里只补充换行和结构化结果
+            print()
+            if args.type == "answer":
+                print_usage(result)
+            else:
+                print_result(result, args.pretty)
+        else:
+            print_result(result, args.pretty)
 
     except Exception as e:
         print(f"❌ 处理失败: {e}")
@@ -333,6 +466,7 @@ def print_help():
 2. 生成教学计划: python doubao_agent.py "力的作用" --type plan --grade 高中
 3. 生成实验指导: python doubao_agent.py "单摆实验" --type experiment --subject 物理
 4. 测试连接: python doubao_agent.py --test
+5. 批量生成: python doubao_agent.py --batch topics.jsonl --workers 8 --rate-limit 60
 
 命令行选项：
 --type: answer(默认), plan, experiment
@@ -341,9 +475,23 @@ def print_help():
 --duration: 课时长度(默认45分钟)
 --context: 背景信息
 --pretty: 美化JSON输出
+--stream: 流式输出，边生成边打印
+--batch: 批量请求文件(JSONL/CSV，字段 type/topic/grade/subject/duration/context)
+--output / --workers / --rate-limit / --no-resume: 批量模式选项
 """
     print(help_text)
 
+def print_token(token: str):
+    """流式打印增量内容"""
+    print(token, end="", flush=True)
+
+def print_usage(result: Dict[str, Any]):
+    """打印错误信息或token统计"""
+    if "error" in result:
+        print(f"❌ {result['error']}")
+    elif result.get("usage"):
+        print(f"📊 Token使用: {result['usage']}")
+
 def print_result(result: Dict[str, Any], pretty: bool = False):
     """打印结果"""
     if pretty:
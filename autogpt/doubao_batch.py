@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+豆包教学助手批量处理
+
+从 JSONL / CSV 读取请求（type, topic, grade, subject, duration, context），
+用线程池并发生成，每完成一条就追加写入输出 JSONL；
+中途崩溃后重新运行会跳过输出文件里已经成功的请求。
+"""
+
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from rate_limiter import TokenBucketLimiter
+
+REQUEST_TYPES = ("answer", "plan", "experiment")
+
+
+def load_requests(path: str) -> List[Dict[str, Any]]:
+    """
+    读取批量请求文件
+
+    Args:
+        path: .jsonl 或 .csv 文件路径
+
+    Returns:
+        请求列表，缺省字段按命令行默认值补齐
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = [dict(row) for row in csv.DictReader(f)]
+    else:
+        rows = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    rows.append(json.loads(line))
+
+    requests = []
+    for row in rows:
+        req_type = (row.get("type") or "answer").strip()
+        if req_type not in REQUEST_TYPES:
+            raise ValueError(f"不支持的请求类型: {req_type}")
+        req = {
+            "type": req_type,
+            "topic": (row.get("topic") or "").strip(),
+            "grade": row.get("grade") or "初中",
+            "subject": row.get("subject") or "通用",
+            "duration": int(row.get("duration") or 45),
+            "context": row.get("context") or ""
+        }
+        if not req["topic"]:
+            raise ValueError(f"请求缺少 topic: {row}")
+        req["id"] = str(row.get("id") or request_key(req))
+        requests.append(req)
+    return requests
+
+
+def request_key(req: Dict[str, Any]) -> str:
+    """根据请求内容生成稳定的ID，用于断点续跑"""
+    fields = [req["type"], req["topic"], req["grade"], req["subject"], str(req["duration"]), req["context"]]
+    return hashlib.sha1("\x1f".join(fields).encode("utf-8")).hexdigest()[:16]
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """
+    读取输出文件中已成功完成的请求ID
+
+    崩溃时最后一行可能只写了一半，解析失败的行直接忽略。
+
+    Args:
+        output_path: 输出 JSONL 路径
+
+    Returns:
+        已完成的请求ID集合
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record.get("result", {}):
+                completed.add(record.get("id"))
+    return completed
+
+
+def process_request(agent, req: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    处理单条请求
+
+    Args:
+        agent: DoubaoTeachingAgent 实例
+        req: 请求
+
+    Returns:
+        生成结果
+    """
+    if req["type"] == "plan":
+        return agent.generate_teaching_plan(req["topic"], req["grade"], req["duration"])
+    if req["type"] == "experiment":
+        return agent.generate_experiment_guide(req["topic"], req["subject"])
+    return agent.answer_teaching_question(req["topic"], req["context"], req["subject"])
+
+
+def run_batch(agent,
+              input_path: str,
+              output_path: str,
+              workers: int = 4,
+              requests_per_minute: float = 0,
+              resume: bool = True,
+              on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, int]:
+    """
+    批量处理请求文件
+
+    Args:
+        agent: DoubaoTeachingAgent 实例
+        input_path: 输入 JSONL / CSV 路径
+        output_path: 输出 JSONL 路径（追加写入）
+        workers: 并发线程数
+        requests_per_minute: 每分钟最多发起的请求数，0 表示不限
+        resume: 是否跳过输出文件中已成功的请求
+        on_result: 每完成一条时的回调 on_result(record)
+
+    Returns:
+        统计信息：总数、跳过、成功、失败
+    """
+    requests = load_requests(input_path)
+    completed = load_completed(output_path) if resume else set()
+    todo = [req for req in requests if req["id"] not in completed]
+
+    stats = {"total": len(requests), "skipped": len(requests) - len(todo), "succeeded": 0, "failed": 0}
+    if not todo:
+        return stats
+
+    # 客户端自身按账号配额限流；这里额外限制本批次的请求速率
+    limiter = TokenBucketLimiter(requests_per_minute=requests_per_minute)
+    write_lock = threading.Lock()
+
+    def task(req: Dict[str, Any]) -> Dict[str, Any]:
+        limiter.acquire()
+        start = time.time()
+        try:
+            result = process_request(agent, req)
+        except Exception as e:
+            result = {"error": f"处理失败: {str(e)}"}
+        return {
+            "id": req["id"],
+            "request": req,
+            "result": result,
+            "elapsed": round(time.time() - start, 3)
+        }
+
+    mode = "a" if resume else "w"
+    with open(output_path, mode, encoding="utf-8") as out:
+        # 上次崩溃可能留下半行，先补换行避免和新记录粘在一起
+        if mode == "a" and out.tell() > 0:
+            with open(output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    out.write("\n")
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(task, req) for req in todo]
+            for future in as_completed(futures):
+                record = future.result()
+                with write_lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                if "error" in record["result"]:
+                    stats["failed"] += 1
+                else:
+                    stats["succeeded"] += 1
+                if on_result:
+                    on_result(record)
+
+    return stats
@@ -7,12 +7,19 @@
 
 import os
 import json
+import asyncio
 import requests
+import httpx
 import time
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterator
 from dataclasses import dataclass
 import logging
 
+from async_pool import get_async_pool
+from context_packer import estimate_tokens
+from rate_limiter import backoff_delay, get_shared_limiter, parse_retry_after
+from response_cache import get_default_cache, make_cache_key
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,22 +35,89 @@ class DoubaoConfig:
     temperature: float = 0.7
     timeout: int = 60
     max_retries: int = 3
+    # 账号配额，0 表示不限（两者都为 0 时不启用限流）；同一接入点的客户端共享
+    requests_per_minute: float = float(os.getenv("DOUBAO_RPM", "0"))
+    tokens_per_minute: float = float(os.getenv("DOUBAO_TPM", "0"))
+    # 跨进程共享配额的状态文件，为空时只在进程内共享
+    rate_limit_state: str = os.getenv("DOUBAO_RATE_LIMIT_STATE", "")
+
+# 这些状态码表示限流或服务端临时故障，可以重试
+RETRY_STATUS = (429, 500, 502, 503, 504)
 
 class DoubaoClient:
     """豆包大模型客户端"""
 
-    def __init__(self, config: Optional[DoubaoConfig] = None):
+    def __init__(self, config: Optional[DoubaoConfig] = None, cache=None, rate_limiter=None):
+        """
+        Args:
+            config: 客户端配置
+            cache: 响应缓存，默认使用进程内共享缓存（Config.LLM_CACHE_ENABLED 关闭时不缓存）
+            rate_limiter: 限流器，默认按接入点共享（见 DoubaoConfig 的配额字段）；
+                没有传入且未配置配额时不限流
+        """
         self.config = config or DoubaoConfig()
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.cache = cache if cache is not None else get_default_cache()
+        self.rate_limiter = rate_limiter
+        if rate_limiter is None and (self.config.requests_per_minute or self.config.tokens_per_minute):
+            self.rate_limiter = get_shared_limiter(
+                f"doubao:{self.config.endpoint_id}",
+                self.config.requests_per_minute,
+                self.config.tokens_per_minute,
+                self.config.rate_limit_state or None
+            )
+        self.headers = {
             "Authorization": f"Bearer {self.config.api_key}",
             "Content-Type": "application/json"
-        })
+        }
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+
+    @staticmethod
+    def _cache_key(payload: Dict[str, Any]) -> str:
+        """根据请求体生成缓存键，流式相关参数不影响输出内容"""
+        extra = {k: v for k, v in payload.items()
+                 if k not in ("model", "messages", "temperature", "max_tokens", "stream", "stream_options")}
+        return make_cache_key(payload["model"], payload["messages"],
+                              payload["temperature"], payload["max_tokens"], **extra)
+
+    @staticmethod
+    def _estimate_tokens(payload: Dict[str, Any]) -> int:
+        """预估一次请求的 token 用量（输入估算 + 输出上限），用于预扣 TPM 配额"""
+        prompt = sum(estimate_tokens(m.get("content") or "") for m in payload["messages"])
+        return prompt + payload["max_tokens"]
+
+    def _acquire(self, estimated: int):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(estimated)
+
+    async def _aacquire(self, estimated: int):
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(estimated)
+
+    def _settle(self, estimated: int, actual: Optional[float]):
+        """按实际用量修正预扣的 token；请求失败或超时时 actual 传 0，全部退还"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(estimated, actual)
+
+    def _retry_delay(self, attempt: int, status_code: int, headers, estimated: int) -> float:
+        """
+        计算可重试状态码的等待时间
+
+        被限流（429）时按 Retry-After 暂停所有共享该限流器的调用方；
+        被拒绝的请求没有消耗 token，退还预扣的配额。
+        """
+        self._settle(estimated, 0)
+        delay = backoff_delay(attempt, parse_retry_after(headers.get("Retry-After")))
+        if status_code == 429 and self.rate_limiter is not None:
+            self.rate_limiter.block(delay)
+        logger.warning(f"豆包大模型返回 {status_code}，{delay:.1f} 秒后重试 (尝试 {attempt + 1})")
+        return delay
 
     def chat_completion(self,
                        messages: List[Dict[str, str]],
                        temperature: Optional[float] = None,
                        max_tokens: Optional[int] = None,
+                       use_cache: bool = True,
                        **kwargs) -> Dict[str, Any]:
         """
         调用豆包大模型对话接口
@@ -52,6 +126,7 @@ class DoubaoClient:
             messages: 对话消息列表，格式：[{"role": "user", "content": "..."}]
             temperature: 温度参数，控制随机性
             max_tokens: 最大生成token数
+            use_cache: 是否读写响应缓存
             **kwargs: 其他参数
 
         Returns:
@@ -67,32 +142,278 @@ class DoubaoClient:
             **kwargs
         }
 
+        cache = self.cache if use_cache else None
+        key = self._cache_key(payload)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                logger.info("豆包大模型命中响应缓存")
+                return cached
+
+        estimated = self._estimate_tokens(payload)
         for attempt in range(self.config.max_retries):
+            self._acquire(estimated)
             try:
                 logger.info(f"发送请求到豆包大模型 (尝试 {attempt + 1}/{self.config.max_retries}): {url}")
                 response = self.session.post(url, json=payload, timeout=self.config.timeout)
+                if response.status_code in RETRY_STATUS and attempt < self.config.max_retries - 1:
+                    time.sleep(self._retry_delay(attempt, response.status_code, response.headers, estimated))
+                    continue
                 response.raise_for_status()
 
                 result = response.json()
                 logger.info(f"豆包大模型响应成功，tokens: {result.get('usage', {})}")
+                self._settle(estimated, result.get("usage", {}).get("total_tokens"))
+                if cache is not None:
+                    cache.set(key, result)
                 return result
 
             except requests.exceptions.Timeout as e:
                 logger.warning(f"请求超时 (尝试 {attempt + 1}): {e}")
+                # 超时的请求按未消耗处理，退还预扣的 token
+                self._settle(estimated, 0)
                 if attempt < self.config.max_retries - 1:
-                    time.sleep(2 ** attempt)  # 指数退避
+                    time.sleep(backoff_delay(attempt))  # 带抖动的指数退避
                 else:
                     raise
+            except requests.exceptions.HTTPError as e:
+                # 参数错误、鉴权失败等重试也不会成功；被拒绝的请求不计入 token 用量
+                logger.error(f"豆包大模型API请求失败: {e}")
+                self._settle(estimated, 0)
+                raise
             except requests.exceptions.RequestException as e:
                 logger.error(f"豆包大模型API请求失败: {e}")
+                self._settle(estimated, 0)
+                if attempt < self.config.max_retries - 1:
+                    time.sleep(backoff_delay(attempt))
+                else:
+                    raise
+            except json.JSONDecodeError as e:
+                logger.error(f"豆包大模型响应解析失败: {e}")
+                self._settle(estimated, 0)
+                raise
+
+    async def achat_completion(self,
+                               messages: List[Dict[str, str]],
+                               temperature: Optional[float] = None,
+                               max_tokens: Optional[int] = None,
+                               use_cache: bool = True,
+                               **kwargs) -> Dict[str, Any]:
+        """
+        异步调用豆包大模型对话接口
+
+        与 chat_completion 参数和返回值一致，但使用进程内共享的
+        httpx 连接池，并受全局并发信号量限制。
+
+        Args:
+            messages: 对话消息列表，格式：[{"role": "user", "content": "..."}]
+            temperature: 温度参数，控制随机性
+            max_tokens: 最大生成token数
+            use_cache: 是否读写响应缓存
+            **kwargs: 其他参数
+
+        Returns:
+            API响应结果
+        """
+        url = f"{self.config.base_url}/chat/completions"
+
+        payload = {
+            "model": self.config.model,
+            "messages": messages,
+            "temperature": temperature or self.config.temperature,
+            "max_tokens": max_tokens or self.config.max_tokens,
+            **kwargs
+        }
+
+        cache = self.cache if use_cache else None
+        key = self._cache_key(payload)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                logger.info("豆包大模型命中响应缓存")
+                return cached
+
+        pool = get_async_pool()
+        estimated = self._estimate_tokens(payload)
+        for attempt in range(self.config.max_retries):
+            await self._aacquire(estimated)
+            try:
+                logger.info(f"发送异步请求到豆包大模型 (尝试 {attempt + 1}/{self.config.max_retries}): {url}")
+                async with pool.semaphore:
+                    response = await pool.http_client.post(
+                        url, json=payload, headers=self.headers, timeout=self.config.timeout
+                    )
+                if response.status_code in RETRY_STATUS and attempt < self.config.max_retries - 1:
+                    await asyncio.sleep(self._retry_delay(attempt, response.status_code, response.headers, estimated))
+                    continue
+                response.raise_for_status()
+
+                result = response.json()
+                logger.info(f"豆包大模型响应成功，tokens: {result.get('usage', {})}")
+                self._settle(estimated, result.get("usage", {}).get("total_tokens"))
+                if cache is not None:
+                    cache.set(key, result)
+                return result
+
+            except httpx.TimeoutException as e:
+                logger.warning(f"请求超时 (尝试 {attempt + 1}): {e}")
+                # 超时的请求按未消耗处理，退还预扣的 token
+                self._settle(estimated, 0)
+                if attempt < self.config.max_retries - 1:
+                    await asyncio.sleep(backoff_delay(attempt))  # 带抖动的指数退避
+                else:
+                    raise
+            except httpx.HTTPStatusError as e:
+                logger.error(f"豆包大模型API请求失败: {e}")
+                self._settle(estimated, 0)
+                raise
+            except httpx.HTTPError as e:
+                logger.error(f"豆包大模型API请求失败: {e}")
+                self._settle(estimated, 0)
                 if attempt < self.config.max_retries - 1:
-                    time.sleep(1)
+                    await asyncio.sleep(backoff_delay(attempt))
                 else:
                     raise
             except json.JSONDecodeError as e:
                 logger.error(f"豆包大模型响应解析失败: {e}")
+                self._settle(estimated, 0)
                 raise
 
+    def chat_completion_stream(self,
+                               messages: List[Dict[str, str]],
+                               temperature: Optional[float] = None,
+                               max_tokens: Optional[int] = None,
+                               **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        以流式(SSE)方式调用豆包大模型对话接口，逐段返回增量内容
+
+        只在收到首个数据块之前重试；一旦开始输出，中途失败会直接抛出，
+        避免调用方收到重复的内容。
+
+        Args:
+            messages: 对话消息列表，格式：[{"role": "user", "content": "..."}]
+            temperature: 温度参数，控制随机性
+            max_tokens: 最大生成token数
+            **kwargs: 其他参数
+
+        Yields:
+            增量块 {"delta": "..."}；最后一块额外包含
+            "content"(完整内容)、"usage"(token统计) 和 "finish_reason"
+        """
+        url = f"{self.config.base_url}/chat/completions"
+
+        payload = {
+            "model": self.config.model,
+            "messages": messages,
+            "temperature": temperature or self.config.temperature,
+            "max_tokens": max_tokens or self.config.max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            **kwargs
+        }
+
+        key = self._cache_key(payload)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                # 命中缓存时一次性输出完整内容
+                logger.info("豆包大模型命中响应缓存")
+                choice = cached["choices"][0]
+                content = choice["message"]["content"]
+                yield {"delta": content}
+                yield {
+                    "delta": "",
+                    "content": content,
+                    "usage": cached.get("usage", {}),
+                    "finish_reason": choice.get("finish_reason")
+                }
+                return
+
+        response = None
+        estimated = self._estimate_tokens(payload)
+        for attempt in range(self.config.max_retries):
+            self._acquire(estimated)
+            try:
+                logger.info(f"发送流式请求到豆包大模型 (尝试 {attempt + 1}/{self.config.max_retries}): {url}")
+                response = self.session.post(url, json=payload, timeout=self.config.timeout, stream=True)
+                if response.status_code in RETRY_STATUS and attempt < self.config.max_retries - 1:
+                    response.close()
+                    time.sleep(self._retry_delay(attempt, response.status_code, response.headers, estimated))
+                    continue
+                response.raise_for_status()
+                break
+            except requests.exceptions.Timeout as e:
+                logger.warning(f"请求超时 (尝试 {attempt + 1}): {e}")
+                # 超时的请求按未消耗处理，退还预扣的 token
+                self._settle(estimated, 0)
+                if attempt < self.config.max_retries - 1:
+                    time.sleep(backoff_delay(attempt))  # 带抖动的指数退避
+                else:
+                    raise
+            except requests.exceptions.HTTPError as e:
+                logger.error(f"豆包大模型API请求失败: {e}")
+                self._settle(estimated, 0)
+                raise
+            except requests.exceptions.RequestException as e:
+                logger.error(f"豆包大模型API请求失败: {e}")
+                self._settle(estimated, 0)
+                if attempt < self.config.max_retries - 1:
+                    time.sleep(backoff_delay(attempt))
+                else:
+                    raise
+
+        parts: List[str] = []
+        usage: Dict[str, Any] = {}
+        finish_reason = None
+        completed = False
+        # text/event-stream 未声明 charset 时 requests 会按 ISO-8859-1 解码
+        response.encoding = "utf-8"
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                # SSE 以空行分隔事件，只关心 data 字段
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                for choice in chunk.get("choices", []):
+                    delta = choice.get("delta", {}).get("content") or ""
+                    if choice.get("finish_reason"):
+                        finish_reason = choice["finish_reason"]
+                    if delta:
+                        parts.append(delta)
+                        yield {"delta": delta}
+            completed = True
+        finally:
+            response.close()
+            if not completed:
+                # 中途失败或调用方停止读取：按输入和已输出的内容估算实际用量，退还其余部分
+                self._settle(estimated, estimated - payload["max_tokens"] + estimate_tokens("".join(parts)))
+
+        logger.info(f"豆包大模型流式响应完成，tokens: {usage}")
+        self._settle(estimated, usage.get("total_tokens"))
+        content = "".join(parts)
+        if self.cache is not None and finish_reason == "stop":
+            # 与非流式接口共用缓存，按完整响应的结构存储
+            self.cache.set(key, {
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason
+                }],
+                "usage": usage
+            })
+        yield {
+            "delta": "",
+            "content": content,
+            "usage": usage,
+            "finish_reason": finish_reason
+        }
+
     def generate_teaching_content(self, topic: str, grade_level: str = "初中") -> str:
         """
         生成教学内容
@@ -218,7 +539,8 @@ class DoubaoClient:
             messages = [
                 {"role": "user", "content": "请简单介绍一下你自己。"}
             ]
-            response = self.chat_completion(messages, max_tokens=100)
+            # 连接测试必须真正请求一次，不能读缓存
+            response = self.chat_completion(messages, max_tokens=100, use_cache=False)
             return "choices" in response and len(response["choices"]) > 0
         except Exception as e:
             logger.error(f"连接测试失败: {e}")
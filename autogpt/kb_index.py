@@ -0,0 +1,421 @@
+"""
+知识库倒排索引：中文字符 bigram 分词 + BM25 排序
+
+索引有两种存储格式：
+- JSON（InvertedIndex.save / load）：加载后倒排链全部在进程内存中，适合小语料
+- 内存映射二进制（InvertedIndex.save_mapped / MappedInvertedIndex）：词项表和倒排链
+  直接映射文件，多个 worker 进程共享操作系统页缓存，加载时不解析任何倒排链，
+  适合与 kb_store 配合的大语料
+"""
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# 连续的中日韩字符，或连续的字母数字
+_TOKEN_PATTERN = re.compile(r"[㐀-鿿豈-﫿]+|[a-z0-9]+")
+
+INDEX_VERSION = 1
+
+MAPPED_MAGIC = b"KBPOST\x01\x00"
+# magic | 文档数 | 词项数 | 平均文档长度 | k1 | b | 语料指纹（十六进制）
+_MAPPED_HEADER = struct.Struct("=8sQQddd64s")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词：中文按相邻两字切分（bigram），英文数字按单词切分
+
+    例如 "分数加法 fraction" -> ["分数", "数加", "加法", "fraction"]
+
+    Args:
+        text: 文本内容
+
+    Returns:
+        词项列表（保留重复，用于统计词频）
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if run[0].isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def corpus_fingerprint(texts: Iterable[str]) -> str:
+    """计算语料指纹，语料变化时用于判断磁盘上的索引是否失效"""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class InvertedIndex:
+    """
+    倒排索引 + BM25 排序
+
+    文档以整数ID（在构建语料中的位置）标识，索引只保存词项统计，
+    原文由调用方自行保存。IDF 和文档长度归一化因子在加载时预先计算，
+    查询只需遍历查询词项的倒排链。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.fingerprint = ""
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+        self._idf: Dict[str, float] = {}
+        self._norms: List[float] = []
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = 1.5, b: float = 0.75,
+              fingerprint: Optional[str] = None) -> "InvertedIndex":
+        """
+        从文档序列构建索引
+
+        Args:
+            texts: 文档文本序列（可以是只遍历一次的迭代器），文档ID即下标
+            k1: BM25 词频饱和参数
+            b: BM25 文档长度归一化参数
+            fingerprint: 语料指纹，为 None 时根据文本计算
+
+        Returns:
+            构建好的索引
+        """
+        index = cls(k1=k1, b=b)
+        postings = defaultdict(list)
+        digest = hashlib.sha256()
+        for doc_id, text in enumerate(texts):
+            if fingerprint is None:
+                digest.update(text.encode("utf-8"))
+                digest.update(b"\x00")
+            counts = Counter(tokenize(text))
+            index.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+        index.postings = dict(postings)
+        index.fingerprint = fingerprint or digest.hexdigest()
+        index._prepare()
+        return index
+
+    def _prepare(self):
+        n = len(self.doc_lengths)
+        avgdl = (sum(self.doc_lengths) / n) if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        self._norms = [
+            self.k1 * (1 - self.b + self.b * (length / avgdl if avgdl else 0.0))
+            for length in self.doc_lengths
+        ]
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def _term(self, term: str) -> Optional[Tuple[float, Iterable[Tuple[int, int]]]]:
+        """词项的 (IDF, 倒排链)，不在索引中时为 None"""
+        idf = self._idf.get(term)
+        if idf is None:
+            return None
+        return idf, self.postings[term]
+
+    def _norm(self, doc_id: int) -> float:
+        return self._norms[doc_id]
+
+    def search(self, query: str, top_k: int = 5,
+               allowed: Optional[Set[int]] = None,
+               min_coverage: float = 0.0, min_terms: int = 1) -> List[Tuple[int, float]]:
+        """
+        BM25 检索
+
+        BM25 得分只要有一个词项命中就大于 0，"如何提高学生的学习兴趣" 这类问题
+        会因为共同的 "学习" 命中不相关的段落；min_coverage / min_terms 要求文档
+        命中足够多的查询词项，否则不返回。
+
+        Args:
+            query: 查询文本
+            top_k: 返回结果数
+            allowed: 只在这些文档ID中检索（如按学科过滤），None 表示不限
+            min_coverage: 文档命中的词项占查询词项（去重）的最低比例
+            min_terms: 文档至少命中的查询词项数（查询词项更少时以查询词项数为准）
+
+        Returns:
+            [(文档ID, 得分)]，按得分从高到低排列
+        """
+        terms = set(tokenize(query))
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, int] = defaultdict(int)
+        for term in terms:
+            entry = self._term(term)
+            if entry is None:
+                continue
+            idf, postings = entry
+            for doc_id, tf in postings:
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self._norm(doc_id))
+                matched[doc_id] += 1
+        required = max(min(min_terms, len(terms)), math.ceil(min_coverage * len(terms) - 1e-9))
+        if required > 1:
+            scores = {doc_id: score for doc_id, score in scores.items() if matched[doc_id] >= required}
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def save(self, path: str):
+        """
+        保存索引到磁盘（JSON）
+
+        Args:
+            path: 文件路径
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "version": INDEX_VERSION,
+            "fingerprint": self.fingerprint,
+            "k1": self.k1,
+            "b": self.b,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "InvertedIndex":
+        """
+        从磁盘加载索引
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            索引
+
+        Raises:
+            ValueError: 索引格式版本不匹配
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"索引版本不匹配: {data.get('version')}")
+        index = cls(k1=data["k1"], b=data["b"])
+        index.fingerprint = data["fingerprint"]
+        index.doc_lengths = data["doc_lengths"]
+        index.postings = {term: [tuple(p) for p in docs] for term, docs in data["postings"].items()}
+        index._prepare()
+        return index
+
+    def save_mapped(self, path: str):
+        """
+        保存为内存映射格式（见 MappedInvertedIndex）
+
+        文件格式（整数均为本机字节序）：
+
+            头部（_MAPPED_HEADER）
+            文档长度：n 个 uint32（补齐到 8 字节）
+            词项偏移：t+1 个 uint64，词项按 UTF-8 字节序排序
+            倒排偏移：t+1 个 uint64，单位为 (文档ID, 词频) 对
+            词项区：UTF-8 文本依次拼接（补齐到 4 字节）
+            倒排区：(文档ID, 词频) uint32 对依次拼接
+
+        Args:
+            path: 文件路径
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        n = len(self.doc_lengths)
+        avgdl = (sum(self.doc_lengths) / n) if n else 0.0
+        encoded = sorted((term.encode("utf-8"), term) for term in self.postings)
+
+        term_offsets, posting_offsets = array("Q", [0]), array("Q", [0])
+        for raw, term in encoded:
+            term_offsets.append(term_offsets[-1] + len(raw))
+            posting_offsets.append(posting_offsets[-1] + len(self.postings[term]))
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(_MAPPED_HEADER.pack(MAPPED_MAGIC, n, len(encoded), avgdl, self.k1, self.b,
+                                          self.fingerprint.encode("ascii")))
+            array("I", self.doc_lengths).tofile(out)
+            out.write(b"\x00" * (-4 * n % 8))
+            term_offsets.tofile(out)
+            posting_offsets.tofile(out)
+            for raw, _ in encoded:
+                out.write(raw)
+            out.write(b"\x00" * (-term_offsets[-1] % 4))
+            for _, term in encoded:
+                pairs = array("I")
+                for doc_id, tf in self.postings[term]:
+                    pairs.append(doc_id)
+                    pairs.append(tf)
+                pairs.tofile(out)
+        os.replace(tmp_path, path)
+
+
+class MappedInvertedIndex(InvertedIndex):
+    """
+    只读的内存映射倒排索引（InvertedIndex.save_mapped 生成的文件）
+
+    查询时在排好序的词项表上二分查找，IDF 和文档长度归一化因子按需计算，
+    进程内不保存词项字典和倒排链。
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 索引文件路径
+
+        Raises:
+            ValueError: 文件格式不正确
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        magic, n, t, avgdl, k1, b, fingerprint = _MAPPED_HEADER.unpack_from(self._mm, 0)
+        if magic != MAPPED_MAGIC:
+            self.close()
+            raise ValueError(f"不是倒排索引文件: {path}")
+        super().__init__(k1=k1, b=b)
+        self.fingerprint = fingerprint.rstrip(b"\x00").decode("ascii")
+        self._count = n
+        self._term_count = t
+        self._avgdl = avgdl
+
+        offset = _MAPPED_HEADER.size
+        self._lengths = self._view(offset, offset + 4 * n, "I")
+        offset += 4 * n + (-4 * n % 8)
+        self._term_offsets = self._view(offset, offset + 8 * (t + 1), "Q")
+        offset += 8 * (t + 1)
+        self._posting_offsets = self._view(offset, offset + 8 * (t + 1), "Q")
+        offset += 8 * (t + 1)
+        self._terms_start = offset
+        offset += self._term_offsets[t] + (-self._term_offsets[t] % 4)
+        self._pairs = self._view(offset, offset + 8 * self._posting_offsets[t], "I")
+
+    def _view(self, start: int, end: int, fmt: str) -> memoryview:
+        view = memoryview(self._mm)[start:end].cast(fmt)
+        self._views.append(view)
+        return view
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def doc_lengths(self):
+        return self._lengths
+
+    @doc_lengths.setter
+    def doc_lengths(self, value):
+        # InvertedIndex.__init__ 会赋初值，映射索引的文档长度只读
+        pass
+
+    def _term_bytes(self, i: int) -> bytes:
+        start = self._terms_start + self._term_offsets[i]
+        return self._mm[start:self._terms_start + self._term_offsets[i + 1]]
+
+    def _term(self, term: str) -> Optional[Tuple[float, Iterable[Tuple[int, int]]]]:
+        raw = term.encode("utf-8")
+        i = bisect_left(_TermTable(self), raw)
+        if i >= self._term_count or self._term_bytes(i) != raw:
+            return None
+        start, end = self._posting_offsets[i], self._posting_offsets[i + 1]
+        df = end - start
+        idf = math.log(1 + (self._count - df + 0.5) / (df + 0.5))
+        return idf, self._iter_pairs(start, end)
+
+    def _iter_pairs(self, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        pairs = self._pairs
+        for i in range(2 * start, 2 * end, 2):
+            yield pairs[i], pairs[i + 1]
+
+    def _norm(self, doc_id: int) -> float:
+        ratio = self._lengths[doc_id] / self._avgdl if self._avgdl else 0.0
+        return self.k1 * (1 - self.b + self.b * ratio)
+
+    def save(self, path: str):
+        raise NotImplementedError("映射索引是只读的")
+
+    def close(self):
+        """释放映射和文件句柄"""
+        for view in getattr(self, "_views", []):
+            view.release()
+        self._views = []
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+
+class _TermTable:
+    """把映射索引的词项表包装成序列，供 bisect 二分查找（按需解码单个词项）"""
+
+    def __init__(self, index: MappedInvertedIndex):
+        self._index = index
+
+    def __len__(self) -> int:
+        return self._index._term_count
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._index._term_bytes(i)
+
+
+def load_or_build_index(texts: Iterable[str], path: Optional[str] = None,
+                        fingerprint: Optional[str] = None, mapped: bool = False) -> InvertedIndex:
+    """
+    优先加载磁盘上的索引，语料变化或文件不可用时重新构建并保存
+
+    Args:
+        texts: 文档文本序列
+        path: 索引文件路径，为 None 时只在内存中构建
+        fingerprint: 语料指纹；提供时命中磁盘索引就不再遍历 texts，
+            适合由存储文件预先计算好指纹的大语料
+        mapped: 使用内存映射格式（MappedInvertedIndex），倒排链不加载到进程内存；
+            需要提供 path
+
+    Returns:
+        索引
+    """
+    if fingerprint is None:
+        texts = list(texts)
+        fingerprint = corpus_fingerprint(texts)
+
+    if path and os.path.exists(path):
+        try:
+            index = MappedInvertedIndex(path) if mapped else InvertedIndex.load(path)
+            if index.fingerprint == fingerprint:
+                return index
+            if mapped:
+                index.close()
+        except (OSError, ValueError, KeyError, struct.error):
+            pass
+
+    index = InvertedIndex.build(texts, fingerprint=fingerprint)
+    if path:
+        try:
+            if mapped:
+                index.save_mapped(path)
+                # 构建用的倒排链随 index 一起释放，之后与其他进程共享映射
+                return MappedInvertedIndex(path)
+            index.save(path)
+        except OSError as e:
+            print(f"保存索引出错: {e}")
+    return index
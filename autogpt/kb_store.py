@@ -0,0 +1,227 @@
+"""
+磁盘知识库存储：内存映射的字符串表 + 偏移量表
+
+文件格式（整数均为本机字节序的 uint64）：
+
+    magic(8) | 记录数 n(8) | 语料指纹 sha256(32)
+    偏移量表：3n+1 个 uint64，第 i 条记录的 subject/topic/content
+              分别是字符串区 [off[3i], off[3i+1]) / [off[3i+1], off[3i+2]) / [off[3i+2], off[3i+3])
+    字符串区：UTF-8 文本依次拼接
+
+文件以只读方式 mmap，多个 Agent 进程打开同一文件时共享操作系统页缓存；
+正文只在被访问时才解码，未命中的段落不会占用进程内存。
+"""
+import csv
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, Tuple
+
+MAGIC = b"KBSTORE\x01"
+_HEADER = struct.Struct("=8sQ32s")
+FIELDS = ("subject", "topic", "content")
+
+
+class KnowledgeStore:
+    """只读的内存映射知识库"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 由 KnowledgeStore.write 生成的文件路径
+
+        Raises:
+            ValueError: 文件格式不正确
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, fingerprint = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"不是知识库存储文件: {path}")
+        self._count = count
+        self.fingerprint = fingerprint.hex()
+        table_start = _HEADER.size
+        self._data_start = table_start + (len(FIELDS) * count + 1) * 8
+        # 偏移量表直接映射为 uint64 视图，不拷贝
+        self._offsets = memoryview(self._mm)[table_start:self._data_start].cast("Q")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def field(self, index: int, name: str) -> str:
+        """
+        读取单个字段（按需解码）
+
+        Args:
+            index: 记录下标
+            name: 字段名 subject / topic / content
+
+        Returns:
+            字段文本
+        """
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        slot = len(FIELDS) * index + FIELDS.index(name)
+        start = self._data_start + self._offsets[slot]
+        end = self._data_start + self._offsets[slot + 1]
+        return self._mm[start:end].decode("utf-8")
+
+    def __getitem__(self, index: int) -> Tuple[str, str, str]:
+        """读取一条记录 (subject, topic, content)"""
+        return tuple(self.field(index, name) for name in FIELDS)
+
+    def __iter__(self) -> Iterator[Tuple[str, str, str]]:
+        for i in range(self._count):
+            yield self[i]
+
+    def close(self):
+        """释放映射和文件句柄"""
+        if getattr(self, "_offsets", None) is not None:
+            self._offsets.release()
+            self._offsets = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def write(path: str, records: Iterable[Dict[str, str]]) -> int:
+        """
+        流式写入知识库文件
+
+        正文先顺序写入临时文件，只在内存中保留偏移量表，
+        因此可以处理远大于内存的语料。
+
+        Args:
+            path: 目标文件路径
+            records: 记录迭代器，每条包含 subject、topic、content
+
+        Returns:
+            写入的记录数
+        """
+        offsets = array("Q", [0])
+        digest = hashlib.sha256()
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        with tempfile.TemporaryFile(dir=directory) as blob:
+            position = 0
+            for record in records:
+                for name in FIELDS:
+                    data = str(record.get(name) or "").encode("utf-8")
+                    blob.write(data)
+                    digest.update(data)
+                    digest.update(b"\x00")
+                    position += len(data)
+                    offsets.append(position)
+            count = (len(offsets) - 1) // len(FIELDS)
+
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as out:
+                out.write(_HEADER.pack(MAGIC, count, digest.digest()))
+                offsets.tofile(out)
+                blob.seek(0)
+                shutil.copyfileobj(blob, out)
+            os.replace(tmp_path, path)
+        return count
+
+
+def _load_jsonl(path: str) -> Iterator[Dict[str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                record.setdefault("content", record.get("text", ""))
+                yield record
+
+
+def _load_csv(path: str) -> Iterator[Dict[str, str]]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            row.setdefault("content", row.get("text", ""))
+            yield row
+
+
+def _load_text_dir(path: str) -> Iterator[Dict[str, str]]:
+    # 目录结构：<学科>/<主题>.txt
+    for subject in sorted(os.listdir(path)):
+        subject_dir = os.path.join(path, subject)
+        if not os.path.isdir(subject_dir):
+            continue
+        for name in sorted(os.listdir(subject_dir)):
+            if name.endswith(".txt"):
+                with open(os.path.join(subject_dir, name), "r", encoding="utf-8") as f:
+                    yield {"subject": subject, "topic": name[:-4], "content": f.read()}
+
+
+LOADERS: Dict[str, Callable[[str], Iterator[Dict[str, str]]]] = {
+    ".jsonl": _load_jsonl,
+    ".csv": _load_csv,
+}
+
+
+def register_loader(extension: str, loader: Callable[[str], Iterator[Dict[str, str]]]):
+    """
+    注册语料加载器
+
+    Args:
+        extension: 文件扩展名，如 ".parquet"
+        loader: loader(path) -> 记录迭代器
+    """
+    LOADERS[extension.lower()] = loader
+
+
+def load_records(source: str) -> Iterator[Dict[str, str]]:
+    """
+    按来源类型读取语料记录
+
+    Args:
+        source: 文件路径（按扩展名选择加载器）或 <学科>/<主题>.txt 结构的目录
+
+    Returns:
+        记录迭代器
+    """
+    if os.path.isdir(source):
+        return _load_text_dir(source)
+    extension = os.path.splitext(source)[1].lower()
+    if extension not in LOADERS:
+        raise ValueError(f"不支持的语料格式: {extension}")
+    return LOADERS[extension](source)
+
+
+def build_store(source: str, path: str) -> int:
+    """
+    把语料转换为知识库存储文件
+
+    Args:
+        source: 语料来源，见 load_records
+        path: 输出文件路径
+
+    Returns:
+        记录数
+    """
+    return KnowledgeStore.write(path, load_records(source))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="构建知识库存储文件")
+    parser.add_argument("source", help="语料文件（.jsonl/.csv）或目录")
+    parser.add_argument("output", help="输出文件路径")
+    args = parser.parse_args()
+    print(f"✅ 写入 {build_store(args.source, args.output)} 条记录 -> {args.output}")
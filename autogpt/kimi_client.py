@@ -1,19 +1,58 @@
 """Kimi API 客户端"""
-from openai import OpenAI
+import asyncio
+import threading
+from openai import OpenAI, AsyncOpenAI
 from config import Config
+from async_pool import get_async_pool
+from prefix_cache import get_default_prefix_cache
+from response_cache import get_default_cache, make_cache_key
+
+# 指令模板放在系统消息里，与系统提示词一起构成稳定前缀，可被服务端缓存复用
+PLAN_INSTRUCTIONS = """作为中小学教学助手，请分析用户给出的问题并制定解决步骤。
+
+请按照以下格式输出规划步骤（每步一行，用数字编号）：
+1. 第一步：...
+2. 第二步：...
+3. 第三步：...
+
+只输出步骤，不要其他说明。"""
+
+ANALYZE_INSTRUCTIONS = """请基于用户给出的问题和相关上下文信息回答中小学教学相关问题。
+
+请提供详细、准确、易懂的回答，确保符合中小学教学要求。"""
 
 
 class KimiClient:
     """Kimi API 客户端封装"""
     
-    def __init__(self):
+    def __init__(self, *, cache=None, prefix_cache=None):
+        """
+        Args:
+            cache: 响应缓存，默认使用进程内共享缓存（Config.LLM_CACHE_ENABLED 关闭时不缓存）
+            prefix_cache: 提示词前缀缓存，默认使用进程内共享实例（见 Config.PREFIX_CACHE_MODE）
+        """
         self.client = OpenAI(
             api_key=Config.KIMI_API_KEY,
             base_url=Config.KIMI_API_BASE
         )
         self.model = Config.KIMI_MODEL
+        self._async_client = None
+        self._async_http_client = None
+        self.cache = cache if cache is not None else get_default_cache()
+        self.prefix_cache = prefix_cache if prefix_cache is not None else get_default_prefix_cache()
+        self._local = threading.local()
     
-    def chat(self, messages, temperature=None, max_tokens=None):
+    @property
+    def last_usage(self):
+        """
+        当前线程最近一次调用的提示词用量
+        
+        {"prompt_tokens", "cached_tokens", "uncached_tokens"}；
+        命中响应缓存时均为 0，尚未调用时为 None
+        """
+        return getattr(self._local, "last_usage", None)
+    
+    def chat(self, messages, temperature=None, max_tokens=None, prefix=None, **kwargs):
         """
         调用 Kimi API 进行对话
         
@@ -21,17 +60,100 @@ class KimiClient:
             messages: 消息列表，格式为 [{"role": "user", "content": "..."}]
             temperature: 温度参数，默认使用配置值
             max_tokens: 最大 token 数，默认使用配置值
+            prefix: 放在 messages 之前的稳定前缀（系统提示词、指令模板），
+                交给前缀缓存处理
+            **kwargs: 透传给接口的其他参数（如 response_format）
         
         Returns:
             API 响应内容
         """
+        temperature = temperature or Config.TEMPERATURE
+        max_tokens = max_tokens or Config.MAX_TOKENS
+        prefix = prefix or []
+        key = make_cache_key(self.model, prefix + messages, temperature, max_tokens, **kwargs)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._local.last_usage = {"prompt_tokens": 0, "cached_tokens": 0, "uncached_tokens": 0}
+                return cached
+        
+        if prefix:
+            request_messages, prefix_info = self.prefix_cache.build(self.model, prefix, messages)
+        else:
+            request_messages, prefix_info = messages, {"cache_id": None, "prefix_tokens": 0}
         response = self.client.chat.completions.create(
             model=self.model,
-            messages=messages,
-            temperature=temperature or Config.TEMPERATURE,
-            max_tokens=max_tokens or Config.MAX_TOKENS
+            messages=request_messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **kwargs
         )
-        return response.choices[0].message.content
+        self._local.last_usage = self.prefix_cache.record(prefix_info, response.usage)
+        content = response.choices[0].message.content
+        if self.cache is not None and content:
+            self.cache.set(key, content)
+        return content
+    
+    async def achat(self, messages, temperature=None, max_tokens=None, prefix=None, **kwargs):
+        """
+        异步调用 Kimi API 进行对话
+        
+        使用进程内共享的连接池，并受全局并发信号量限制，
+        可以用 asyncio.gather 同时发起大量请求。
+        
+        Args:
+            messages: 消息列表，格式为 [{"role": "user", "content": "..."}]
+            temperature: 温度参数，默认使用配置值
+            max_tokens: 最大 token 数，默认使用配置值
+            prefix: 放在 messages 之前的稳定前缀，同 chat
+            **kwargs: 透传给接口的其他参数，同 chat
+        
+        Returns:
+            API 响应内容
+        """
+        temperature = temperature or Config.TEMPERATURE
+        max_tokens = max_tokens or Config.MAX_TOKENS
+        prefix = prefix or []
+        key = make_cache_key(self.model, prefix + messages, temperature, max_tokens, **kwargs)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._local.last_usage = {"prompt_tokens": 0, "cached_tokens": 0, "uncached_tokens": 0}
+                return cached
+        
+        if prefix:
+            # 注册 / 查询前缀缓存是同步网络请求，放到线程里执行，不阻塞事件循环
+            request_messages, prefix_info = await asyncio.to_thread(
+                self.prefix_cache.build, self.model, prefix, messages
+            )
+        else:
+            request_messages, prefix_info = messages, {"cache_id": None, "prefix_tokens": 0}
+        pool = get_async_pool()
+        async with pool.semaphore:
+            response = await self._get_async_client(pool).chat.completions.create(
+                model=self.model,
+                messages=request_messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **kwargs
+            )
+        self._local.last_usage = self.prefix_cache.record(prefix_info, response.usage)
+        content = response.choices[0].message.content
+        if self.cache is not None and content:
+            self.cache.set(key, content)
+        return content
+    
+    def _get_async_client(self, pool):
+        """获取绑定到共享连接池的 AsyncOpenAI 客户端"""
+        http_client = pool.http_client
+        if self._async_client is None or self._async_http_client is not http_client:
+            self._async_client = AsyncOpenAI(
+                api_key=Config.KIMI_API_KEY,
+                base_url=Config.KIMI_API_BASE,
+                http_client=http_client
+            )
+            self._async_http_client = http_client
+        return self._async_client
     
     def plan(self, question):
         """
@@ -43,23 +165,10 @@ class KimiClient:
         Returns:
             规划步骤列表
         """
-        prompt = f"""作为中小学教学助手，请分析以下问题并制定解决步骤：
-
-问题：{question}
-
-请按照以下格式输出规划步骤（每步一行，用数字编号）：
-1. 第一步：...
-2. 第二步：...
-3. 第三步：...
-
-只输出步骤，不要其他说明。"""
-        
-        messages = [
-            {"role": "system", "content": Config.SYSTEM_PROMPT},
-            {"role": "user", "content": prompt}
-        ]
+        prefix = [{"role": "system", "content": f"{Config.SYSTEM_PROMPT}\n\n{PLAN_INSTRUCTIONS}"}]
+        messages = [{"role": "user", "content": f"问题：{question}"}]
         
-        result = self.chat(messages)
+        result = self.chat(messages, prefix=prefix)
         # 解析步骤
         steps = []
         for line in result.strip().split('\n'):
@@ -72,29 +181,48 @@ class KimiClient:
                     steps.append(step)
         return steps if steps else [result]
     
-    def analyze(self, question, context=None):
+    def analyze(self, question, context=None, history=None):
         """
         分析问题并生成回答
         
         Args:
             question: 用户问题
             context: 检索到的上下文信息
+            history: 多轮对话的历史消息（见 ConversationMemory.messages）
         
         Returns:
             分析结果
         """
-        context_text = f"\n相关上下文信息：\n{context}\n" if context else ""
-        
-        prompt = f"""请基于以下信息回答中小学教学相关问题：
-
-问题：{question}
-{context_text}
-
-请提供详细、准确、易懂的回答，确保符合中小学教学要求。"""
+        context_text = f"\n\n相关上下文信息：\n{context}" if context else ""
         
+        prefix = [{"role": "system", "content": f"{Config.SYSTEM_PROMPT}\n\n{ANALYZE_INSTRUCTIONS}"}]
         messages = [
-            {"role": "system", "content": Config.SYSTEM_PROMPT},
-            {"role": "user", "content": prompt}
+            *(history or []),
+            {"role": "user", "content": f"问题：{question}{context_text}"}
         ]
         
-        return self.chat(messages)
+        return self.chat(messages, prefix=prefix)
+    
+    def summarize_conversation(self, summary, turns):
+        """
+        把新的对话轮次合并进已有摘要
+        
+        Args:
+            summary: 已有摘要
+            turns: 新的对话轮次 [{"user": ..., "assistant": ...}]
+        
+        Returns:
+            新摘要
+        """
+        dialogue = "\n".join(f"用户：{t['user']}\n助手：{t['assistant']}" for t in turns)
+        prompt = f"""请把下面的新对话合并进已有摘要，输出更新后的摘要。
+保留教学主题、年级学科、用户的偏好和已经确定的结论，省略寒暄和重复内容，不超过300字。
+
+已有摘要：
+{summary or "（无）"}
+
+新对话：
+{dialogue}"""
+        
+        messages = [{"role": "user", "content": prompt}]
+        return self.chat(messages, temperature=0.3, max_tokens=Config.MEMORY_SUMMARY_TOKENS)
@@ -0,0 +1,368 @@
+"""
+多模型路由：在 Kimi 和豆包之间按延迟和健康状况选择，慢请求对冲，连续失败熔断
+
+- 每个服务商记录最近一段时间的延迟（p50 / p95）和错误率
+- 新请求优先发给健康且 p50 最低的服务商
+- 主请求超过对冲阈值仍未返回时，向下一个服务商发起备份请求，先返回的为准
+- 主请求失败时立即改用下一个服务商；4xx 客户端错误（429 除外）说明请求本身有问题，
+  换服务商也不会成功，直接抛出，也不计入熔断统计
+- 连续失败达到阈值时熔断，冷却期内不再路由；冷却后放行一个试探请求，
+  成功则恢复，失败则继续熔断
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import Config
+
+Messages = List[Dict[str, str]]
+
+# 这些 4xx 是暂时性的，可以换服务商重试
+RETRYABLE_CLIENT_STATUS = (408, 429)
+
+
+def is_client_error(error: Exception) -> bool:
+    """
+    是否为请求本身有误的 4xx 错误（参数不合法、鉴权失败等）
+
+    兼容 requests.HTTPError（error.response.status_code）和
+    openai.APIStatusError（error.status_code）。
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in RETRYABLE_CLIENT_STATUS
+
+
+class KimiProvider:
+    """KimiClient 适配器"""
+
+    name = "kimi"
+
+    def __init__(self, client=None):
+        if client is None:
+            from kimi_client import KimiClient
+            client = KimiClient()
+        self.client = client
+
+    def complete(self, messages: Messages, temperature: Optional[float] = None,
+                 max_tokens: Optional[int] = None, **kwargs) -> Dict[str, Any]:
+        # response_format 等参数原样透传，Kimi 同样支持 JSON 模式
+        content = self.client.chat(messages, temperature=temperature, max_tokens=max_tokens, **kwargs)
+        return {
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": self.client.last_usage or {}
+        }
+
+
+class DoubaoProvider:
+    """DoubaoClient 适配器"""
+
+    name = "doubao"
+
+    def __init__(self, client=None):
+        if client is None:
+            from doubao_client import DoubaoClient, DoubaoConfig
+            # 重试由 LLMRouter 统一负责（退避、熔断、切换供应商），客户端内部只发一次
+            client = DoubaoClient(DoubaoConfig(max_retries=1))
+        self.client = client
+
+    def complete(self, messages: Messages, temperature: Optional[float] = None,
+                 max_tokens: Optional[int] = None, **kwargs) -> Dict[str, Any]:
+        return self.client.chat_completion(messages, temperature=temperature, max_tokens=max_tokens, **kwargs)
+
+    def stream(self, messages: Messages, temperature: Optional[float] = None,
+               max_tokens: Optional[int] = None, **kwargs) -> Iterator[Dict[str, Any]]:
+        return self.client.chat_completion_stream(messages, temperature=temperature,
+                                                  max_tokens=max_tokens, **kwargs)
+
+
+class ProviderStats:
+    """单个服务商的滚动统计和熔断状态（由 LLMRouter 加锁访问）"""
+
+    def __init__(self, window: int):
+        self.latencies: "deque[float]" = deque(maxlen=window)
+        self.outcomes: "deque[bool]" = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+
+class LLMRouter:
+    """
+    统一的对话接口
+
+    chat() 与 KimiClient.chat 签名一致，返回文本，可以直接注入 Planner / Answerer；
+    chat_completion() / chat_completion_stream() 与 DoubaoClient 一致，
+    可以注入 DoubaoTeachingAgent。
+    """
+
+    def __init__(self,
+                 providers: List[Any],
+                 hedge_after: Optional[float] = Config.ROUTER_HEDGE_AFTER,
+                 failure_threshold: int = Config.ROUTER_FAILURE_THRESHOLD,
+                 cooldown: float = Config.ROUTER_COOLDOWN,
+                 max_error_rate: float = 0.5,
+                 min_samples: int = 10,
+                 window: int = 100,
+                 max_workers: int = 8):
+        """
+        Args:
+            providers: 服务商适配器列表（需要 name 属性和 complete 方法），靠前的在没有统计数据时优先
+            hedge_after: 对冲阈值（秒）；为 None 时使用主服务商的 p95，没有统计数据时不对冲
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断冷却时间（秒）
+            max_error_rate: 最近窗口内错误率超过该值的服务商排在后面
+            min_samples: 窗口内请求数达到该值后才按错误率降级，避免一两次失败就被排到后面
+            window: 滚动统计的请求数
+            max_workers: 执行请求的线程数（对冲请求也占用线程）
+        """
+        if not providers:
+            raise ValueError("至少需要一个服务商")
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self._stats = {p.name: ProviderStats(window) for p in self.providers}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _available(self, provider, now: float) -> bool:
+        stats = self._stats[provider.name]
+        if stats.open_until <= 0:
+            return True
+        # 冷却结束后只放行一个试探请求
+        return now >= stats.open_until and not stats.trial_in_flight
+
+    def _acquire(self, provider) -> bool:
+        """
+        即将向服务商发请求前调用：熔断冷却结束后，在锁内占用唯一的试探名额
+
+        Returns:
+            是否可以发送；False 表示仍在熔断或试探请求已被其他调用占用
+        """
+        with self._lock:
+            if not self._available(provider, time.monotonic()):
+                return False
+            stats = self._stats[provider.name]
+            if stats.open_until > 0:
+                stats.trial_in_flight = True
+            return True
+
+    def _release(self, provider):
+        """请求结束但不计入统计（客户端错误、调用方中途停止读取）"""
+        with self._lock:
+            self._stats[provider.name].trial_in_flight = False
+
+    def _ranked(self) -> List[Any]:
+        """按健康状况和 p50 延迟排序的可用服务商"""
+        now = time.monotonic()
+        with self._lock:
+            available = [p for p in self.providers if self._available(p, now)]
+
+            def sort_key(item):
+                order, provider = item
+                stats = self._stats[provider.name]
+                p50 = stats.percentile(0.5)
+                degraded = len(stats.outcomes) >= self.min_samples and stats.error_rate > self.max_error_rate
+                return (degraded, p50 if p50 is not None else 0.0, order)
+
+            return [p for _, p in sorted(enumerate(available), key=sort_key)]
+
+    def _hedge_delay(self, provider) -> Optional[float]:
+        if self.hedge_after is not None:
+            return self.hedge_after
+        with self._lock:
+            return self._stats[provider.name].percentile(0.95)
+
+    def _call(self, provider, method: str, *args, **kwargs):
+        """执行一次请求并记录统计（调用前需已通过 _acquire）"""
+        start = time.monotonic()
+        try:
+            result = getattr(provider, method)(*args, **kwargs)
+        except Exception as e:
+            if is_client_error(e):
+                self._release(provider)
+            else:
+                self._record(provider, None)
+            raise
+        self._record(provider, time.monotonic() - start)
+        return result
+
+    def _record(self, provider, latency: Optional[float]):
+        with self._lock:
+            stats = self._stats[provider.name]
+            stats.trial_in_flight = False
+            stats.outcomes.append(latency is not None)
+            if latency is not None:
+                stats.latencies.append(latency)
+                stats.consecutive_failures = 0
+                stats.open_until = 0.0
+                return
+            stats.consecutive_failures += 1
+            if stats.open_until > 0 or stats.consecutive_failures >= self.failure_threshold:
+                stats.open_until = time.monotonic() + self.cooldown
+
+    def chat_completion(self, messages: Messages, temperature: Optional[float] = None,
+                        max_tokens: Optional[int] = None, **kwargs) -> Dict[str, Any]:
+        """
+        路由一次对话请求
+
+        Args:
+            messages: 对话消息列表
+            temperature: 温度参数
+            max_tokens: 最大生成 token 数
+            **kwargs: 透传给服务商的其他参数
+
+        Returns:
+            OpenAI 格式的响应，额外的 "provider" 字段为实际应答的服务商
+
+        Raises:
+            RuntimeError: 没有可用的服务商
+            Exception: 客户端错误（见 is_client_error）直接抛出；
+                所有服务商都失败时，抛出最后一个错误
+        """
+        candidates = self._ranked()
+        pending: Dict[Future, Any] = {}
+        last_error: Optional[Exception] = None
+
+        def launch() -> bool:
+            while candidates:
+                provider = candidates.pop(0)
+                if not self._acquire(provider):
+                    continue
+                future = self._executor.submit(self._call, provider, "complete",
+                                               messages, temperature, max_tokens, **kwargs)
+                pending[future] = provider
+                return True
+            return False
+
+        if not launch():
+            raise RuntimeError("所有模型服务商都处于熔断状态")
+        while pending:
+            # 只有一个请求在途且还有备选时，等到对冲阈值就发起备份请求
+            timeout = self._hedge_delay(next(iter(pending.values()))) \
+                if len(pending) == 1 and candidates else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                launch()
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if is_client_error(e):
+                        raise
+                    last_error = e
+                    continue
+                return {**result, "provider": provider.name}
+            if not pending and candidates:
+                launch()
+
+        raise last_error or RuntimeError("模型请求失败")
+
+    def chat(self, messages: Messages, temperature: Optional[float] = None,
+             max_tokens: Optional[int] = None, **kwargs) -> str:
+        """
+        路由一次对话请求，只返回文本
+
+        Args:
+            messages: 对话消息列表
+            temperature: 温度参数
+            max_tokens: 最大生成 token 数
+
+        Returns:
+            回答内容
+        """
+        response = self.chat_completion(messages, temperature=temperature, max_tokens=max_tokens, **kwargs)
+        return response["choices"][0]["message"]["content"]
+
+    def chat_completion_stream(self, messages: Messages, temperature: Optional[float] = None,
+                               max_tokens: Optional[int] = None, **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        流式对话（不对冲，已开始输出后不能切换服务商）
+
+        选中的服务商支持流式时直接透传，否则整段作为一个增量返回，
+        输出格式与 DoubaoClient.chat_completion_stream 一致。
+        """
+        candidates = self._ranked()
+        if not candidates:
+            raise RuntimeError("所有模型服务商都处于熔断状态")
+        if not hasattr(candidates[0], "stream"):
+            response = self.chat_completion(messages, temperature=temperature, max_tokens=max_tokens, **kwargs)
+            choice = response["choices"][0]
+            content = choice["message"]["content"]
+            yield {"delta": content}
+            yield {"delta": "", "content": content, "usage": response.get("usage", {}),
+                   "finish_reason": choice.get("finish_reason", "stop")}
+            return
+
+        provider = next((p for p in candidates if hasattr(p, "stream") and self._acquire(p)), None)
+        if provider is None:
+            raise RuntimeError("所有模型服务商都处于熔断状态")
+        start = time.monotonic()
+        try:
+            for chunk in provider.stream(messages, temperature=temperature, max_tokens=max_tokens, **kwargs):
+                yield chunk
+        except GeneratorExit:
+            # 调用方中途停止读取，不计入统计
+            self._release(provider)
+            raise
+        except Exception as e:
+            if is_client_error(e):
+                self._release(provider)
+            else:
+                self._record(provider, None)
+            raise
+        self._record(provider, time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        各服务商的统计
+
+        Returns:
+            {服务商: {"p50", "p95", "error_rate", "requests", "circuit_open"}}
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "p50": s.percentile(0.5),
+                    "p95": s.percentile(0.95),
+                    "error_rate": s.error_rate,
+                    "requests": len(s.outcomes),
+                    "circuit_open": s.open_until > now
+                }
+                for name, s in self._stats.items()
+            }
+
+
+def create_default_router(doubao_client=None, kimi_client=None) -> LLMRouter:
+    """
+    创建同时使用豆包和 Kimi 的路由
+
+    Args:
+        doubao_client: 已配置好的 DoubaoClient，默认使用 DoubaoConfig 默认值
+        kimi_client: 已配置好的 KimiClient，默认使用 Config
+
+    Returns:
+        LLMRouter 实例
+    """
+    return LLMRouter([DoubaoProvider(doubao_client), KimiProvider(kimi_client)])
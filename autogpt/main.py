@@ -49,7 +49,7 @@ def main():
     agent = EducationAgent()
     
     print("Agent 已就绪！可以开始提问了。")
-    print("输入 'quit' 或 'exit' 退出程序")
+    print("输入 'quit' 或 'exit' 退出程序，输入 'clear' 清空对话记忆")
     print("-" * 60)
     print()
     
@@ -68,6 +68,12 @@ def main():
             if not user_input:
                 continue
             
+            # 清空对话记忆，开始新话题
+            if user_input.lower() in ['clear', '清空']:
+                agent.clear_history()
+                print("\n对话记忆已清空。")
+                continue
+            
             # Agent 处理并回复
             print("\n[Agent] > ", end="", flush=True)
             response = agent.chat(user_input)
@@ -0,0 +1,189 @@
+"""
+对话记忆：最近 K 轮原文 + 更早轮次的滚动摘要
+
+多轮对话如果每轮都带上全部历史，提示词长度随轮数线性增长、总开销二次增长。
+这里只保留最近 keep_turns 轮原文，挤出去的轮次增量合并进一段摘要
+（每次只把"旧摘要 + 新挤出的轮次"交给摘要函数，不重读全部历史），
+并保证摘要 + 原文的总长度不超过 max_tokens，使每轮的提示词长度基本恒定。
+
+摘要在后台线程中生成，不阻塞当前轮的回答；摘要尚未完成时，
+待合并的轮次暂时以原文形式保留在上下文中。
+"""
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+from context_packer import estimate_tokens, truncate_to_tokens
+
+# summarizer(旧摘要, 新挤出的轮次) -> 新摘要
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+
+def _turn_tokens(turn: Dict[str, str]) -> int:
+    return estimate_tokens(turn["user"]) + estimate_tokens(turn["assistant"])
+
+
+def fallback_summary(summary: str, turns: List[Dict[str, str]], max_tokens: int) -> str:
+    """
+    不调用模型的摘要：保留每轮问题和回答开头，超出长度时丢弃最早的内容
+
+    Args:
+        summary: 旧摘要
+        turns: 新挤出的轮次
+        max_tokens: 摘要 token 上限
+
+    Returns:
+        新摘要
+    """
+    lines = [summary] if summary else []
+    for turn in turns:
+        lines.append(f"用户问：{turn['user'][:80]}；回答要点：{turn['assistant'][:120]}")
+    text = "\n".join(lines)
+    while estimate_tokens(text) > max_tokens and "\n" in text:
+        text = text.split("\n", 1)[1]
+    return truncate_to_tokens(text, max_tokens)
+
+
+class ConversationMemory:
+    """多轮对话记忆（线程安全）"""
+
+    def __init__(self,
+                 summarizer: Optional[Summarizer] = None,
+                 keep_turns: int = Config.MEMORY_KEEP_TURNS,
+                 max_tokens: int = Config.MEMORY_MAX_TOKENS,
+                 summary_max_tokens: int = Config.MEMORY_SUMMARY_TOKENS,
+                 background: bool = True):
+        """
+        Args:
+            summarizer: 摘要函数，为 None 或调用失败时使用 fallback_summary
+            keep_turns: 原文保留的最近轮数
+            max_tokens: 摘要 + 原文的 token 上限
+            summary_max_tokens: 摘要的 token 上限
+            background: 是否在后台线程中生成摘要
+        """
+        self.summarizer = summarizer
+        self.keep_turns = max(1, keep_turns)
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.summary = ""
+        self.transcript: List[Dict[str, str]] = []
+
+        self._lock = threading.Lock()
+        self._recent: "deque[Dict[str, str]]" = deque()
+        self._pending: List[Dict[str, str]] = []
+        self._executor = ThreadPoolExecutor(max_workers=1) if background else None
+        self._future = None
+
+    def add_turn(self, user: str, assistant: str):
+        """
+        记录一轮对话
+
+        Args:
+            user: 用户输入
+            assistant: 助手回答
+        """
+        turn = {"user": user, "assistant": assistant or ""}
+        with self._lock:
+            self.transcript.append(turn)
+            self._recent.append(turn)
+            evicted = []
+            # 超过轮数或 token 上限时，从最早的原文开始挤出（至少保留最近一轮）
+            while len(self._recent) > 1 and (
+                len(self._recent) > self.keep_turns or self._recent_tokens() > self._turn_budget()
+            ):
+                evicted.append(self._recent.popleft())
+            if not evicted:
+                return
+            self._pending.extend(evicted)
+
+        if self._executor is None:
+            self._fold()
+        else:
+            self._future = self._executor.submit(self._fold)
+
+    def _recent_tokens(self) -> int:
+        return sum(_turn_tokens(turn) for turn in self._recent)
+
+    def _turn_budget(self) -> int:
+        return self.max_tokens - min(estimate_tokens(self.summary), self.summary_max_tokens)
+
+    def _fold(self):
+        # 单线程执行，按挤出顺序合并；合并期间新挤出的轮次留到下一次
+        with self._lock:
+            if not self._pending:
+                return
+            turns = list(self._pending)
+            summary = self.summary
+
+        new_summary = None
+        if self.summarizer is not None:
+            try:
+                new_summary = self.summarizer(summary, turns)
+            except Exception as e:
+                print(f"生成对话摘要出错: {e}")
+        if not new_summary:
+            new_summary = fallback_summary(summary, turns, self.summary_max_tokens)
+        new_summary = truncate_to_tokens(new_summary.strip(), self.summary_max_tokens)
+
+        with self._lock:
+            self.summary = new_summary
+            del self._pending[:len(turns)]
+
+    def messages(self) -> List[Dict[str, str]]:
+        """
+        构造放在当前问题之前的历史消息
+
+        Returns:
+            [摘要（system 消息）, 最近几轮的 user/assistant 消息]
+        """
+        with self._lock:
+            summary = self.summary
+            candidates = list(self._pending) + list(self._recent)
+
+        # 摘要跟不上时待合并的轮次可能堆积，从最新一轮往前放，超出上限的旧轮次不再带上；
+        # 最新一轮本身放不下时截断到剩余额度，优先保留用户问题
+        budget = self.max_tokens - estimate_tokens(summary)
+        turns = []
+        for turn in reversed(candidates):
+            cost = _turn_tokens(turn)
+            if cost > budget:
+                if not turns and budget > 0:
+                    user = truncate_to_tokens(turn["user"], budget)
+                    assistant = truncate_to_tokens(turn["assistant"], budget - estimate_tokens(user))
+                    turns.insert(0, {"user": user, "assistant": assistant})
+                break
+            budget -= cost
+            turns.insert(0, turn)
+
+        messages = []
+        if summary:
+            messages.append({"role": "system", "content": f"此前对话摘要：\n{summary}"})
+        for turn in turns:
+            messages.append({"role": "user", "content": turn["user"]})
+            messages.append({"role": "assistant", "content": turn["assistant"]})
+        return messages
+
+    def wait(self):
+        """等待后台摘要完成"""
+        future = self._future
+        if future is not None:
+            future.result()
+
+    def clear(self):
+        """清空记忆"""
+        self.wait()
+        with self._lock:
+            self.summary = ""
+            self.transcript = []
+            self._recent.clear()
+            self._pending = []
+
+    def close(self):
+        """等待后台摘要完成并关闭摘要线程，之后新增的轮次改为同步合并"""
+        executor = self._executor
+        if executor is None:
+            return
+        self._executor = None
+        executor.shutdown(wait=True)
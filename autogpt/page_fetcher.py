@@ -0,0 +1,300 @@
+"""
+网页正文抓取：流式读取 + 字节预算 + 增量正文提取
+
+- 同步接口复用一个 requests.Session，异步接口复用一个 httpx.AsyncClient 连接池
+- 响应体按块流式读取，读满字节预算或提取到足够正文后立即断开，
+  大页面不会整页下载到内存
+- 正文用 HTMLParser 边读边提取，跳过脚本、样式、导航等非正文标签
+- 异步批量抓取时按域名限制并发，避免同一站点被并发请求打爆
+"""
+import asyncio
+import codecs
+import re
+import threading
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+
+from config import Config
+
+# 这些标签内的文本不是正文
+_SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "head", "nav", "header", "footer", "aside", "form"}
+# 这些标签前后换行，保留段落结构
+_BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "pre"}
+_SPACES = re.compile(r"[ \t\r\f\v]+")
+_CHARSET = re.compile(r"charset=([\w-]+)", re.I)
+
+_USER_AGENT = "Mozilla/5.0 (compatible; EducationAgent/1.0)"
+
+
+class TextExtractor(HTMLParser):
+    """增量正文提取器：可以分块 feed，提取到 max_chars 个字符后 full 为 True"""
+
+    def __init__(self, max_chars: int = 2000):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self._parts: List[str] = []
+        self._length = 0
+        self._skip_depth = 0
+
+    @property
+    def full(self) -> bool:
+        """是否已提取到足够的正文"""
+        return self._length >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_data(self, data):
+        if self._skip_depth or self.full:
+            return
+        data = _SPACES.sub(" ", data)
+        if data.strip():
+            self._parts.append(data)
+            self._length += len(data.strip())
+
+    def text(self) -> str:
+        """已提取的正文（去掉空行，截断到 max_chars）"""
+        lines = (line.strip() for line in "".join(self._parts).split("\n"))
+        return "\n".join(line for line in lines if line)[:self.max_chars]
+
+
+class PageReader:
+    """
+    把响应体字节块转换成正文
+
+    按响应头声明的编码增量解码（多字节字符跨块也能正确处理），
+    纯文本直接保留，HTML 交给 TextExtractor。
+    """
+
+    def __init__(self, content_type: str = "",
+                 max_bytes: int = Config.FETCH_MAX_BYTES,
+                 max_chars: int = Config.FETCH_MAX_CHARS):
+        match = _CHARSET.search(content_type or "")
+        encoding = match.group(1) if match else "utf-8"
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        except LookupError:
+            self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._html = "html" in (content_type or "html")
+        self._extractor = TextExtractor(max_chars)
+        self._plain: List[str] = []
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.bytes_read = 0
+
+    @property
+    def done(self) -> bool:
+        """字节预算已用完，或已提取到足够正文"""
+        if self.bytes_read >= self.max_bytes:
+            return True
+        if self._html:
+            return self._extractor.full
+        return sum(len(part) for part in self._plain) >= self.max_chars
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        读入一块响应体
+
+        Args:
+            chunk: 字节块
+
+        Returns:
+            是否应停止读取
+        """
+        chunk = chunk[:max(0, self.max_bytes - self.bytes_read)]
+        self.bytes_read += len(chunk)
+        text = self._decoder.decode(chunk)
+        if self._html:
+            self._extractor.feed(text)
+        else:
+            self._plain.append(text)
+        return self.done
+
+    def text(self) -> str:
+        """提取结果"""
+        if self._html:
+            self._extractor.close()
+            return self._extractor.text()
+        return "".join(self._plain).strip()[:self.max_chars]
+
+
+def _is_text(content_type: str) -> bool:
+    return not content_type or "html" in content_type or content_type.startswith("text/")
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers["User-Agent"] = _USER_AGENT
+        return _session
+
+
+def fetch_text(url: str,
+               timeout: float = Config.FETCH_TIMEOUT,
+               max_bytes: int = Config.FETCH_MAX_BYTES,
+               max_chars: int = Config.FETCH_MAX_CHARS) -> Optional[str]:
+    """
+    同步抓取单个网页的正文（复用连接池，流式读取）
+
+    Args:
+        url: 网页 URL
+        timeout: 超时（秒）
+        max_bytes: 最多读取的字节数
+        max_chars: 最多返回的正文字符数
+
+    Returns:
+        正文文本；请求失败或不是文本内容时返回 None
+    """
+    with _get_session().get(url, timeout=timeout, stream=True) as response:
+        content_type = response.headers.get("Content-Type", "").lower()
+        if response.status_code >= 400 or not _is_text(content_type):
+            return None
+        reader = PageReader(content_type, max_bytes, max_chars)
+        for chunk in response.iter_content(chunk_size=16384):
+            if reader.feed(chunk):
+                break
+        return reader.text()
+
+
+class AsyncPageFetcher:
+    """
+    异步并发网页抓取
+
+    httpx.AsyncClient 和按域名的信号量都绑定事件循环，
+    与 AsyncLLMPool 一样在事件循环变化时重新创建。
+    """
+
+    def __init__(self,
+                 per_host: int = Config.FETCH_PER_HOST,
+                 max_connections: int = Config.FETCH_MAX_CONNECTIONS,
+                 timeout: float = Config.FETCH_TIMEOUT,
+                 max_bytes: int = Config.FETCH_MAX_BYTES,
+                 max_chars: int = Config.FETCH_MAX_CHARS):
+        """
+        Args:
+            per_host: 同一域名同时在途的请求数
+            max_connections: 连接池大小
+            timeout: 单个请求超时（秒）
+            max_bytes: 每个页面最多读取的字节数
+            max_chars: 每个页面最多返回的正文字符数
+        """
+        self.per_host = per_host
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _ensure_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": _USER_AGENT},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+            self._host_limits = {}
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """
+        抓取单个网页的正文
+
+        Args:
+            url: 网页 URL
+
+        Returns:
+            正文文本；失败时返回 None
+        """
+        self._ensure_loop()
+        try:
+            async with self._host_limit(url):
+                async with self._client.stream("GET", url) as response:
+                    content_type = response.headers.get("Content-Type", "").lower()
+                    if response.status_code >= 400 or not _is_text(content_type):
+                        return None
+                    reader = PageReader(content_type, self.max_bytes, self.max_chars)
+                    async for chunk in response.aiter_bytes():
+                        if reader.feed(chunk):
+                            break
+                    return reader.text()
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"获取内容出错: {url} {e}")
+            return None
+
+    async def fetch_many(self, urls: List[str]) -> List[Optional[str]]:
+        """
+        并发抓取多个网页
+
+        Args:
+            urls: URL 列表
+
+        Returns:
+            与 urls 一一对应的正文列表，失败的为 None
+        """
+        return list(await asyncio.gather(*(self.fetch(url) for url in urls)))
+
+    async def aclose(self):
+        """关闭连接池"""
+        if self._client is not None:
+            await self._client.aclose()
+        self._loop = None
+        self._client = None
+        self._host_limits = {}
+
+
+def fetch_many(urls: List[str], fetcher: Optional[AsyncPageFetcher] = None) -> List[Optional[str]]:
+    """
+    同步代码中并发抓取多个网页（内部运行一个事件循环，不能在已有事件循环中调用）
+
+    Args:
+        urls: URL 列表
+        fetcher: 抓取器，默认新建一个，结束后关闭连接池
+
+    Returns:
+        与 urls 一一对应的正文列表，失败的为 None
+    """
+    if not urls:
+        return []
+
+    async def run():
+        owned = fetcher is None
+        active = fetcher or AsyncPageFetcher()
+        try:
+            return await active.fetch_many(urls)
+        finally:
+            if owned:
+                await active.aclose()
+
+    return asyncio.run(run())
@@ -0,0 +1,296 @@
+"""
+提示词前缀缓存
+
+plan / analyze 等调用每次都会重复发送系统提示词和固定的指令模板。
+把这些稳定内容放在消息列表最前面作为"前缀"，变化的问题、上下文放在后面，
+服务端就能复用前缀的计算结果：
+
+- auto：不额外调用接口，依赖服务端自动前缀缓存（Kimi K2 等），只统计用量中的缓存命中
+- moonshot：通过 Moonshot Context Caching 接口（POST /caching）显式注册前缀，
+  请求时用 role=cache 的消息引用缓存
+- local：本地模拟，不调用任何接口，按估算的前缀 token 数记为命中，用于离线测试
+- off：关闭
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from config import Config
+from context_packer import estimate_tokens
+
+Messages = List[Dict[str, str]]
+
+
+def prefix_key(model: str, prefix: Messages) -> str:
+    """前缀内容的稳定键"""
+    raw = json.dumps({"model": model, "prefix": prefix}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _prefix_tokens(prefix: Messages) -> int:
+    return sum(estimate_tokens(m["content"]) for m in prefix)
+
+
+class LocalPrefixProvider:
+    """本地模拟的缓存服务：只登记前缀，请求消息保持不变"""
+
+    supports_reference = False
+
+    def __init__(self):
+        self.created: Dict[str, Messages] = {}
+
+    def create(self, model: str, prefix: Messages, ttl: int) -> Optional[str]:
+        cache_id = f"local-{prefix_key(model, prefix)[:16]}"
+        self.created[cache_id] = prefix
+        return cache_id
+
+    def is_ready(self, cache_id: str) -> bool:
+        return cache_id in self.created
+
+
+class MoonshotPrefixProvider:
+    """Moonshot Context Caching 接口"""
+
+    supports_reference = True
+
+    def __init__(self,
+                 api_key: str = Config.KIMI_API_KEY,
+                 base_url: str = Config.KIMI_API_BASE,
+                 cache_model: str = Config.PREFIX_CACHE_MODEL,
+                 timeout: float = 10.0):
+        """
+        Args:
+            api_key: API 密钥
+            base_url: API 地址
+            cache_model: 缓存所属的模型，默认与 Config.KIMI_MODEL 一致
+            timeout: 请求超时（秒）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.cache_model = cache_model
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def create(self, model: str, prefix: Messages, ttl: int) -> Optional[str]:
+        response = self.session.post(
+            f"{self.base_url}/caching",
+            json={"model": self.cache_model, "messages": prefix, "ttl": ttl},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json().get("id")
+
+    def is_ready(self, cache_id: str) -> bool:
+        response = self.session.get(f"{self.base_url}/caching/{cache_id}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get("status") == "ready"
+
+    def reference(self, cache_id: str, ttl: int) -> Dict[str, str]:
+        # 每次引用时顺带刷新过期时间，常用的前缀不会过期
+        return {"role": "cache", "content": f"cache_id={cache_id};reset_ttl={ttl}"}
+
+
+class PrefixCache:
+    """
+    前缀缓存管理
+
+    同一前缀只注册一次（线程安全）；注册失败后在 retry_after 秒内不再尝试，
+    直接发送完整消息，不影响正常调用。注册和查询状态的网络请求不在锁内进行，
+    同一前缀同时只有一个线程发起请求，其他线程先发送完整消息。
+
+    provider 需要提供 create(model, prefix, ttl) -> cache_id、is_ready(cache_id)
+    和 supports_reference 属性；supports_reference 为 True 时还需提供
+    reference(cache_id, ttl) -> 引用缓存的消息。
+    """
+
+    def __init__(self,
+                 mode: str = Config.PREFIX_CACHE_MODE,
+                 provider=None,
+                 ttl: int = Config.PREFIX_CACHE_TTL,
+                 min_tokens: int = Config.PREFIX_CACHE_MIN_TOKENS,
+                 retry_after: float = 300.0,
+                 poll_interval: float = 2.0):
+        """
+        Args:
+            mode: auto / moonshot / local / off，见模块说明
+            provider: 缓存服务，默认按 mode 创建
+            ttl: 缓存过期时间（秒）
+            min_tokens: 前缀估算 token 数低于该值时不注册
+            retry_after: 注册失败后多久再重试（秒）
+            poll_interval: 缓存未就绪时两次查询状态的最小间隔（秒）
+        """
+        self.mode = mode
+        if provider is None and mode == "moonshot":
+            provider = MoonshotPrefixProvider()
+        elif provider is None and mode == "local":
+            provider = LocalPrefixProvider()
+        self.provider = provider
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.retry_after = retry_after
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._ids: Dict[str, str] = {}
+        # cache_id -> 过期时间；出现在这里说明已就绪，不再查询状态
+        self._expires_at: Dict[str, float] = {}
+        # cache_id -> 下次允许查询状态的时间
+        self._next_poll: Dict[str, float] = {}
+        # 正在注册的前缀，避免并发重复注册
+        self._creating: set = set()
+        self._failed_at: Dict[str, float] = {}
+        self.calls = 0
+        self.cached_tokens = 0
+        self.uncached_tokens = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _cache_id(self, model: str, prefix: Messages) -> Optional[str]:
+        if self.provider is None or _prefix_tokens(prefix) < self.min_tokens:
+            return None
+        key = prefix_key(model, prefix)
+        now = time.time()
+        with self._lock:
+            cache_id = self._ids.get(key)
+            expires_at = self._expires_at.get(cache_id)
+            if expires_at is not None and expires_at <= now:
+                # 已过期：服务端缓存已被清除，重新注册
+                del self._ids[key], self._expires_at[cache_id]
+                self._next_poll.pop(cache_id, None)
+                cache_id, expires_at = None, None
+            if expires_at is not None:
+                # 每次引用都会刷新服务端的过期时间
+                self._expires_at[cache_id] = now + self.ttl
+                return cache_id
+            if cache_id is None:
+                if key in self._creating or now - self._failed_at.get(key, 0.0) < self.retry_after:
+                    return None
+                self._creating.add(key)
+            elif self._next_poll.get(cache_id, 0.0) > now:
+                return None
+            else:
+                self._next_poll[cache_id] = now + self.poll_interval
+
+        if cache_id is None:
+            try:
+                cache_id = self.provider.create(model, prefix, self.ttl)
+            except (requests.RequestException, ValueError) as e:
+                print(f"注册前缀缓存出错: {e}")
+                cache_id = None
+            with self._lock:
+                self._creating.discard(key)
+                if not cache_id:
+                    self._failed_at[key] = time.time()
+                    return None
+                self._ids[key] = cache_id
+                self._next_poll[cache_id] = time.time() + self.poll_interval
+
+        # 服务端建缓存是异步的，未就绪前先发送完整消息
+        try:
+            ready = self.provider.is_ready(cache_id)
+        except (requests.RequestException, ValueError):
+            ready = False
+        if not ready:
+            return None
+        with self._lock:
+            self._expires_at[cache_id] = time.time() + self.ttl
+            self._next_poll.pop(cache_id, None)
+        return cache_id
+
+    def build(self, model: str, prefix: Messages, messages: Messages) -> Tuple[Messages, Dict[str, Any]]:
+        """
+        组装请求消息
+
+        Args:
+            model: 模型名称
+            prefix: 稳定前缀（系统提示词、指令模板）
+            messages: 前缀之后的消息
+
+        Returns:
+            (实际发送的消息, 前缀信息 {"cache_id", "prefix_tokens"})
+        """
+        info = {"cache_id": None, "prefix_tokens": _prefix_tokens(prefix)}
+        if not self.enabled:
+            return prefix + messages, info
+        cache_id = self._cache_id(model, prefix)
+        info["cache_id"] = cache_id
+        if cache_id and self.provider.supports_reference:
+            return [self.provider.reference(cache_id, self.ttl)] + messages, info
+        return prefix + messages, info
+
+    def record(self, info: Dict[str, Any], usage: Any) -> Dict[str, int]:
+        """
+        记录一次调用的提示词用量
+
+        优先使用服务端返回的缓存命中 token 数（usage.cached_tokens 或
+        usage.prompt_tokens_details.cached_tokens）；服务端没有返回时，
+        使用了缓存的调用按估算的前缀 token 数计为命中。
+
+        Args:
+            info: build 返回的前缀信息
+            usage: 响应中的 usage 对象，可以为 None
+
+        Returns:
+            {"prompt_tokens", "cached_tokens", "uncached_tokens"}
+        """
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        cached = getattr(usage, "cached_tokens", None)
+        if cached is None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = getattr(details, "cached_tokens", None)
+        if cached is None:
+            cached = info["prefix_tokens"] if info.get("cache_id") else 0
+        if not prompt_tokens:
+            prompt_tokens = max(cached, info["prefix_tokens"])
+        cached = min(cached, prompt_tokens)
+
+        result = {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached,
+            "uncached_tokens": prompt_tokens - cached
+        }
+        with self._lock:
+            self.calls += 1
+            self.cached_tokens += result["cached_tokens"]
+            self.uncached_tokens += result["uncached_tokens"]
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        累计用量
+
+        Returns:
+            调用次数、缓存命中/未命中的提示词 token 数和命中比例
+        """
+        with self._lock:
+            total = self.cached_tokens + self.uncached_tokens
+            return {
+                "mode": self.mode,
+                "calls": self.calls,
+                "cached_tokens": self.cached_tokens,
+                "uncached_tokens": self.uncached_tokens,
+                "cached_ratio": self.cached_tokens / total if total else 0.0,
+                "prefixes": len(self._ids)
+            }
+
+
+_default_prefix_cache: Optional[PrefixCache] = None
+_default_prefix_cache_lock = threading.Lock()
+
+
+def get_default_prefix_cache() -> PrefixCache:
+    """获取进程内共享的前缀缓存（按 Config.PREFIX_CACHE_MODE 创建）"""
+    global _default_prefix_cache
+    with _default_prefix_cache_lock:
+        if _default_prefix_cache is None:
+            _default_prefix_cache = PrefixCache()
+        return _default_prefix_cache
@@ -0,0 +1,275 @@
+"""
+问题复杂度分类：决定是否跳过规划，直接一次调用回答
+
+简单的知识性问题（"什么是质数"）不需要先让模型规划步骤再逐步执行，
+直接检索 + 一次回答即可，可以省下规划和各步骤的模型往返。
+分类只用本地特征（关键词、句式、长度）和一个很小的逻辑回归模型，
+耗时在微秒级；模型权重保存在 JSON 文件中，启动时加载，
+文件不存在时用内置的种子样本训练并保存。
+"""
+import json
+import math
+import os
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import Config
+
+MODEL_VERSION = 1
+
+# 倾向于需要规划的词：设计、方案、多方面分析
+COMPLEX_MARKERS = ("设计", "方案", "计划", "教案", "如何", "怎样", "怎么", "步骤", "比较", "对比", "分析",
+                   "策略", "差异化", "评价", "单元", "一节", "课堂", "活动", "组织", "提高", "改进", "帮助",
+                   "准备", "制定")
+# 倾向于一次回答即可的词：定义、事实、公式
+SIMPLE_MARKERS = ("是什么", "什么是", "什么叫", "定义", "公式", "多少", "哪个", "哪些", "谁", "何时", "哪一年",
+                  "含义", "意思", "读音", "单位", "等于", "区别是", "英文", "拼音")
+_CLAUSE = re.compile(r"[，,；;。？?！!、]")
+_CONJUNCTION = re.compile(r"和|与|以及|并且|同时|还要|另外")
+
+FEATURES = ("bias", "length", "clauses", "questions", "conjunctions", "complex_markers", "simple_markers", "digits")
+
+# 种子训练集：1 表示需要规划（复杂），0 表示一次回答即可（简单）
+SEED_EXAMPLES: List[Tuple[str, int]] = [
+    ("什么是质数？", 0),
+    ("光合作用的公式是什么", 0),
+    ("三角形内角和是多少度", 0),
+    ("《静夜思》的作者是谁", 0),
+    ("什么叫做分数", 0),
+    ("牛顿第一定律的内容是什么", 0),
+    ("水的沸点是多少", 0),
+    ("勾股定理是什么", 0),
+    ("圆的面积公式", 0),
+    ("细胞的定义", 0),
+    ("“温故而知新”是什么意思", 0),
+    ("一米等于多少厘米", 0),
+    ("长方形周长公式是什么？", 0),
+    ("中国的首都是哪个城市", 0),
+    ("电流的单位是什么", 0),
+    ("苹果的英文怎么写", 0),
+    ("秦始皇统一六国是哪一年", 0),
+    ("质数和合数的区别是什么", 0),
+    ("“囫囵吞枣”的含义", 0),
+    ("地球绕太阳一周需要多少天", 0),
+    ("如何给五年级学生讲解分数加减法？", 1),
+    ("请设计一节关于光合作用的初中生物课", 1),
+    ("怎样提高初二学生的英语阅读能力", 1),
+    ("帮我制定一个六年级数学复习计划", 1),
+    ("如何组织小组合作学习活动，并评价学生表现？", 1),
+    ("对比分析讲授法和探究式教学在物理课上的效果", 1),
+    ("学生上课注意力不集中，应该采取哪些策略？", 1),
+    ("设计一个关于垃圾分类的综合实践活动方案", 1),
+    ("怎么帮助数学基础薄弱的学生跟上进度", 1),
+    ("如何在语文课上进行差异化教学", 1),
+    ("请为初三化学酸碱盐单元设计教学方案和评价方式", 1),
+    ("怎样用生活中的例子讲解杠杆原理，并设计课堂练习", 1),
+    ("如何改进作文批改方式，提高学生写作兴趣", 1),
+    ("分析学生在一元二次方程学习中的常见错误并给出教学建议", 1),
+    ("怎么组织一节有趣的英语口语课", 1),
+    ("如何培养小学生的阅读习惯？家长和老师分别可以做什么？", 1),
+    ("讲解勾股定理时如何引导学生自己发现规律", 1),
+    ("帮我设计一份期中考试后的家长会发言提纲", 1),
+    ("如何利用信息技术提高课堂互动", 1),
+    ("设计三个层次的分数练习题，并说明设计意图", 1),
+]
+
+
+def extract_features(question: str) -> List[float]:
+    """
+    提取特征（顺序与 FEATURES 一致）
+
+    Args:
+        question: 问题文本
+
+    Returns:
+        特征向量
+    """
+    text = question.strip()
+    return [
+        1.0,
+        min(len(text), 80) / 20.0,
+        float(len(_CLAUSE.findall(text.rstrip("？?。!！")))),
+        float(text.count("？") + text.count("?")),
+        float(len(_CONJUNCTION.findall(text))),
+        float(sum(marker in text for marker in COMPLEX_MARKERS)),
+        float(sum(marker in text for marker in SIMPLE_MARKERS)),
+        1.0 if re.search(r"\d", text) else 0.0,
+    ]
+
+
+def _sigmoid(z: float) -> float:
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+def train(examples: Iterable[Tuple[str, int]], epochs: int = 400,
+          learning_rate: float = 0.1, l2: float = 0.01) -> List[float]:
+    """
+    训练逻辑回归（批量梯度下降）
+
+    Args:
+        examples: [(问题, 标签)]，标签 1 表示复杂
+        epochs: 迭代轮数
+        learning_rate: 学习率
+        l2: L2 正则系数
+
+    Returns:
+        权重
+    """
+    data = [(extract_features(q), label) for q, label in examples]
+    weights = [0.0] * len(FEATURES)
+    for _ in range(epochs):
+        gradient = [0.0] * len(weights)
+        for x, label in data:
+            error = _sigmoid(sum(w * v for w, v in zip(weights, x))) - label
+            for i, v in enumerate(x):
+                gradient[i] += error * v
+        for i in range(len(weights)):
+            penalty = l2 * weights[i] if i else 0.0
+            weights[i] -= learning_rate * (gradient[i] / len(data) + penalty)
+    return weights
+
+
+class QuestionClassifier:
+    """问题复杂度分类器"""
+
+    def __init__(self, weights: Sequence[float], threshold: float = Config.CLASSIFIER_THRESHOLD):
+        """
+        Args:
+            weights: 逻辑回归权重（顺序与 FEATURES 一致）
+            threshold: 复杂概率不低于该值时走规划路径
+        """
+        if len(weights) != len(FEATURES):
+            raise ValueError("权重维度与特征不一致")
+        self.weights = list(weights)
+        self.threshold = threshold
+
+    def probability(self, question: str) -> float:
+        """问题需要规划的概率"""
+        return _sigmoid(sum(w * v for w, v in zip(self.weights, extract_features(question))))
+
+    def classify(self, question: str) -> Dict[str, object]:
+        """
+        分类
+
+        Args:
+            question: 问题文本
+
+        Returns:
+            {"route": "simple" / "complex", "probability": 复杂概率}
+        """
+        p = self.probability(question)
+        return {"route": "complex" if p >= self.threshold else "simple", "probability": round(p, 3)}
+
+    def save(self, path: str):
+        """保存权重到 JSON 文件"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MODEL_VERSION, "features": list(FEATURES), "weights": self.weights}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, threshold: float = Config.CLASSIFIER_THRESHOLD) -> "QuestionClassifier":
+        """
+        从 JSON 文件加载
+
+        Raises:
+            ValueError: 版本或特征定义与当前代码不一致
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MODEL_VERSION or data.get("features") != list(FEATURES):
+            raise ValueError("分类模型与当前特征定义不一致")
+        return cls(data["weights"], threshold)
+
+
+def load_or_train(path: Optional[str] = None) -> QuestionClassifier:
+    """
+    加载分类模型，文件不存在或已过时时用种子样本训练并保存
+
+    Args:
+        path: 模型文件路径，为 None 时只在内存中训练
+
+    Returns:
+        分类器
+    """
+    if path and os.path.exists(path):
+        try:
+            return QuestionClassifier.load(path)
+        except (OSError, ValueError, KeyError):
+            pass
+    classifier = QuestionClassifier(train(SEED_EXAMPLES))
+    if path:
+        try:
+            classifier.save(path)
+        except OSError as e:
+            print(f"保存分类模型出错: {e}")
+    return classifier
+
+
+_default_classifier: Optional[QuestionClassifier] = None
+_default_classifier_lock = threading.Lock()
+
+
+def get_default_classifier() -> QuestionClassifier:
+    """获取进程内共享的分类器（Config.CLASSIFIER_PATH）"""
+    global _default_classifier
+    with _default_classifier_lock:
+        if _default_classifier is None:
+            _default_classifier = load_or_train(Config.CLASSIFIER_PATH or None)
+        return _default_classifier
+
+
+class RouteLatency:
+    """记录两条路径的实际耗时，用于估算走捷径省下的时间"""
+
+    def __init__(self, window: int = 50):
+        self._lock = threading.Lock()
+        self._durations = {"simple": deque(maxlen=window), "complex": deque(maxlen=window)}
+
+    def record(self, route: str, seconds: float):
+        with self._lock:
+            self._durations[route].append(seconds)
+
+    def estimated_saving(self, seconds: float) -> Optional[float]:
+        """
+        估算本次简单路径比完整规划路径省下的时间
+
+        Args:
+            seconds: 本次简单路径的耗时
+
+        Returns:
+            秒数；还没有完整路径的耗时记录时为 None
+        """
+        with self._lock:
+            complex_runs = list(self._durations["complex"])
+        if not complex_runs:
+            return None
+        return round(sum(complex_runs) / len(complex_runs) - seconds, 3)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="训练问题复杂度分类模型")
+    parser.add_argument("--data", help="额外的标注数据 JSONL（每行 {\"question\": ..., \"label\": 0/1}）")
+    parser.add_argument("--output", default=Config.CLASSIFIER_PATH, help="模型输出路径")
+    args = parser.parse_args()
+
+    examples = list(SEED_EXAMPLES)
+    if args.data:
+        with open(args.data, "r", encoding="utf-8") as f:
+            rows = (json.loads(line) for line in f if line.strip())
+            examples.extend((row["question"], int(row["label"])) for row in rows)
+    model = QuestionClassifier(train(examples))
+    model.save(args.output)
+    correct = sum((model.probability(q) >= model.threshold) == bool(label) for q, label in examples)
+    print(f"✅ 训练样本 {len(examples)} 条，训练集准确率 {correct / len(examples):.1%} -> {args.output}")
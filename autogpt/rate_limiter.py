@@ -0,0 +1,254 @@
+"""
+请求速率限制：令牌桶（每分钟请求数 + 每分钟 token 数）+ 带抖动的退避
+
+- 两个令牌桶同时生效：请求数按 1 扣减，token 数按估算值预扣，
+  响应返回后按实际用量多退少补
+- 服务端返回 429 时，按 Retry-After 暂停所有调用方（不只是出错的那个线程），
+  避免各个 worker 同时重试又同时被限流
+- 指定 state_path 时状态保存在文件中并用 fcntl 文件锁保护，
+  同一台机器上的多个进程共享同一份配额；否则只在进程内共享
+"""
+import asyncio
+import email.utils
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 上退化为进程内限流
+    fcntl = None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 响应头
+
+    Args:
+        value: 秒数或 HTTP 日期
+
+    Returns:
+        需要等待的秒数，无法解析时返回 None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None,
+                  base: float = 1.0, cap: float = 30.0) -> float:
+    """
+    计算重试等待时间
+
+    服务端给出 Retry-After 时以它为准并加少量抖动；否则使用
+    "全抖动"指数退避 uniform(0, min(cap, base * 2^attempt))，
+    让同时失败的请求错开重试时间。
+
+    Args:
+        attempt: 已失败的次数（从 0 开始）
+        retry_after: 服务端要求的等待秒数
+        base: 退避基数（秒）
+        cap: 最长等待（秒）
+
+    Returns:
+        等待秒数
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, min(1.0, retry_after * 0.1 + 0.1))
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucketLimiter:
+    """
+    令牌桶限流器（线程安全，可选跨进程共享）
+
+    桶容量为 burst_seconds 秒的配额，空闲后最多允许这么多突发请求。
+    单个请求需要的 token 数超过桶容量时，等桶满后放行并允许透支。
+    """
+
+    def __init__(self,
+                 requests_per_minute: float = 0,
+                 tokens_per_minute: float = 0,
+                 state_path: Optional[str] = None,
+                 burst_seconds: float = 10.0):
+        """
+        Args:
+            requests_per_minute: 每分钟请求数上限，0 表示不限
+            tokens_per_minute: 每分钟 token 数上限，0 表示不限
+            state_path: 共享状态文件路径，为 None 时只在进程内共享
+            burst_seconds: 桶容量对应的秒数
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.state_path = state_path if fcntl is not None else None
+        self.request_capacity = max(1.0, requests_per_minute * burst_seconds / 60)
+        self.token_capacity = tokens_per_minute * burst_seconds / 60
+
+        self._lock = threading.Lock()
+        self._state = self._initial_state()
+        self._directory_ready = False
+
+    def _initial_state(self) -> Dict[str, float]:
+        return {
+            "requests": self.request_capacity,
+            "tokens": self.token_capacity,
+            "updated_at": time.time(),
+            "blocked_until": 0.0
+        }
+
+    @contextmanager
+    def _locked_state(self):
+        """加锁读取状态，退出时写回"""
+        with self._lock:
+            if not self.state_path:
+                yield self._state
+                return
+            if not self._directory_ready:
+                # 第一次真正用到时才创建目录，只构造限流器不会在磁盘上留下任何东西
+                directory = os.path.dirname(self.state_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._directory_ready = True
+            with open(self.state_path, "a+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or "null") or self._initial_state()
+                    except ValueError:
+                        state = self._initial_state()
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refill(self, state: Dict[str, float], now: float):
+        elapsed = max(0.0, now - state["updated_at"])
+        state["requests"] = min(self.request_capacity,
+                                state["requests"] + elapsed * self.requests_per_minute / 60)
+        state["tokens"] = min(self.token_capacity,
+                              state["tokens"] + elapsed * self.tokens_per_minute / 60)
+        state["updated_at"] = now
+
+    def reserve(self, tokens: float = 0) -> float:
+        """
+        尝试占用一次请求的配额（不阻塞）
+
+        Args:
+            tokens: 本次请求预计消耗的 token 数
+
+        Returns:
+            0 表示已占用；否则为建议等待的秒数
+        """
+        now = time.time()
+        with self._locked_state() as state:
+            self._refill(state, now)
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+
+            wait = 0.0
+            if self.requests_per_minute and state["requests"] < 1:
+                wait = max(wait, (1 - state["requests"]) * 60 / self.requests_per_minute)
+            if self.tokens_per_minute and tokens:
+                needed = min(tokens, self.token_capacity)
+                if state["tokens"] < needed:
+                    wait = max(wait, (needed - state["tokens"]) * 60 / self.tokens_per_minute)
+            if wait > 0:
+                return wait
+
+            if self.requests_per_minute:
+                state["requests"] -= 1
+            if self.tokens_per_minute:
+                state["tokens"] -= tokens
+            return 0.0
+
+    def acquire(self, tokens: float = 0) -> float:
+        """
+        阻塞直到可以发出请求
+
+        Args:
+            tokens: 本次请求预计消耗的 token 数
+
+        Returns:
+            实际等待的秒数
+        """
+        start = time.monotonic()
+        while True:
+            wait = self.reserve(tokens)
+            if wait <= 0:
+                return time.monotonic() - start
+            # 小幅抖动，避免多个等待者同时醒来争抢
+            time.sleep(wait + random.uniform(0, 0.05))
+
+    async def aacquire(self, tokens: float = 0) -> float:
+        """acquire 的异步版本，等待期间不阻塞事件循环"""
+        start = time.monotonic()
+        while True:
+            wait = self.reserve(tokens)
+            if wait <= 0:
+                return time.monotonic() - start
+            await asyncio.sleep(wait + random.uniform(0, 0.05))
+
+    def settle(self, estimated: float, actual: Optional[float]):
+        """
+        按实际用量修正预扣的 token
+
+        Args:
+            estimated: 预扣的 token 数
+            actual: 响应中的实际 token 数，未知时不修正
+        """
+        if not self.tokens_per_minute or actual is None:
+            return
+        with self._locked_state() as state:
+            state["tokens"] = min(self.token_capacity, state["tokens"] + estimated - actual)
+
+    def block(self, seconds: float):
+        """
+        暂停所有调用方（收到 429 时调用）
+
+        Args:
+            seconds: 暂停秒数
+        """
+        with self._locked_state() as state:
+            state["blocked_until"] = max(state["blocked_until"], time.time() + seconds)
+
+
+_limiters: Dict[str, TokenBucketLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_shared_limiter(name: str,
+                       requests_per_minute: float = 0,
+                       tokens_per_minute: float = 0,
+                       state_path: Optional[str] = None) -> TokenBucketLimiter:
+    """
+    按名称获取进程内共享的限流器，同一服务的多个客户端实例共用一份配额
+
+    Args:
+        name: 限流器名称（如服务名 + 接入点）
+        requests_per_minute: 每分钟请求数上限
+        tokens_per_minute: 每分钟 token 数上限
+        state_path: 跨进程共享的状态文件
+
+    Returns:
+        限流器（首次创建时的参数生效）
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = TokenBucketLimiter(requests_per_minute, tokens_per_minute, state_path)
+        return _limiters[name]
@@ -0,0 +1,230 @@
+"""LLM 响应缓存：内存 LRU + SQLite 磁盘两级缓存"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from config import Config
+
+
+def make_cache_key(model: str,
+                   messages: List[Dict[str, str]],
+                   temperature: float,
+                   max_tokens: int,
+                   **extra) -> str:
+    """
+    根据请求内容生成缓存键（内容寻址）
+
+    Args:
+        model: 模型名称
+        messages: 对话消息列表
+        temperature: 温度参数
+        max_tokens: 最大 token 数
+        **extra: 其他影响输出的请求参数（如 response_format）
+
+    Returns:
+        sha256 十六进制摘要
+    """
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        **extra
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    两级响应缓存
+
+    - 内存层：OrderedDict 实现的 LRU，按条目数淘汰
+    - 磁盘层：SQLite，可跨进程、跨重启复用，按最近访问时间淘汰
+    - 两层共用同一个 TTL，过期条目在读取时丢弃
+
+    值需要能被 JSON 序列化。所有方法都是线程安全的。
+    """
+
+    # 每写入这么多次做一次磁盘淘汰，避免每次写入都扫描全表
+    _EVICT_EVERY = 64
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 ttl: float = Config.LLM_CACHE_TTL,
+                 max_memory_entries: int = Config.LLM_CACHE_MEMORY_ENTRIES,
+                 max_disk_entries: int = Config.LLM_CACHE_DISK_ENTRIES,
+                 table: str = "responses"):
+        """
+        Args:
+            path: SQLite 文件路径，为 None 时只使用内存层
+            ttl: 过期时间（秒），<= 0 表示永不过期
+            max_memory_entries: 内存层最大条目数
+            max_disk_entries: 磁盘层最大条目数
+            table: 表名，不同用途的缓存可以共用一个文件
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.table = table
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_accessed ON {table} (accessed_at)"
+            )
+            self._db.commit()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存值，未命中或已过期时返回 None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        self._db.execute(
+                            f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                        self._db.commit()
+                        value = json.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 可 JSON 序列化的值
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._db is None:
+                return
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._writes += 1
+            if self._writes % self._EVICT_EVERY == 0:
+                self._evict_disk(now)
+            self._db.commit()
+
+    def _remember(self, key: str, created_at: float, value: Any):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        if self.ttl > 0:
+            self._db.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl,))
+        self._db.execute(
+            f"DELETE FROM {self.table} WHERE key NOT IN ("
+            f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT ?)",
+            (self.max_disk_entries,)
+        )
+
+    def clear(self):
+        """清空两级缓存（统计计数保留）"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table}")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取命中统计
+
+        Returns:
+            命中/未命中次数、命中率和内存层条目数
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._memory)
+            }
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[ResponseCache]:
+    """
+    获取进程内共享的 LLM 响应缓存
+
+    Returns:
+        ResponseCache 实例；Config.LLM_CACHE_ENABLED 关闭时返回 None
+    """
+    global _default_cache
+    if not Config.LLM_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(path=Config.LLM_CACHE_PATH or None)
+        return _default_cache
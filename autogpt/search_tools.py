@@ -1,7 +1,10 @@
 """检索和分析工具"""
 import json
+import os
 from typing import List, Dict
+from config import Config
 from kimi_client import KimiClient
+from kb_index import load_or_build_index
 
 
 class SearchTools:
@@ -31,36 +34,34 @@ class SearchTools:
                 "实验观察、科学探究方法"
             ]
         }
+        # 倒排索引在初始化时构建一次，语料不变时直接从磁盘加载
+        self._entries = [
+            (subject, item)
+            for subject, items in self.knowledge_base.items()
+            for item in items
+        ]
+        path = os.path.join(Config.KB_INDEX_DIR, "search_tools_index.json") if Config.KB_INDEX_DIR else None
+        self._index = load_or_build_index([f"{subject} {item}" for subject, item in self._entries], path)
     
-    def search_knowledge(self, keywords: List[str], subject: str = None) -> str:
+    def search_knowledge(self, keywords: List[str], subject: str = None, top_k: int = 5) -> str:
         """
         在知识库中搜索相关内容
         
         Args:
             keywords: 关键词列表
             subject: 学科类别
+            top_k: 最多返回的条目数
             
         Returns:
-            搜索到的相关知识
+            搜索到的相关知识，按相关度排序
         """
-        results = []
-        
         # 如果指定了学科，只搜索该学科
+        allowed = None
         if subject and subject in self.knowledge_base:
-            for keyword in keywords:
-                for item in self.knowledge_base[subject]:
-                    if keyword in item:
-                        results.append(item)
-        else:
-            # 全局搜索
-            for keyword in keywords:
-                for subject_items in self.knowledge_base.values():
-                    for item in subject_items:
-                        if keyword in item:
-                            results.append(item)
-        
-        # 去重
-        results = list(set(results))
+            allowed = {i for i, (s, _) in enumerate(self._entries) if s == subject}
+        
+        hits = self._index.search(" ".join(keywords), top_k=top_k, allowed=allowed)
+        results = [self._entries[doc_id][1] for doc_id, _ in hits]
         
         if not results:
             return "未找到相关知识内容"
@@ -0,0 +1,271 @@
+"""
+结构化输出：容错的增量 JSON 解析 + 简单的 schema 校验
+
+模型输出的 JSON 常见问题：包在 ```json 代码块里、前后带说明文字、
+结尾多余的逗号、因 max_tokens 截断而缺少结尾。这里逐字符扫描，
+跳过第一个 { / [ 之前和顶层结束之后的内容，删除多余逗号，
+并记录最近一个完整值的位置，截断时在那里补齐括号，尽量保留已生成的内容，
+而不是整段作废重新生成。
+
+schema 使用 JSON Schema 的一个子集：type / properties / required / items。
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """
+    增量 JSON 解析器
+
+    可以边接收流式输出边 feed，任何时候调用 snapshot() 得到目前为止能解析出的对象。
+    feed 只处理新到的内容，snapshot 只需补齐括号，不会重复扫描全文。
+    """
+
+    def __init__(self):
+        self._out: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_is_value = False
+        self._last_sig = ""
+        self._started = False
+        self.done = False
+        # 最近一个"截到这里再补齐括号就是合法 JSON"的位置
+        self._safe: Tuple[int, str] = (0, "")
+        self.repaired = False
+
+    def _closers(self) -> str:
+        return "".join(_CLOSERS[c] for c in reversed(self._stack))
+
+    def _mark_safe(self, length: Optional[int] = None):
+        self._safe = (len(self._out) if length is None else length, self._closers())
+
+    def feed(self, chunk: str):
+        """
+        读入一段输出
+
+        Args:
+            chunk: 新到的文本
+        """
+        for ch in chunk:
+            if self.done:
+                return
+            if not self._started:
+                # 跳过代码块标记和说明文字
+                if ch in _CLOSERS:
+                    self._started = True
+                else:
+                    continue
+
+            if self._in_string:
+                self._out.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_sig = '"'
+                    if self._string_is_value:
+                        self._mark_safe()
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_is_value = self._last_sig == ":" or (self._stack and self._stack[-1] == "[")
+                self._out.append(ch)
+            elif ch in _CLOSERS:
+                self._stack.append(ch)
+                self._out.append(ch)
+                self._last_sig = ch
+                self._mark_safe()
+            elif ch in "}]":
+                self._strip_trailing_comma()
+                # 括号不匹配时按实际打开的括号闭合
+                self._out.append(_CLOSERS[self._stack.pop()])
+                self._last_sig = ch
+                self._mark_safe()
+                if not self._stack:
+                    self.done = True
+            elif ch == ",":
+                self._mark_safe(len(self._out))
+                self._out.append(ch)
+                self._last_sig = ch
+            elif ch in _WHITESPACE:
+                self._out.append(ch)
+            else:
+                self._out.append(ch)
+                self._last_sig = ch
+
+    def _strip_trailing_comma(self):
+        end = len(self._out)
+        while end and self._out[end - 1] in _WHITESPACE:
+            end -= 1
+        if end and self._out[end - 1] == ",":
+            del self._out[end - 1:]
+            self.repaired = True
+
+    def snapshot(self) -> Any:
+        """
+        目前为止能解析出的对象
+
+        Returns:
+            解析结果（截断时为补齐后的部分结果）
+
+        Raises:
+            ValueError: 还没有任何可用的内容
+        """
+        text = "".join(self._out)
+        if self.done:
+            return json.loads(text, strict=False)
+        if not self._started:
+            raise ValueError("输出中没有 JSON")
+
+        self.repaired = True
+        # 先尝试直接补齐：未闭合的字符串补引号，再补括号
+        tail = text
+        if self._in_string:
+            if self._escape:
+                tail = tail[:-1]
+            tail += '"'
+        try:
+            return json.loads(tail.rstrip().rstrip(",") + self._closers(), strict=False)
+        except json.JSONDecodeError:
+            pass
+        # 最后一个值不完整（如只有键名或半个数字），退回到最近的完整位置
+        length, closers = self._safe
+        return json.loads(text[:length].rstrip().rstrip(",") + closers, strict=False)
+
+
+def parse_json(text: str) -> Tuple[Any, bool]:
+    """
+    容错解析模型输出的 JSON
+
+    Args:
+        text: 模型输出
+
+    Returns:
+        (解析结果, 是否经过修复)
+
+    Raises:
+        ValueError: 无法解析（json.JSONDecodeError 也是 ValueError）
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.snapshot(), parser.repaired
+
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """
+    按 schema 校验
+
+    Args:
+        value: 待校验的值
+        schema: schema（type / properties / required / items）
+        path: 当前路径，用于错误信息
+
+    Returns:
+        错误列表，为空表示通过
+    """
+    errors = []
+    expected = schema.get("type")
+    if expected:
+        py_type = _TYPES[expected]
+        # bool 是 int 的子类，单独排除
+        if not isinstance(value, py_type) or (expected in ("integer", "number") and isinstance(value, bool)):
+            return [f"{path}: 应为 {expected}"]
+
+    if expected == "object":
+        for name in schema.get("required", []):
+            if name not in value:
+                errors.append(f"{path}.{name}: 缺少字段")
+        for name, sub_schema in schema.get("properties", {}).items():
+            if name in value:
+                errors.extend(validate(value[name], sub_schema, f"{path}.{name}"))
+    elif expected == "array" and "items" in schema:
+        for i, item in enumerate(value):
+            errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+def coerce(value: Any, schema: Dict[str, Any]) -> Any:
+    """
+    修正常见的类型偏差：数字写成字符串、单个值没有放进数组
+
+    Args:
+        value: 解析结果
+        schema: schema
+
+    Returns:
+        修正后的值
+    """
+    expected = schema.get("type")
+    if expected in ("integer", "number") and isinstance(value, str):
+        try:
+            number = float(value.strip())
+            return int(number) if expected == "integer" and number.is_integer() else number
+        except ValueError:
+            return value
+    if expected == "array" and value is not None and not isinstance(value, list):
+        value = [value]
+    if expected == "array" and isinstance(value, list) and "items" in schema:
+        return [coerce(item, schema["items"]) for item in value]
+    if expected == "object" and isinstance(value, dict):
+        properties = schema.get("properties", {})
+        return {k: coerce(v, properties[k]) if k in properties else v for k, v in value.items()}
+    return value
+
+
+def describe_schema(schema: Dict[str, Any]) -> str:
+    """
+    把 schema 压缩成一行字段说明，代替提示词里完整的示例模板
+
+    例如 {"topic": string, "steps": [{"phase": string, "duration": integer}]}
+
+    Args:
+        schema: schema
+
+    Returns:
+        字段说明
+    """
+    expected = schema.get("type")
+    if expected == "object":
+        fields = ", ".join(
+            f'"{name}": {describe_schema(sub)}' for name, sub in schema.get("properties", {}).items()
+        )
+        return "{" + fields + "}"
+    if expected == "array":
+        return f"[{describe_schema(schema.get('items', {}))}]"
+    return schema.get("description", expected or "any")
+
+
+def parse_structured(text: str, schema: Dict[str, Any]) -> Tuple[Any, List[str], bool]:
+    """
+    解析 + 类型修正 + 校验
+
+    Args:
+        text: 模型输出
+        schema: schema
+
+    Returns:
+        (结果, 校验错误列表, 是否经过修复)
+
+    Raises:
+        ValueError: 完全无法解析
+    """
+    value, repaired = parse_json(text)
+    value = coerce(value, schema)
+    return value, validate(value, schema), repaired
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+知识库检索测试：只有零星词项重合的问题不应命中知识库
+"""
+
+import os
+import tempfile
+
+from config import Config
+
+Config.KB_INDEX_DIR = ""
+Config.KB_STORE_PATH = ""
+
+from kb_index import InvertedIndex, MappedInvertedIndex, load_or_build_index
+from tools import EducationKnowledgeBase
+
+
+def test_shared_bigram_is_not_a_hit():
+    """只共有 "学习" 一个词项时返回 None，转为网络搜索"""
+    assert EducationKnowledgeBase.search("如何提高学生的学习兴趣") is None
+
+
+def test_relevant_question_still_hits():
+    """查询词项大部分出现在段落中时正常命中"""
+    assert EducationKnowledgeBase.search("代数是什么") == EducationKnowledgeBase.KNOWLEDGE_BASE["数学"]["代数"]
+    assert EducationKnowledgeBase.search("英语语法") == EducationKnowledgeBase.KNOWLEDGE_BASE["英语"]["语法"]
+
+
+def test_search_top_k_without_floor_keeps_weak_hits():
+    """search_top_k 默认不设下限，保留原有行为"""
+    hits = EducationKnowledgeBase.search_top_k("如何提高学生的学习兴趣", top_k=1)
+    assert hits and hits[0]["topic"] == "词汇"
+
+
+def test_short_query_requires_all_terms():
+    """查询词项少于 min_terms 时要求全部命中"""
+    index = InvertedIndex.build(["分数 加法", "小数 乘法"])
+    assert [doc_id for doc_id, _ in index.search("分数", min_terms=2)] == [0]
+    assert index.search("分数乘法", min_coverage=0.6) == []
+
+
+def test_mapped_index_matches_in_memory_index():
+    """内存映射格式与 JSON 格式的检索结果一致"""
+    texts = [f"{subject} {topic} {content}"
+             for subject, topics in EducationKnowledgeBase.KNOWLEDGE_BASE.items()
+             for topic, content in topics.items()]
+    index = InvertedIndex.build(texts)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index.bin")
+        index.save_mapped(path)
+        mapped = load_or_build_index(texts, path, fingerprint=index.fingerprint, mapped=True)
+        try:
+            assert isinstance(mapped, MappedInvertedIndex)
+            assert mapped.fingerprint == index.fingerprint
+            for query in ("代数是什么", "英语语法", "如何提高学生的学习兴趣", "不相关"):
+                assert mapped.search(query, top_k=3) == index.search(query, top_k=3)
+        finally:
+            mapped.close()
+
+
+if __name__ == "__main__":
+    test_shared_bigram_is_not_a_hit()
+    test_relevant_question_still_hits()
+    test_search_top_k_without_floor_keeps_weak_hits()
+    test_short_query_requires_all_terms()
+    test_mapped_index_matches_in_memory_index()
+    print("✅ 知识库检索测试通过")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网络检索测试：多次并发检索复用常驻线程上的检索会话，不随每次调用新建
+"""
+
+import importlib
+import os
+import sys
+import threading
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _load_search_module():
+    """tools.py 与 tools/ 目录同名，挂到单独的包名下加载 tools/search.py"""
+    for name, path in (("_autogpt", HERE), ("_autogpt.tools", os.path.join(HERE, "tools"))):
+        if name not in sys.modules:
+            package = types.ModuleType(name)
+            package.__path__ = [path]
+            sys.modules[name] = package
+    return importlib.import_module("_autogpt.tools.search")
+
+
+search = _load_search_module()
+
+
+class CountingBackend(search.DuckDuckGoBackend):
+    """按线程创建会话的真实后端逻辑不变，会话本身换成 StubSearchBackend 并计数"""
+
+    def __init__(self, stub):
+        super().__init__()
+        self.stub = stub
+        self.sessions = 0
+        self._count_lock = threading.Lock()
+
+    def _create_session(self):
+        with self._count_lock:
+            self.sessions += 1
+        stub = self.stub
+
+        class Session:
+            def text(self, query, region, max_results):
+                return [
+                    {"title": hit["title"], "href": hit["url"], "body": hit["snippet"]}
+                    for hit in stub.search(query, max_results, region)
+                ]
+
+        return Session()
+
+
+def test_concurrent_searches_reuse_sessions():
+    """多轮并发检索的会话数不超过共享线程池大小"""
+    stub = search.StubSearchBackend(
+        lambda query: [{"title": query, "url": f"https://example.com/{query}", "snippet": query}]
+    )
+    backend = CountingBackend(stub)
+    search.set_search_backend(backend)
+
+    rounds = 5
+    for i in range(rounds):
+        queries = [f"第{i}轮查询{j}" for j in range(4)]
+        results = search.search_concurrently(queries, max_results=3)
+        assert [hits[0]["title"] for hits in results] == queries
+
+    assert len(stub.calls) == rounds * 4
+    assert 1 <= backend.sessions <= search.get_search_executor()._max_workers
+
+
+if __name__ == "__main__":
+    test_concurrent_searches_reuse_sessions()
+    print("✅ 网络检索测试通过")
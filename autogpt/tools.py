@@ -1,6 +1,11 @@
 """工具模块：检索和分析工具"""
-import requests
-from typing import List, Dict, Optional
+import os
+from typing import List, Dict, Optional, Tuple
+from config import Config
+from kb_index import InvertedIndex, load_or_build_index
+from kb_store import KnowledgeStore
+from page_fetcher import fetch_many, fetch_text
+from vector_index import VectorIndex, load_or_update_index, numpy_available
 
 
 class SearchTool:
@@ -46,14 +51,29 @@ class SearchTool:
             网页文本内容
         """
         try:
-            response = requests.get(url, timeout=5)
-            response.encoding = 'utf-8'
-            # 简单提取文本（实际应该使用 BeautifulSoup 等库）
-            return response.text[:2000]  # 限制长度
+            # 复用连接池，流式读取，读满字节预算或提取到足够正文即停止
+            return fetch_text(url)
         except Exception as e:
             print(f"获取内容出错: {e}")
             return None
 
+    @staticmethod
+    def fetch_contents(urls: List[str]) -> List[Optional[str]]:
+        """
+        并发获取多个网页内容
+
+        Args:
+            urls: 网页 URL 列表（如检索结果的前 N 条）
+
+        Returns:
+            与 urls 一一对应的网页文本内容，失败的为 None
+        """
+        try:
+            return fetch_many(urls)
+        except Exception as e:
+            print(f"获取内容出错: {e}")
+            return [None] * len(urls)
+
 
 class AnalysisTool:
     """分析工具"""
@@ -96,7 +116,15 @@ class AnalysisTool:
 
 
 class EducationKnowledgeBase:
-    """教学知识库（模拟）"""
+    """
+    教学知识库
+    
+    默认使用内置的模拟数据；设置 Config.KB_STORE_PATH 后改为读取
+    kb_store 生成的内存映射存储文件，正文只在命中时才解码。
+    
+    提供两种检索：search / search_top_k 为 BM25 关键词检索，
+    semantic_search 为向量检索，用于匹配换了说法的问题。
+    """
     
     # 模拟知识库数据
     KNOWLEDGE_BASE = {
@@ -114,6 +142,62 @@ class EducationKnowledgeBase:
         }
     }
     
+    # 按文档ID取 (subject, topic, content)：内置数据为列表，磁盘存储为 KnowledgeStore
+    _entries = None
+    _index: Optional[InvertedIndex] = None
+    _vector_index: Optional[VectorIndex] = None
+    _vector_mapping: List[int] = []
+    # 可替换为真实的嵌入模型：embed_fn(texts) -> (len(texts), VECTOR_DIM) 矩阵
+    embed_fn = None
+    
+    @classmethod
+    def _get_index(cls) -> InvertedIndex:
+        """首次使用时加载（或构建并保存）倒排索引"""
+        if cls._index is None:
+            path = os.path.join(Config.KB_INDEX_DIR, "education_kb_index.json") if Config.KB_INDEX_DIR else None
+            if Config.KB_STORE_PATH:
+                entries = KnowledgeStore(Config.KB_STORE_PATH)
+                # 有存储文件自带的指纹，命中磁盘索引时不需要读取任何正文；
+                # 倒排链同样内存映射，多个 worker 共享页缓存
+                path = os.path.join(Config.KB_INDEX_DIR, "education_kb_index.bin") if Config.KB_INDEX_DIR else None
+                cls._index = load_or_build_index(
+                    (f"{subject} {topic} {content}" for subject, topic, content in entries),
+                    path, fingerprint=entries.fingerprint, mapped=path is not None
+                )
+            else:
+                entries: List[Tuple[str, str, str]] = [
+                    (subject, topic, content)
+                    for subject, topics in cls.KNOWLEDGE_BASE.items()
+                    for topic, content in topics.items()
+                ]
+                cls._index = load_or_build_index(
+                    [f"{subject} {topic} {content}" for subject, topic, content in entries], path
+                )
+            cls._entries = entries
+        return cls._index
+    
+    @classmethod
+    def search_top_k(cls, query: str, top_k: int = 5,
+                     min_coverage: float = 0.0, min_terms: int = 1) -> List[Dict]:
+        """
+        在知识库中按 BM25 相关度检索
+        
+        Args:
+            query: 查询内容
+            top_k: 返回结果数
+            min_coverage: 命中查询词项的最低比例
+            min_terms: 最少命中的查询词项数
+        
+        Returns:
+            结果列表，每项包含 subject、topic、content、score
+        """
+        index = cls._get_index()
+        results = []
+        for doc_id, score in index.search(query, top_k=top_k, min_coverage=min_coverage, min_terms=min_terms):
+            subject, topic, content = cls._entries[doc_id]
+            results.append({"subject": subject, "topic": topic, "content": content, "score": score})
+        return results
+    
     @classmethod
     def search(cls, query: str) -> Optional[str]:
         """
@@ -123,12 +207,53 @@ class EducationKnowledgeBase:
             query: 查询内容
         
         Returns:
-            相关知识内容
-        """
-        query_lower = query.lower()
-        for subject, topics in cls.KNOWLEDGE_BASE.items():
-            if subject in query_lower:
-                for topic, content in topics.items():
-                    if topic in query_lower:
-                        return content
-        return None
+            最相关的知识内容；只有零星词项重合（如只共有 "学习"）时为 None，
+            调用方会转为网络搜索
+        """
+        hits = cls.search_top_k(query, top_k=1, min_coverage=Config.KB_MIN_COVERAGE,
+                                min_terms=Config.KB_MIN_TERMS)
+        return hits[0]["content"] if hits else None
+    
+    @classmethod
+    def _get_vector_index(cls) -> Optional[VectorIndex]:
+        """首次使用时增量构建向量索引，只嵌入磁盘上还没有的段落"""
+        if cls._vector_index is None:
+            if not (Config.VECTOR_SEARCH_ENABLED and numpy_available()):
+                return None
+            index = cls._get_index()
+            path = os.path.join(Config.KB_INDEX_DIR, "education_kb_vectors.npz") if Config.KB_INDEX_DIR else None
+            # 惰性遍历：向量文件的语料指纹与倒排索引一致时一条正文都不读
+            cls._vector_index, cls._vector_mapping = load_or_update_index(
+                (f"{subject} {topic} {content}" for subject, topic, content in cls._entries),
+                path, embed_fn=cls.embed_fn, dim=Config.VECTOR_DIM, fingerprint=index.fingerprint
+            )
+        return cls._vector_index
+    
+    @classmethod
+    def semantic_search(cls, query: str, top_k: int = 3,
+                        min_score: float = Config.VECTOR_MIN_SCORE) -> List[Dict]:
+        """
+        向量检索
+        
+        Args:
+            query: 查询内容
+            top_k: 返回结果数
+            min_score: 最低余弦相似度
+        
+        Returns:
+            结果列表，每项包含 subject、topic、content、score；
+            未安装 numpy 或未启用向量检索时返回空列表
+        """
+        index = cls._get_vector_index()
+        if index is None:
+            return []
+        results = []
+        for row, score in index.search(query, top_k=top_k):
+            if score < min_score:
+                continue
+            doc_id = cls._vector_mapping[row]
+            subject, topic, content = cls._entries[doc_id]
+            results.append({"subject": subject, "topic": topic, "content": content, "score": score})
+            if len(results) >= top_k:
+                break
+        return results
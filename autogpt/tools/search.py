@@ -1,17 +1,243 @@
-from typing import List, Dict
-from duckduckgo_search import DDGS
-
-
-def web_search(query: str, max_results: int = 5, region: str = "cn-zh") -> List[Dict[str, str]]:
-    """使用 DuckDuckGo 进行网页检索，返回标题、URL、摘要。"""
-    results: List[Dict[str, str]] = []
-    with DDGS() as ddgs:
-        for r in ddgs.text(query, region=region, max_results=max_results):
-            results.append({
-                "title": r.get("title", ""),
-                "url": r.get("href", ""),
-                "snippet": r.get("body", ""),
-            })
+import json
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Dict, Optional, Set
+
+from ..config import Config
+from ..response_cache import ResponseCache
+
+
+class DuckDuckGoBackend:
+    """
+    DuckDuckGo 检索后端。
+
+    每个线程复用一个长期存在的 DDGS 会话（连接池、Cookie 不再每次重建），
+    会话出错时丢弃，下次调用重新创建。检索统一在 get_search_executor()
+    的常驻线程中执行，会话数不超过线程池大小。
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _create_session(self):
+        from duckduckgo_search import DDGS
+        return DDGS()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._create_session()
+            self._local.session = session
+        return session
+
+    def search(self, query: str, max_results: int, region: str) -> List[Dict[str, str]]:
+        try:
+            raw = self._session().text(query, region=region, max_results=max_results) or []
+        except Exception:
+            self._local.session = None
+            raise
+        return [
+            {"title": r.get("title", ""), "url": r.get("href", ""), "snippet": r.get("body", "")}
+            for r in raw
+        ]
+
+
+class StubSearchBackend:
+    """离线测试用的检索后端：返回预置结果或由函数生成结果，并记录调用。"""
+
+    def __init__(self, results: Dict[str, List[Dict[str, str]]] | Callable[[str], List[Dict[str, str]]] | None = None):
+        self.results = results or {}
+        self.calls: List[str] = []
+
+    def search(self, query: str, max_results: int, region: str) -> List[Dict[str, str]]:
+        self.calls.append(query)
+        hits = self.results(query) if callable(self.results) else self.results.get(query, [])
+        return list(hits)[:max_results]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_cache: Optional[ResponseCache] = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_search_backend():
+    """获取当前检索后端，默认 DuckDuckGoBackend。"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = DuckDuckGoBackend()
+        return _backend
+
+
+def set_search_backend(backend, cache: Optional[ResponseCache] = None):
+    """
+    替换检索后端（如离线测试时换成 StubSearchBackend）。
+
+    同时替换结果缓存，默认换成一个只在内存中的新缓存，避免读到其他后端的结果。
+    """
+    global _backend, _cache
+    with _backend_lock:
+        _backend = backend
+        _cache = cache or ResponseCache(path=None, ttl=Config.SEARCH_CACHE_TTL)
+
+
+def get_search_cache() -> Optional[ResponseCache]:
+    """获取检索结果缓存；Config.SEARCH_CACHE_ENABLED 关闭时返回 None。"""
+    global _cache
+    if not Config.SEARCH_CACHE_ENABLED:
+        return None
+    with _backend_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                path=Config.SEARCH_CACHE_PATH or None,
+                ttl=Config.SEARCH_CACHE_TTL,
+                table="search",
+            )
+        return _cache
+
+
+def get_search_executor() -> ThreadPoolExecutor:
+    """
+    获取检索共用的常驻线程池，大小为 Config.SEARCH_WORKERS。
+
+    线程在进程内长期存在，各线程上的 DDGS 会话因此得以复用，
+    不会因为每次检索新建线程池而反复建立连接。
+    """
+    global _executor
+    with _backend_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, Config.SEARCH_WORKERS),
+                thread_name_prefix="web-search",
+            )
+        return _executor
+
+
+def _search_cache_key(query: str, max_results: int, region: str) -> str:
+    raw = json.dumps({"query": query.strip(), "region": region, "max_results": max_results},
+                     ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def web_search(query: str, max_results: int = 5, region: str = "cn-zh", use_cache: bool = True) -> List[Dict[str, str]]:
+    """使用 DuckDuckGo 进行网页检索，返回标题、URL、摘要；结果按查询、地区、条数缓存。"""
+    cache = get_search_cache() if use_cache else None
+    key = _search_cache_key(query, max_results, region)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    results = get_search_backend().search(query, max_results, region)
+    # 空结果多半是限流或临时故障，不缓存
+    if cache is not None and results:
+        cache.set(key, results)
     return results
 
 
+_STEP_LABEL = re.compile(r"^(第[一二三四五六七八九十\d]+步|\d+[.、])[:：]?\s*")
+_PUNCTUATION = re.compile(r"[，。、；：！？,.;:!?（）()“”\"'\s]+")
+
+
+def step_queries(question: str, plan_steps: List[str], max_queries: int = 4, step_chars: int = 24) -> List[str]:
+    """由计划步骤派生检索查询：问题 + 步骤要点，去重后最多 max_queries 条。"""
+    queries: List[str] = []
+    for step in plan_steps:
+        focus = _PUNCTUATION.sub(" ", _STEP_LABEL.sub("", step.strip())).strip()[:step_chars]
+        query = f"{question} {focus}".strip()
+        if focus and query not in queries:
+            queries.append(query)
+        if len(queries) >= max_queries:
+            break
+    return queries
+
+
+def _normalize_url(url: str) -> str:
+    url = re.sub(r"^https?://(www\.)?", "", url.strip().lower())
+    return url.split("#", 1)[0].rstrip("/")
+
+
+def _shingles(text: str, n: int = 3) -> Set[str]:
+    text = _PUNCTUATION.sub("", text)
+    # 过短的摘要不参与近似重复判断，只按 URL 去重
+    if len(text) < n:
+        return set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _is_near_duplicate(a: Set[str], b: Set[str], threshold: float = 0.8) -> bool:
+    if not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= threshold
+
+
+def search_concurrently(
+    queries: List[str],
+    max_results: int = 5,
+    region: str = "cn-zh",
+    max_workers: int = 4,
+    timeout: float = 8.0,
+) -> List[List[Dict[str, str]]]:
+    """
+    并发执行多条查询，返回与 queries 一一对应的结果列表。
+
+    查询提交到 get_search_executor() 的共享线程池，同时在途的查询不超过
+    max_workers 与线程池大小中的较小值；超过 timeout 秒仍未返回或出错的查询结果为空列表，
+    总耗时约等于最慢的一条（不超过 timeout），而不是各条之和。
+    """
+    if not queries:
+        return []
+
+    executor = get_search_executor()
+    slots = threading.BoundedSemaphore(max(1, max_workers))
+
+    def run(query: str) -> List[Dict[str, str]]:
+        with slots:
+            return web_search(query, max_results, region)
+
+    futures = [executor.submit(run, q) for q in queries]
+    done, not_done = wait(futures, timeout=timeout)
+    # 不等待超时的查询；尚未开始的直接取消，已在执行的在线程池中自然结束
+    for future in not_done:
+        future.cancel()
+    return [f.result() if f in done and f.exception() is None else [] for f in futures]
+
+
+def merge_hits(result_lists: List[List[Dict[str, str]]], max_results: int = 5) -> List[Dict[str, str]]:
+    """
+    合并多条查询的结果。
+
+    按 URL 和摘要近似重复去重，按倒数排名融合（RRF）排序，
+    排在前面的查询（通常是原始问题）权重更高；
+    重复结果保留权重最高的查询返回的那一条。
+    """
+    scored: List[Dict] = []
+    for query_index, hits in enumerate(result_lists):
+        query_weight = 1.0 / (1 + query_index)
+        for rank, hit in enumerate(hits):
+            score = query_weight / (rank + 1)
+            url_key = _normalize_url(hit.get("url", ""))
+            shingles = _shingles(hit.get("snippet", ""))
+            for entry in scored:
+                if (url_key and url_key == entry["url_key"]) or _is_near_duplicate(shingles, entry["shingles"]):
+                    entry["score"] += score
+                    break
+            else:
+                scored.append({"hit": hit, "score": score, "url_key": url_key, "shingles": shingles})
+
+    scored.sort(key=lambda entry: entry["score"], reverse=True)
+    return [entry["hit"] for entry in scored[:max_results]]
+
+
+def multi_search(
+    queries: List[str],
+    max_results: int = 5,
+    region: str = "cn-zh",
+    max_workers: int = 4,
+    timeout: float = 8.0,
+) -> List[Dict[str, str]]:
+    """并发执行多条查询并去重合并结果，见 search_concurrently 与 merge_hits。"""
+    return merge_hits(search_concurrently(queries, max_results, region, max_workers, timeout), max_results)
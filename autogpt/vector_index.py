@@ -0,0 +1,374 @@
+"""
+向量检索：归一化向量矩阵 + 批量点积 Top-K，可选 IVF 倒排聚类加速
+
+嵌入函数可插拔，签名为 embed_fn(texts) -> (len(texts), dim) 的矩阵；
+默认使用 HashingEmbedder（字符 n-gram 特征哈希，纯 CPU、无需模型文件）。
+依赖 numpy，未安装时 VectorIndex 不可用，调用方应退回关键词检索。
+"""
+import hashlib
+import os
+import zlib
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 向量检索是可选能力
+    np = None
+
+from kb_index import tokenize
+
+EmbedFn = Callable[[List[str]], "np.ndarray"]
+
+
+def numpy_available() -> bool:
+    """是否可以使用向量检索"""
+    return np is not None
+
+
+def text_id(text: str) -> str:
+    """文本内容的稳定ID，用于增量构建时判断哪些段落已经嵌入"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def embedder_name(embed_fn: EmbedFn) -> str:
+    """
+    嵌入函数的标识，随向量一起保存，换了嵌入模型时旧向量作废
+
+    嵌入函数可以提供 name 属性；否则使用其模块名和限定名。
+    """
+    name = getattr(embed_fn, "name", None)
+    if name:
+        return str(name)
+    qualname = getattr(embed_fn, "__qualname__", None) or type(embed_fn).__qualname__
+    return f"{getattr(embed_fn, '__module__', '')}.{qualname}"
+
+
+class HashingEmbedder:
+    """
+    特征哈希嵌入
+
+    把单字和相邻两字（见 kb_index.tokenize）哈希到固定维度，带符号累加后归一化。
+    单字特征让"分数加法"和"分数运算"这类改写仍有重叠。
+    使用 crc32 而不是内置 hash，保证跨进程结果一致，可以持久化。
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    @property
+    def name(self) -> str:
+        return f"hashing-crc32:{self.dim}"
+
+    def _features(self, text: str) -> List[str]:
+        bigrams = tokenize(text)
+        unigrams = [ch for ch in text if "㐀" <= ch <= "鿿"]
+        return bigrams + unigrams
+
+    def __call__(self, texts: List[str]) -> "np.ndarray":
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return matrix
+
+
+def _normalize(matrix: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class VectorIndex:
+    """
+    可增量追加的向量索引
+
+    向量按行存放在预分配的矩阵中，容量不足时倍增，追加不需要重建。
+    默认精确检索（一次矩阵乘法得到全部相似度）；语料较大时可调用
+    train_ivf 训练聚类中心，之后只在最近的 n_probe 个簇内检索，
+    新追加的向量直接分配到最近的簇，同样不需要重建。
+    """
+
+    def __init__(self, embed_fn: Optional[EmbedFn] = None, dim: int = 512):
+        """
+        Args:
+            embed_fn: 批量嵌入函数，默认 HashingEmbedder(dim)
+            dim: 向量维度，需与 embed_fn 输出一致
+        """
+        if np is None:
+            raise RuntimeError("向量检索需要安装 numpy")
+        self.embed_fn = embed_fn or HashingEmbedder(dim)
+        self.dim = dim
+        self.ids: List[str] = []
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._size = 0
+        self._centroids: Optional["np.ndarray"] = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        # 构建时的语料指纹和向量下标到文档ID的映射，指纹不变时加载后可直接使用
+        self.fingerprint = ""
+        self.doc_ids: List[int] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> "np.ndarray":
+        """当前所有向量（只读视图）"""
+        return self._vectors[:self._size]
+
+    def add(self, texts: Sequence[str], ids: Optional[Sequence[str]] = None, batch_size: int = 256):
+        """
+        追加文本
+
+        Args:
+            texts: 文本列表
+            ids: 对应的ID，默认使用 text_id(text)
+            batch_size: 每批嵌入的文本数
+        """
+        ids = list(ids) if ids is not None else [text_id(t) for t in texts]
+        for start in range(0, len(texts), batch_size):
+            batch = _normalize(self.embed_fn(list(texts[start:start + batch_size])))
+            self.add_vectors(batch, ids[start:start + batch_size])
+
+    def add_vectors(self, vectors: "np.ndarray", ids: Sequence[str]):
+        """
+        追加已归一化的向量
+
+        Args:
+            vectors: (n, dim) 矩阵
+            ids: 对应的ID
+        """
+        n = len(ids)
+        needed = self._size + n
+        if needed > len(self._vectors):
+            capacity = max(needed, 2 * len(self._vectors), 64)
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[self._size:needed] = vectors
+        if self._centroids is not None:
+            self._assignments = np.concatenate(
+                [self._assignments, np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)]
+            )
+        self._size = needed
+        self.ids.extend(ids)
+
+    def keep(self, rows: Sequence[int]):
+        """
+        只保留指定行（如删除已不在语料中的段落），保持原有顺序和聚类分配
+
+        Args:
+            rows: 要保留的向量下标（升序）
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        self._vectors = self.vectors[rows].copy()
+        if self._centroids is not None:
+            self._assignments = self._assignments[rows]
+        self.ids = [self.ids[i] for i in rows]
+        self._size = len(rows)
+
+    def train_ivf(self, n_lists: int = 64, iterations: int = 10, seed: int = 0):
+        """
+        训练 IVF 聚类中心（球面 k-means）
+
+        Args:
+            n_lists: 簇数量，通常取 sqrt(N) 量级
+            iterations: 迭代次数
+            seed: 随机种子
+        """
+        data = self.vectors
+        if len(data) == 0:
+            return
+        n_lists = min(n_lists, len(data))
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(len(data), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(data @ centroids.T, axis=1)
+            for k in range(n_lists):
+                members = data[assignments == k]
+                if len(members):
+                    centroids[k] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+        self._centroids = centroids
+        self._assignments = np.argmax(data @ centroids.T, axis=1).astype(np.int32)
+
+    def search(self, query: str, top_k: int = 5, n_probe: int = 8) -> List[Tuple[int, float]]:
+        """
+        检索单个查询
+
+        Args:
+            query: 查询文本
+            top_k: 返回结果数
+            n_probe: IVF 模式下检索的簇数
+
+        Returns:
+            [(向量下标, 余弦相似度)]，按相似度从高到低排列
+        """
+        return self.search_batch([query], top_k=top_k, n_probe=n_probe)[0]
+
+    def search_batch(self, queries: List[str], top_k: int = 5,
+                     n_probe: int = 8) -> List[List[Tuple[int, float]]]:
+        """
+        批量检索
+
+        Args:
+            queries: 查询文本列表
+            top_k: 每个查询返回的结果数
+            n_probe: IVF 模式下检索的簇数
+
+        Returns:
+            每个查询的 [(向量下标, 余弦相似度)]
+        """
+        if self._size == 0 or not queries:
+            return [[] for _ in queries]
+        query_vectors = _normalize(self.embed_fn(list(queries)))
+        data = self.vectors
+
+        if self._centroids is None:
+            # 精确检索：一次矩阵乘法得到 (查询数, 文档数) 的相似度
+            return [self._top_k(row, np.arange(self._size), top_k) for row in query_vectors @ data.T]
+
+        results = []
+        probes = np.argsort(-(query_vectors @ self._centroids.T), axis=1)[:, :n_probe]
+        for q, clusters in zip(query_vectors, probes):
+            candidates = np.nonzero(np.isin(self._assignments, clusters))[0]
+            results.append(self._top_k(data[candidates] @ q, candidates, top_k))
+        return results
+
+    @staticmethod
+    def _top_k(scores: "np.ndarray", candidates: "np.ndarray", top_k: int) -> List[Tuple[int, float]]:
+        if len(scores) == 0:
+            return []
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    def save(self, path: str):
+        """
+        保存到 .npz 文件
+
+        Args:
+            path: 文件路径
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        arrays = {
+            "vectors": self.vectors,
+            "ids": np.array(self.ids, dtype=str),
+            "embedder": np.array(embedder_name(self.embed_fn)),
+            "fingerprint": np.array(self.fingerprint),
+            "doc_ids": np.array(self.doc_ids, dtype=np.int64),
+        }
+        if self._centroids is not None:
+            arrays["centroids"] = self._centroids
+            arrays["assignments"] = self._assignments
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, embed_fn: Optional[EmbedFn] = None, dim: int = 512) -> "VectorIndex":
+        """
+        从 .npz 文件加载
+
+        Args:
+            path: 文件路径
+            embed_fn: 嵌入函数，默认 HashingEmbedder(dim)
+            dim: 向量维度
+
+        Returns:
+            向量索引
+
+        Raises:
+            ValueError: 文件中的向量由其他嵌入函数或维度生成
+            KeyError: 文件缺少必要字段（旧格式）
+        """
+        with np.load(path) as data:
+            vectors = data["vectors"]
+            index = cls(embed_fn=embed_fn, dim=dim)
+            stored = str(data["embedder"])
+            if stored != embedder_name(index.embed_fn) or vectors.shape[1] != dim:
+                raise ValueError(f"向量文件由 {stored}（{vectors.shape[1]} 维）生成，与当前嵌入函数不一致")
+            index.add_vectors(vectors, data["ids"].tolist())
+            if "centroids" in data:
+                index._centroids = data["centroids"]
+                index._assignments = data["assignments"]
+            index.fingerprint = str(data["fingerprint"])
+            index.doc_ids = data["doc_ids"].tolist()
+        return index
+
+
+def load_or_update_index(texts: Iterable[str],
+                         path: Optional[str] = None,
+                         embed_fn: Optional[EmbedFn] = None,
+                         dim: int = 512,
+                         ivf_threshold: int = 50000,
+                         fingerprint: Optional[str] = None,
+                         batch_size: int = 256) -> Tuple[VectorIndex, List[int]]:
+    """
+    增量构建：加载磁盘上的向量，只嵌入新增的文本
+
+    提供 fingerprint 且与向量文件中保存的一致时直接返回，不遍历 texts，
+    磁盘知识库的正文一条都不会解码。否则流式遍历 texts：只保留文本ID，
+    新文本凑满一批就嵌入；已从语料中删除的文本对应的向量会被清除。
+    换了嵌入函数或维度时丢弃旧向量全部重建。
+
+    Args:
+        texts: 当前语料（可以是只遍历一次的迭代器），文档ID即下标
+        path: 向量文件路径，为 None 时只在内存中构建
+        embed_fn: 嵌入函数
+        dim: 向量维度
+        ivf_threshold: 向量数超过该值且尚未训练聚类时自动训练 IVF
+        fingerprint: 语料指纹（如 KnowledgeStore.fingerprint）
+        batch_size: 每批嵌入的文本数
+
+    Returns:
+        (向量索引, 向量下标到文档ID的映射)
+    """
+    index = None
+    if path and os.path.exists(path):
+        try:
+            index = VectorIndex.load(path, embed_fn=embed_fn, dim=dim)
+        except (OSError, ValueError, KeyError):
+            index = None
+    if index is not None and fingerprint and index.fingerprint == fingerprint:
+        return index, index.doc_ids
+    if index is None:
+        index = VectorIndex(embed_fn=embed_fn, dim=dim)
+
+    wanted = {}
+    known = set(index.ids)
+    pending_texts, pending_ids = [], []
+    for i, text in enumerate(texts):
+        tid = text_id(text)
+        if tid in wanted:
+            continue
+        wanted[tid] = i
+        if tid not in known:
+            pending_texts.append(text)
+            pending_ids.append(tid)
+            if len(pending_texts) >= batch_size:
+                index.add(pending_texts, pending_ids, batch_size=batch_size)
+                pending_texts, pending_ids = [], []
+    if pending_texts:
+        index.add(pending_texts, pending_ids, batch_size=batch_size)
+
+    changed = len(index) > len(known)
+    stale = [row for row, tid in enumerate(index.ids) if tid not in wanted]
+    if stale:
+        index.keep([row for row, tid in enumerate(index.ids) if tid in wanted])
+        changed = True
+    if len(index) > ivf_threshold and index._centroids is None:
+        index.train_ivf(n_lists=int(len(index) ** 0.5))
+        changed = True
+
+    index.doc_ids = [wanted[tid] for tid in index.ids]
+    new_fingerprint = fingerprint or ""
+    if new_fingerprint != index.fingerprint:
+        index.fingerprint = new_fingerprint
+        changed = True
+    if changed and path:
+        index.save(path)
+    return index, index.doc_ids
@@ -26,6 +26,10 @@ class Settings(BaseSettings):
     oss_endpoint: str = os.getenv("OSS_ENDPOINT", "")
     oss_bucket_name: str = os.getenv("OSS_BUCKET_NAME", "")
     
+    # 同步配置
+    # 返回的增量游标比实际查询时间提前的秒数，覆盖查询时尚未提交的写入
+    sync_cursor_margin_seconds: int = int(os.getenv("SYNC_CURSOR_MARGIN_SECONDS", "5"))
+    
     @property
     def database_url(self) -> str:
         return f"mysql+pymysql://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import DateTime, create_engine
+from sqlalchemy.dialects.mysql import DATETIME
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -18,6 +19,15 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # 创建基类
 Base = declarative_base()
 
+# 微秒精度的时间列：MySQL 的 DATETIME 默认只精确到秒，同一秒内的多次修改
+# 无法通过 updated_at 区分（影响下载 ETag 和 keyset 翻页）
+PreciseDateTime = DateTime().with_variant(DATETIME(fsp=6), "mysql")
+
+
+def get_session_factory():
+    """获取会话工厂（响应发送期间还要读库的流式接口用它自行创建会话）"""
+    return SessionLocal
+
 
 def get_db():
     """获取数据库会话"""
@@ -1,5 +1,6 @@
 from .user import User
 from .voice_record import VoiceRecord
 from .autobiography import Autobiography
+from .sync_tombstone import SyncTombstone
 
-__all__ = ["User", "VoiceRecord", "Autobiography"]
+__all__ = ["User", "VoiceRecord", "Autobiography", "SyncTombstone"]
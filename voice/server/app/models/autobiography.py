@@ -1,8 +1,8 @@
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Text, Integer, ForeignKey
+from sqlalchemy import Column, String, DateTime, Text, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
-from ..database import Base
+from ..database import Base, PreciseDateTime
 
 
 class Autobiography(Base):
@@ -22,8 +22,14 @@ class Autobiography(Base):
     tags = Column(Text, default="[]")  # JSON字符串
     chapters = Column(Text, default="[]")  # JSON字符串
     generated_at = Column(DateTime, nullable=False)
+    content_hash = Column(String(64), nullable=True)  # 同步内容的 SHA-256，用于跳过未变化的数据
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(PreciseDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # 增量同步按 (user_id, updated_at) 查询变化的数据
+    __table_args__ = (
+        Index("ix_autobiographies_user_updated", "user_id", "updated_at"),
+    )
 
     # 关系
     user = relationship("User", back_populates="autobiographies")
@@ -0,0 +1,23 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, ForeignKey, Index, UniqueConstraint
+
+from ..database import Base, PreciseDateTime
+
+
+class SyncTombstone(Base):
+    """删除记录（墓碑），增量下载时告知其他设备删除本地数据"""
+    __tablename__ = "sync_tombstones"
+
+    VOICE_RECORD = "voice_record"
+    AUTOBIOGRAPHY = "autobiography"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    entity_type = Column(String(20), nullable=False)  # voice_record / autobiography
+    entity_id = Column(String(36), nullable=False)
+    deleted_at = Column(PreciseDateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "entity_type", "entity_id", name="uq_tombstone_entity"),
+        Index("ix_tombstone_user_deleted", "user_id", "deleted_at"),
+    )
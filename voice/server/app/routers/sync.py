@@ -1,23 +1,93 @@
+import hashlib
 import json
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.orm import Session, load_only
 
-from ..database import get_db
+from ..config import settings
+from ..database import get_db, get_session_factory
 from ..models.user import User
 from ..models.voice_record import VoiceRecord
 from ..models.autobiography import Autobiography
+from ..models.sync_tombstone import SyncTombstone
 from ..schemas.sync import (
     SyncUploadRequest, 
     SyncDownloadResponse, 
     SyncStatusResponse,
+    SyncBodiesRequest,
+    SyncBodiesResponse,
+    SyncManifestRequest,
+    SyncManifestResponse,
     VoiceRecordSync,
-    AutobiographySync
+    AutobiographySync,
+    VoiceRecordDownload,
+    AutobiographyDownload
+)
+from ..utils.bulk_upsert import IN_CHUNK_SIZE, OwnershipConflict, bulk_delete, bulk_upsert, fetch_existing
+from ..utils.content_hash import compute_content_hash
+from ..utils.pagination import (
+    InvalidPageToken,
+    decode_page_token,
+    encode_page_token,
+    keyset_after,
+    parse_datetime
 )
 from .auth import get_current_user
 
 router = APIRouter(prefix="/sync", tags=["数据同步"])
 
+# 下载顺序：先语音记录，再自传
+DOWNLOAD_KINDS = (
+    (SyncTombstone.VOICE_RECORD, VoiceRecord),
+    (SyncTombstone.AUTOBIOGRAPHY, Autobiography),
+)
+# 流式下载时每次从数据库取出的行数
+STREAM_BATCH_SIZE = 200
+
+# 分页位置：(数据类型, 上一行 updated_at, 上一行 id)
+PagePosition = Tuple[str, datetime, str]
+
+
+def _voice_record_row(record_data: VoiceRecordSync) -> dict:
+    """语音记录同步数据 -> 列值"""
+    return {
+        "id": record_data.id,
+        "title": record_data.title,
+        "content": record_data.content,
+        "transcription": record_data.transcription,
+        "duration": record_data.duration,
+        "audio_url": record_data.audio_url,
+        "is_processed": record_data.is_processed,
+        "confidence": record_data.confidence,
+        "note": record_data.note,
+        "is_included_in_bio": record_data.is_included_in_bio,
+        "tags": json.dumps(record_data.tags),
+        "timestamp": record_data.timestamp,
+        "content_hash": compute_content_hash(record_data)
+    }
+
+
+def _autobiography_row(auto_data: AutobiographySync) -> dict:
+    """自传同步数据 -> 列值"""
+    return {
+        "id": auto_data.id,
+        "title": auto_data.title,
+        "content": auto_data.content,
+        "summary": auto_data.summary,
+        "word_count": auto_data.word_count,
+        "version": auto_data.version,
+        "status": auto_data.status,
+        "style": auto_data.style,
+        "voice_record_ids": json.dumps(auto_data.voice_record_ids),
+        "tags": json.dumps(auto_data.tags),
+        "chapters": json.dumps(auto_data.chapters),
+        "generated_at": auto_data.generated_at,
+        "content_hash": compute_content_hash(auto_data)
+    }
+
 
 @router.post("/upload", response_model=SyncStatusResponse)
 def upload_data(
@@ -25,85 +95,27 @@ def upload_data(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """上传数据到云端"""
+    """
+    上传数据到云端（批量插入或更新，内容未变化的跳过）
+    
+    响应中带每条数据的内容哈希，客户端保存下来，之后通过 /sync/manifest 比对。
+    """
     try:
-        # 处理语音记录
-        for record_data in data.voice_records:
-            existing = db.query(VoiceRecord).filter(
-                VoiceRecord.id == record_data.id,
-                VoiceRecord.user_id == current_user.id
-            ).first()
-            
-            if existing:
-                # 更新现有记录
-                existing.title = record_data.title
-                existing.content = record_data.content
-                existing.transcription = record_data.transcription
-                existing.duration = record_data.duration
-                existing.audio_url = record_data.audio_url
-                existing.is_processed = record_data.is_processed
-                existing.confidence = record_data.confidence
-                existing.note = record_data.note
-                existing.is_included_in_bio = record_data.is_included_in_bio
-                existing.tags = json.dumps(record_data.tags)
-                existing.timestamp = record_data.timestamp
-            else:
-                # 创建新记录
-                new_record = VoiceRecord(
-                    id=record_data.id,
-                    user_id=current_user.id,
-                    title=record_data.title,
-                    content=record_data.content,
-                    transcription=record_data.transcription,
-                    duration=record_data.duration,
-                    audio_url=record_data.audio_url,
-                    is_processed=record_data.is_processed,
-                    confidence=record_data.confidence,
-                    note=record_data.note,
-                    is_included_in_bio=record_data.is_included_in_bio,
-                    tags=json.dumps(record_data.tags),
-                    timestamp=record_data.timestamp
-                )
-                db.add(new_record)
-        
-        # 处理自传
-        for auto_data in data.autobiographies:
-            existing = db.query(Autobiography).filter(
-                Autobiography.id == auto_data.id,
-                Autobiography.user_id == current_user.id
-            ).first()
-            
-            if existing:
-                # 更新现有自传
-                existing.title = auto_data.title
-                existing.content = auto_data.content
-                existing.summary = auto_data.summary
-                existing.word_count = auto_data.word_count
-                existing.version = auto_data.version
-                existing.status = auto_data.status
-                existing.style = auto_data.style
-                existing.voice_record_ids = json.dumps(auto_data.voice_record_ids)
-                existing.tags = json.dumps(auto_data.tags)
-                existing.chapters = json.dumps(auto_data.chapters)
-                existing.generated_at = auto_data.generated_at
-            else:
-                # 创建新自传
-                new_auto = Autobiography(
-                    id=auto_data.id,
-                    user_id=current_user.id,
-                    title=auto_data.title,
-                    content=auto_data.content,
-                    summary=auto_data.summary,
-                    word_count=auto_data.word_count,
-                    version=auto_data.version,
-                    status=auto_data.status,
-                    style=auto_data.style,
-                    voice_record_ids=json.dumps(auto_data.voice_record_ids),
-                    tags=json.dumps(auto_data.tags),
-                    chapters=json.dumps(auto_data.chapters),
-                    generated_at=auto_data.generated_at
-                )
-                db.add(new_auto)
+        voice_rows = [_voice_record_row(r) for r in data.voice_records]
+        auto_rows = [_autobiography_row(a) for a in data.autobiographies]
+        voice_inserted, voice_updated, voice_unchanged = bulk_upsert(
+            db, VoiceRecord, voice_rows, current_user.id, SyncTombstone.VOICE_RECORD
+        )
+        auto_inserted, auto_updated, auto_unchanged = bulk_upsert(
+            db, Autobiography, auto_rows, current_user.id, SyncTombstone.AUTOBIOGRAPHY
+        )
+        deleted = bulk_delete(
+            db, VoiceRecord, SyncTombstone.VOICE_RECORD,
+            data.deleted_voice_record_ids, current_user.id
+        ) + bulk_delete(
+            db, Autobiography, SyncTombstone.AUTOBIOGRAPHY,
+            data.deleted_autobiography_ids, current_user.id
+        )
         
         db.commit()
         
@@ -112,9 +124,21 @@ def upload_data(
             message="数据上传成功",
             voice_records_count=len(data.voice_records),
             autobiographies_count=len(data.autobiographies),
+            inserted_count=voice_inserted + auto_inserted,
+            updated_count=voice_updated + auto_updated,
+            unchanged_count=voice_unchanged + auto_unchanged,
+            deleted_count=deleted,
+            voice_record_hashes={row["id"]: row["content_hash"] for row in voice_rows},
+            autobiography_hashes={row["id"]: row["content_hash"] for row in auto_rows},
             synced_at=datetime.utcnow()
         )
     
+    except OwnershipConflict as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -123,64 +147,335 @@ def upload_data(
         )
 
 
-@router.get("/download", response_model=SyncDownloadResponse)
+def _json_list(value: Optional[str]) -> list:
+    return json.loads(value) if value else []
+
+
+# 同步字段 -> 从模型取值（只访问对应的列，配合 load_only 不会触发额外查询）
+VOICE_RECORD_FIELDS = {
+    "title": lambda r: r.title,
+    "content": lambda r: r.content or "",
+    "transcription": lambda r: r.transcription,
+    "duration": lambda r: r.duration,
+    "audio_url": lambda r: r.audio_url,
+    "is_processed": lambda r: r.is_processed,
+    "confidence": lambda r: r.confidence,
+    "note": lambda r: r.note,
+    "is_included_in_bio": lambda r: r.is_included_in_bio,
+    "tags": lambda r: _json_list(r.tags),
+    "timestamp": lambda r: r.timestamp,
+    "content_hash": lambda r: r.content_hash,
+}
+AUTOBIOGRAPHY_FIELDS = {
+    "title": lambda a: a.title,
+    "content": lambda a: a.content,
+    "summary": lambda a: a.summary,
+    "word_count": lambda a: a.word_count,
+    "version": lambda a: a.version,
+    "status": lambda a: a.status,
+    "style": lambda a: a.style,
+    "voice_record_ids": lambda a: _json_list(a.voice_record_ids),
+    "tags": lambda a: _json_list(a.tags),
+    "chapters": lambda a: _json_list(a.chapters),
+    "generated_at": lambda a: a.generated_at,
+    "last_modified_at": lambda a: a.updated_at,
+    "content_hash": lambda a: a.content_hash,
+}
+# 字段名与列名不同的
+FIELD_COLUMNS = {"last_modified_at": "updated_at"}
+
+# fields=metadata：不含大文本列，用于客户端比对差异
+METADATA_EXCLUDED = {
+    SyncTombstone.VOICE_RECORD: {"content", "transcription"},
+    SyncTombstone.AUTOBIOGRAPHY: {"content", "chapters"},
+}
+
+SYNC_FIELDS = {
+    SyncTombstone.VOICE_RECORD: (VOICE_RECORD_FIELDS, VoiceRecordSync, VoiceRecordDownload),
+    SyncTombstone.AUTOBIOGRAPHY: (AUTOBIOGRAPHY_FIELDS, AutobiographySync, AutobiographyDownload),
+}
+
+# 每种数据类型下载的字段（None 表示全部）
+Projection = Dict[str, Optional[List[str]]]
+
+
+def _to_sync(kind: str, row):
+    """模型 -> 完整同步数据"""
+    fields, full_schema, _ = SYNC_FIELDS[kind]
+    return full_schema(id=row.id, **{name: get(row) for name, get in fields.items()})
+
+
+def _to_download(kind: str, row, fields: Optional[List[str]]):
+    """模型 -> 下载数据（只包含请求的字段）"""
+    getters, _, download_schema = SYNC_FIELDS[kind]
+    names = getters if fields is None else fields
+    return download_schema(id=row.id, **{name: getters[name](row) for name in names})
+
+
+def _parse_fields(fields: Optional[str]) -> Projection:
+    """
+    解析 fields 参数
+    
+    - 不传：全部字段
+    - metadata：除大文本列外的全部字段
+    - 逗号分隔的字段名：每种数据类型只取其中属于它的字段
+    
+    Raises:
+        HTTPException: 有不认识的字段
+    """
+    if not fields:
+        return {kind: None for kind in SYNC_FIELDS}
+    if fields.strip() == "metadata":
+        return {
+            kind: [name for name in getters if name not in METADATA_EXCLUDED[kind]]
+            for kind, (getters, _, _) in SYNC_FIELDS.items()
+        }
+    requested = [name.strip() for name in fields.split(",") if name.strip() and name.strip() != "id"]
+    known = set().union(*(getters for getters, _, _ in SYNC_FIELDS.values()))
+    unknown = [name for name in requested if name not in known]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"未知字段: {', '.join(unknown)}"
+        )
+    return {
+        kind: [name for name in requested if name in getters]
+        for kind, (getters, _, _) in SYNC_FIELDS.items()
+    }
+
+
+def _changed_rows(db: Session, model, user_id: str, since: Optional[datetime],
+                  position: Optional[PagePosition] = None, fields: Optional[List[str]] = None):
+    """
+    当前用户在 since 之后变化的数据，按 (updated_at, id) 排序，从 position 之后开始
+    
+    指定 fields 时用 load_only 只查询对应的列（以及翻页需要的 id / updated_at），
+    大文本列不会从数据库读出。
+    """
+    query = db.query(model).filter(model.user_id == user_id)
+    if fields is not None:
+        columns = {FIELD_COLUMNS.get(name, name) for name in fields} | {"updated_at"}
+        query = query.options(load_only(*(getattr(model, c) for c in sorted(columns))))
+    if since is not None:
+        query = query.filter(model.updated_at >= since)
+    if position is not None:
+        query = query.filter(keyset_after(model, position[1], position[2]))
+    return query.order_by(model.updated_at, model.id)
+
+
+def _remaining_kinds(position: Optional[PagePosition]):
+    """从分页位置开始还需要读取的数据类型，以及每种类型的起始位置"""
+    started = position is None
+    for kind, model in DOWNLOAD_KINDS:
+        if not started and kind == position[0]:
+            started = True
+            yield kind, model, position
+        elif started:
+            yield kind, model, None
+
+
+def _read_page(db: Session, user_id: str, since: Optional[datetime],
+               position: Optional[PagePosition], page_size: Optional[int], projection: Projection):
+    """
+    读取一页数据
+    
+    Returns:
+        ({数据类型: [行]}, 下一页位置)，没有下一页时位置为 None
+    """
+    rows = {kind: [] for kind, _ in DOWNLOAD_KINDS}
+    remaining = page_size
+    for kind, model, start in _remaining_kinds(position):
+        query = _changed_rows(db, model, user_id, since, start, projection[kind])
+        if remaining is None:
+            rows[kind] = query.all()
+            continue
+        # 多取一行判断这种类型是否还有剩余
+        fetched = query.limit(remaining + 1).all()
+        rows[kind] = fetched[:remaining]
+        if len(fetched) > remaining or (len(fetched) == remaining and kind != DOWNLOAD_KINDS[-1][0]):
+            last = rows[kind][-1]
+            return rows, (kind, last.updated_at, last.id)
+        remaining -= len(fetched)
+    return rows, None
+
+
+def _deleted_ids(db: Session, user_id: str, since: Optional[datetime]) -> dict:
+    """since 之后删除的记录 id（全量下载不需要墓碑）"""
+    deleted = {kind: [] for kind, _ in DOWNLOAD_KINDS}
+    if since is None:
+        return deleted
+    tombstones = db.query(SyncTombstone.entity_type, SyncTombstone.entity_id).filter(
+        SyncTombstone.user_id == user_id,
+        SyncTombstone.deleted_at >= since
+    )
+    for entity_type, entity_id in tombstones:
+        deleted.setdefault(entity_type, []).append(entity_id)
+    return deleted
+
+
+def _stream_ndjson(session_factory, user_id: str, since: Optional[datetime], cursor: datetime,
+                   position: Optional[PagePosition], projection: Projection,
+                   include_deleted: bool) -> Iterator[str]:
+    """
+    逐行输出 NDJSON：每行一条数据 {"type": ..., "data": ...}，
+    删除记录 {"type": "deleted", "entity_type": ..., "id": ...}，
+    最后一行 {"type": "end", "synced_at": ...}
+    
+    用 yield_per 分批从数据库读取，服务端内存占用与数据量无关。
+    响应发送期间请求的会话可能已经关闭，这里由 session_factory 创建独立的会话。
+    """
+    db = session_factory()
+    try:
+        for kind, model, start in _remaining_kinds(position):
+            query = _changed_rows(db, model, user_id, since, start, projection[kind])
+            for row in query.yield_per(STREAM_BATCH_SIZE):
+                data = _to_download(kind, row, projection[kind]).model_dump(mode="json", exclude_unset=True)
+                line = {"type": kind, "data": data}
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+        if include_deleted:
+            for kind, ids in _deleted_ids(db, user_id, since).items():
+                for entity_id in ids:
+                    yield json.dumps({"type": "deleted", "entity_type": kind, "id": entity_id}) + "\n"
+        yield json.dumps({"type": "end", "synced_at": cursor.isoformat()}) + "\n"
+    finally:
+        db.close()
+
+
+def _download_etag(db: Session, user_id: str, since: Optional[datetime], request_key: list) -> str:
+    """
+    下载结果的 ETag
+    
+    由请求参数和各表的 (行数, 最大 updated_at) 计算，只走 (user_id, updated_at) 索引，
+    不读取数据本身。任何写入都会更新 updated_at 或改变行数（删除另有墓碑），ETag 随之变化；
+    updated_at / deleted_at 为微秒精度（PreciseDateTime），同一秒内的多次修改也能区分。
+    响应中的 synced_at 每次不同，因此是弱 ETag。
+    """
+    parts = [user_id, *request_key]
+    for _, model in DOWNLOAD_KINDS:
+        query = db.query(func.count(model.id), func.max(model.updated_at)).filter(model.user_id == user_id)
+        if since is not None:
+            query = query.filter(model.updated_at >= since)
+        parts.extend(query.one())
+    parts.extend(db.query(func.count(SyncTombstone.id), func.max(SyncTombstone.deleted_at)).filter(
+        SyncTombstone.user_id == user_id
+    ).one())
+    digest = hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否命中（弱比较）"""
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in (t.strip() for t in if_none_match.split(",")):
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == opaque:
+            return True
+    return False
+
+
+@router.get("/download", response_model=SyncDownloadResponse, response_model_exclude_unset=True)
 def download_data(
+    response: Response,
+    since: Optional[datetime] = Query(None, description="上次下载返回的 synced_at，只返回之后变化的数据"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="每页条数，不传时一次返回全部"),
+    page_token: Optional[str] = Query(None, description="上一页返回的 next_page_token"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json 或 ndjson（流式逐行输出全部数据，不分页）"),
+    fields: Optional[str] = Query(None, description="只返回这些字段（逗号分隔），metadata 表示不含正文等大文本"),
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    session_factory=Depends(get_session_factory)
 ):
-    """从云端下载数据"""
-    try:
-        # 获取语音记录
-        voice_records = db.query(VoiceRecord).filter(
-            VoiceRecord.user_id == current_user.id
-        ).all()
-        
-        voice_records_data = [
-            VoiceRecordSync(
-                id=r.id,
-                title=r.title,
-                content=r.content or "",
-                transcription=r.transcription,
-                duration=r.duration,
-                audio_url=r.audio_url,
-                is_processed=r.is_processed,
-                confidence=r.confidence,
-                note=r.note,
-                is_included_in_bio=r.is_included_in_bio,
-                tags=json.loads(r.tags) if r.tags else [],
-                timestamp=r.timestamp
+    """
+    从云端下载数据
+    
+    不带 since 时返回全部数据；带 since 时只返回 updated_at >= since 的数据，
+    以及之后删除的记录 id。返回的 synced_at 在查询之前取得并提前一小段时间，
+    查询期间提交的写入会在下次增量下载中返回（可能重复，但不会遗漏）。
+    
+    分页按 (updated_at, id) 做 keyset 翻页：带上 next_page_token 请求下一页，
+    直到 next_page_token 为空。since 和 synced_at 记录在分页标记中，
+    翻页期间保持不变，最后一页的 synced_at 即下次增量下载的 since。
+    删除记录只在第一页返回。format=ndjson 时一次流式返回全部数据，不接受 page_size。
+    
+    fields 只影响数据库读取的列和返回的字段（id 总是返回）；客户端可以先用
+    fields=metadata 比对差异，再通过 /sync/bodies 获取缺少的正文。
+    
+    响应带 ETag；请求头 If-None-Match 与之相同时返回 304，不读取数据。
+    """
+    projection = _parse_fields(fields)
+    if format == "ndjson" and page_size is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ndjson 格式不分页，不能指定 page_size"
+        )
+    
+    # 分页状态在第一页确定
+    position: Optional[PagePosition] = None
+    if page_token:
+        try:
+            state = decode_page_token(page_token)
+            since = parse_datetime(state.get("since"))
+            cursor = parse_datetime(state["cursor"])
+            position = (state["kind"], parse_datetime(state["updated_at"]), state["id"])
+            if position[0] not in SYNC_FIELDS:
+                raise InvalidPageToken(position[0])
+        except (InvalidPageToken, KeyError, TypeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="无效的分页标记"
             )
-            for r in voice_records
-        ]
+    else:
+        cursor = datetime.utcnow() - timedelta(seconds=settings.sync_cursor_margin_seconds)
+        if since is not None and since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    try:
+        etag = _download_etag(db, current_user.id, since, [
+            since, page_token, page_size, format, fields
+        ])
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"下载失败: {str(e)}"
+        )
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_ndjson(session_factory, current_user.id, since, cursor, position, projection,
+                           include_deleted=not page_token),
+            media_type="application/x-ndjson",
+            headers={"ETag": etag}
+        )
+    
+    try:
+        rows, next_position = _read_page(db, current_user.id, since, position, page_size, projection)
+        deleted = _deleted_ids(db, current_user.id, since if not page_token else None)
         
-        # 获取自传
-        autobiographies = db.query(Autobiography).filter(
-            Autobiography.user_id == current_user.id
-        ).all()
+        items = {
+            kind: [_to_download(kind, row, projection[kind]) for row in kind_rows]
+            for kind, kind_rows in rows.items()
+        }
         
-        autobiographies_data = [
-            AutobiographySync(
-                id=a.id,
-                title=a.title,
-                content=a.content,
-                summary=a.summary,
-                word_count=a.word_count,
-                version=a.version,
-                status=a.status,
-                style=a.style,
-                voice_record_ids=json.loads(a.voice_record_ids) if a.voice_record_ids else [],
-                tags=json.loads(a.tags) if a.tags else [],
-                chapters=json.loads(a.chapters) if a.chapters else [],
-                generated_at=a.generated_at,
-                last_modified_at=a.updated_at
-            )
-            for a in autobiographies
-        ]
+        next_page_token = None
+        if next_position is not None:
+            kind, updated_at, last_id = next_position
+            next_page_token = encode_page_token({
+                "since": since, "cursor": cursor,
+                "kind": kind, "updated_at": updated_at, "id": last_id
+            })
         
         return SyncDownloadResponse(
-            voice_records=voice_records_data,
-            autobiographies=autobiographies_data,
-            synced_at=datetime.utcnow()
+            voice_records=items[SyncTombstone.VOICE_RECORD],
+            autobiographies=items[SyncTombstone.AUTOBIOGRAPHY],
+            deleted_voice_record_ids=deleted[SyncTombstone.VOICE_RECORD],
+            deleted_autobiography_ids=deleted[SyncTombstone.AUTOBIOGRAPHY],
+            next_page_token=next_page_token,
+            synced_at=cursor
         )
     
     except Exception as e:
@@ -188,3 +483,74 @@ def download_data(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"下载失败: {str(e)}"
         )
+
+
+@router.post("/bodies", response_model=SyncBodiesResponse)
+def download_bodies(
+    data: SyncBodiesRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """按 id 批量获取完整数据（配合 /sync/download?fields=metadata 使用）"""
+    try:
+        result = {}
+        for kind, model in DOWNLOAD_KINDS:
+            ids = list(dict.fromkeys(
+                data.voice_record_ids if kind == SyncTombstone.VOICE_RECORD else data.autobiography_ids
+            ))
+            rows = []
+            for i in range(0, len(ids), IN_CHUNK_SIZE):
+                rows.extend(db.query(model).filter(
+                    model.user_id == current_user.id,
+                    model.id.in_(ids[i:i + IN_CHUNK_SIZE])
+                ))
+            result[kind] = [_to_sync(kind, row) for row in rows]
+        
+        return SyncBodiesResponse(
+            voice_records=result[SyncTombstone.VOICE_RECORD],
+            autobiographies=result[SyncTombstone.AUTOBIOGRAPHY]
+        )
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"下载失败: {str(e)}"
+        )
+
+
+@router.post("/manifest", response_model=SyncManifestResponse)
+def compare_manifest(
+    data: SyncManifestRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    比对同步清单
+    
+    客户端发送本地数据的 id 和服务端上次返回的 content_hash（本地修改过的不带哈希），
+    服务端返回需要上传的 id：服务端没有、属于其他用户、没有哈希或哈希不同的。
+    之后只需上传这些数据。
+    """
+    try:
+        changed = {}
+        for kind, model in DOWNLOAD_KINDS:
+            entries = data.voice_records if kind == SyncTombstone.VOICE_RECORD else data.autobiographies
+            existing = fetch_existing(db, model, list(dict.fromkeys(e.id for e in entries)))
+            changed[kind] = [
+                e.id for e in entries
+                if e.id not in existing
+                or existing[e.id][0] != current_user.id
+                or not e.content_hash
+                or existing[e.id][1] != e.content_hash
+            ]
+        
+        return SyncManifestResponse(
+            changed_voice_record_ids=changed[SyncTombstone.VOICE_RECORD],
+            changed_autobiography_ids=changed[SyncTombstone.AUTOBIOGRAPHY]
+        )
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"比对失败: {str(e)}"
+        )
@@ -2,13 +2,21 @@ from .auth import UserCreate, UserLogin, UserResponse, TokenResponse
 from .sync import (
     VoiceRecordSync, 
     AutobiographySync, 
+    VoiceRecordDownload,
+    AutobiographyDownload,
     SyncUploadRequest, 
     SyncDownloadResponse,
+    SyncBodiesRequest,
+    SyncBodiesResponse,
+    ManifestEntry,
+    SyncManifestRequest,
+    SyncManifestResponse,
     SyncStatusResponse
 )
 
 __all__ = [
     "UserCreate", "UserLogin", "UserResponse", "TokenResponse",
-    "VoiceRecordSync", "AutobiographySync", "SyncUploadRequest", 
-    "SyncDownloadResponse", "SyncStatusResponse"
+    "VoiceRecordSync", "AutobiographySync", "VoiceRecordDownload", "AutobiographyDownload",
+    "SyncUploadRequest", "SyncDownloadResponse", "SyncBodiesRequest", "SyncBodiesResponse",
+    "ManifestEntry", "SyncManifestRequest", "SyncManifestResponse", "SyncStatusResponse"
 ]
@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
 
 
 class VoiceRecordSync(BaseModel):
@@ -17,6 +17,7 @@ class VoiceRecordSync(BaseModel):
     is_included_in_bio: bool
     tags: List[str]
     timestamp: datetime
+    content_hash: Optional[str] = None  # 服务端计算，上传时忽略
 
 
 class AutobiographySync(BaseModel):
@@ -34,19 +35,90 @@ class AutobiographySync(BaseModel):
     chapters: List[dict]
     generated_at: datetime
     last_modified_at: datetime
+    content_hash: Optional[str] = None  # 服务端计算，上传时忽略
+
+
+class VoiceRecordDownload(BaseModel):
+    """下载的语音记录（按 fields 投影，未请求的字段不返回）"""
+    id: str
+    title: Optional[str] = None
+    content: Optional[str] = None
+    transcription: Optional[str] = None
+    duration: Optional[int] = None
+    audio_url: Optional[str] = None
+    is_processed: Optional[bool] = None
+    confidence: Optional[float] = None
+    note: Optional[str] = None
+    is_included_in_bio: Optional[bool] = None
+    tags: Optional[List[str]] = None
+    timestamp: Optional[datetime] = None
+    content_hash: Optional[str] = None
+
+
+class AutobiographyDownload(BaseModel):
+    """下载的自传（按 fields 投影，未请求的字段不返回）"""
+    id: str
+    title: Optional[str] = None
+    content: Optional[str] = None
+    summary: Optional[str] = None
+    word_count: Optional[int] = None
+    version: Optional[int] = None
+    status: Optional[str] = None
+    style: Optional[str] = None
+    voice_record_ids: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    chapters: Optional[List[dict]] = None
+    generated_at: Optional[datetime] = None
+    last_modified_at: Optional[datetime] = None
+    content_hash: Optional[str] = None
 
 
 class SyncUploadRequest(BaseModel):
     """上传同步请求"""
     voice_records: List[VoiceRecordSync]
     autobiographies: List[AutobiographySync]
+    deleted_voice_record_ids: List[str] = []  # 本地已删除的语音记录
+    deleted_autobiography_ids: List[str] = []  # 本地已删除的自传
 
 
 class SyncDownloadResponse(BaseModel):
     """下载同步响应"""
+    voice_records: List[VoiceRecordDownload]
+    autobiographies: List[AutobiographyDownload]
+    deleted_voice_record_ids: List[str] = []  # since 之后在其他设备上删除的语音记录
+    deleted_autobiography_ids: List[str] = []  # since 之后在其他设备上删除的自传
+    next_page_token: Optional[str] = None  # 为空表示没有下一页
+    synced_at: datetime  # 下次增量下载时作为 since 传回
+
+
+class ManifestEntry(BaseModel):
+    """清单中的一条数据"""
+    id: str
+    content_hash: Optional[str] = None  # 服务端上次返回的哈希；本地修改过或没有时为空
+
+
+class SyncManifestRequest(BaseModel):
+    """同步清单：客户端本地数据的 id 和内容哈希"""
+    voice_records: List[ManifestEntry] = []
+    autobiographies: List[ManifestEntry] = []
+
+
+class SyncManifestResponse(BaseModel):
+    """需要上传的数据 id（服务端没有或内容哈希不同）"""
+    changed_voice_record_ids: List[str]
+    changed_autobiography_ids: List[str]
+
+
+class SyncBodiesRequest(BaseModel):
+    """按 id 批量获取完整数据的请求"""
+    voice_record_ids: List[str] = Field(default=[], max_length=1000)
+    autobiography_ids: List[str] = Field(default=[], max_length=1000)
+
+
+class SyncBodiesResponse(BaseModel):
+    """按 id 批量获取完整数据的响应（不存在或不属于当前用户的 id 忽略）"""
     voice_records: List[VoiceRecordSync]
     autobiographies: List[AutobiographySync]
-    synced_at: datetime
 
 
 class SyncStatusResponse(BaseModel):
@@ -55,4 +127,11 @@ class SyncStatusResponse(BaseModel):
     message: str
     voice_records_count: int
     autobiographies_count: int
+    inserted_count: int = 0  # 新插入的行数
+    updated_count: int = 0  # 更新的已有行数
+    unchanged_count: int = 0  # 内容未变化而跳过的行数
+    deleted_count: int = 0  # 删除的行数
+    # 上传数据的内容哈希 {id: content_hash}，客户端保存后用于 /sync/manifest 比对
+    voice_record_hashes: Dict[str, str] = {}
+    autobiography_hashes: Dict[str, str] = {}
     synced_at: datetime
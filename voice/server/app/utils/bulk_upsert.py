@@ -0,0 +1,194 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, insert, select
+from sqlalchemy.orm import Session
+
+from ..models.sync_tombstone import SyncTombstone
+
+# IN 查询每批的 id 数量，避免超出 max_allowed_packet / SQLite 变量数上限
+IN_CHUNK_SIZE = 500
+# 每条 INSERT 语句写入的行数
+INSERT_BATCH_SIZE = 500
+
+# 更新已有行时保持不变的列
+IMMUTABLE_COLUMNS = ("id", "user_id", "created_at")
+
+
+class OwnershipConflict(ValueError):
+    """要写入的 id 已被其他用户占用"""
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def fetch_existing(db: Session, model, ids: List[str],
+                   chunk_size: int = IN_CHUNK_SIZE) -> Dict[str, Tuple[str, Optional[str]]]:
+    """分批用 IN 查询已存在的 id 及其所属用户、内容哈希"""
+    existing = {}
+    for chunk in _chunks(ids, chunk_size):
+        rows = db.execute(
+            select(model.id, model.user_id, model.content_hash).where(model.id.in_(chunk))
+        )
+        existing.update({row.id: (row.user_id, row.content_hash) for row in rows})
+    return existing
+
+
+def clear_tombstones(db: Session, entity_type: str, ids: List[str], user_id: str):
+    """重新上传的数据不再视为已删除"""
+    for chunk in _chunks(ids, IN_CHUNK_SIZE):
+        db.execute(delete(SyncTombstone).where(
+            SyncTombstone.user_id == user_id,
+            SyncTombstone.entity_type == entity_type,
+            SyncTombstone.entity_id.in_(chunk)
+        ))
+
+
+def bulk_delete(db: Session, model, entity_type: str, ids: List[str], user_id: str) -> int:
+    """
+    批量删除当前用户的数据，并为每条实际删除的记录写入墓碑
+
+    Args:
+        db: 数据库会话
+        model: 模型类
+        entity_type: 墓碑中的数据类型（SyncTombstone.VOICE_RECORD 等）
+        ids: 要删除的 id 列表，不存在或不属于当前用户的忽略
+        user_id: 当前用户 id
+
+    Returns:
+        实际删除的行数
+    """
+    existing = fetch_existing(db, model, list(dict.fromkeys(ids)))
+    owned = [record_id for record_id, (owner_id, _) in existing.items() if owner_id == user_id]
+    if not owned:
+        return 0
+
+    clear_tombstones(db, entity_type, owned, user_id)
+    now = datetime.utcnow()
+    for chunk in _chunks(owned, IN_CHUNK_SIZE):
+        db.execute(delete(model).where(model.user_id == user_id, model.id.in_(chunk)))
+        db.execute(insert(SyncTombstone), [
+            {"user_id": user_id, "entity_type": entity_type, "entity_id": record_id, "deleted_at": now}
+            for record_id in chunk
+        ])
+    return len(owned)
+
+
+def _insert_statement(db: Session, model, rows: List[dict], update_columns: List[str], user_id: str):
+    """
+    按数据库方言生成 "插入，主键冲突时更新" 语句
+
+    冲突的行属于其他用户时不更新（并发上传时事先检查之后才被占用的 id 也不会被改写）。
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(model).values(rows)
+        # ON DUPLICATE KEY UPDATE 不支持 WHERE，逐列判断：
+        # IF(user_id = VALUES(user_id), VALUES(col), col)
+        return stmt.on_duplicate_key_update({
+            c: case((model.user_id == stmt.inserted.user_id, stmt.inserted[c]), else_=getattr(model, c))
+            for c in update_columns
+        })
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(model).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[model.id],
+            set_={c: stmt.excluded[c] for c in update_columns},
+            where=model.user_id == user_id
+        )
+    return None
+
+
+def _check_owner(existing: Dict[str, Tuple[str, Optional[str]]], user_id: str):
+    for record_id, (owner_id, _) in existing.items():
+        if owner_id != user_id:
+            raise OwnershipConflict(f"记录 {record_id} 已存在且不属于当前用户")
+
+
+def bulk_upsert(
+    db: Session,
+    model,
+    rows: List[dict],
+    user_id: str,
+    entity_type: str,
+    batch_size: int = INSERT_BATCH_SIZE
+) -> Tuple[int, int, int]:
+    """
+    批量插入或更新当前用户的数据
+
+    先用 IN 查询一次性取出已存在的 id，再按批执行
+    INSERT ... ON DUPLICATE KEY UPDATE（SQLite / PostgreSQL 使用 ON CONFLICT DO UPDATE），
+    代替逐条 SELECT + UPDATE/INSERT。
+    行中带 content_hash 且与库中一致的不写入，避免无意义的 UPDATE 和 updated_at 变化。
+
+    批量语句不会触发 ORM 的 default / onupdate，created_at / updated_at 在这里显式设置。
+
+    Args:
+        db: 数据库会话
+        model: 模型类（主键为 id，且有 user_id / created_at / updated_at 列）
+        rows: 列值字典列表（可以包含 content_hash），不需要包含 user_id 和时间戳
+        user_id: 当前用户 id
+        entity_type: 墓碑中的数据类型，之前删除过又重新上传的记录会清除墓碑
+        batch_size: 每条语句写入的行数
+
+    Returns:
+        (新插入行数, 更新行数, 内容未变化而跳过的行数)
+
+    Raises:
+        OwnershipConflict: 某个 id 已被其他用户占用
+    """
+    # 同一 id 出现多次时以最后一条为准
+    unique_rows = list({row["id"]: row for row in rows}.values())
+    if not unique_rows:
+        return 0, 0, 0
+
+    existing = fetch_existing(db, model, [row["id"] for row in unique_rows])
+    _check_owner(existing, user_id)
+
+    changed_rows = [
+        row for row in unique_rows
+        if row["id"] not in existing
+        or not row.get("content_hash")
+        or row["content_hash"] != existing[row["id"]][1]
+    ]
+    unchanged = len(unique_rows) - len(changed_rows)
+    if not changed_rows:
+        return 0, 0, unchanged
+
+    # 只有表中不存在的 id 才可能是之前删除过的
+    clear_tombstones(db, entity_type, [row["id"] for row in changed_rows if row["id"] not in existing], user_id)
+
+    now = datetime.utcnow()
+    values = [
+        {**row, "user_id": user_id, "created_at": now, "updated_at": now}
+        for row in changed_rows
+    ]
+    update_columns = [c for c in values[0] if c not in IMMUTABLE_COLUMNS]
+
+    guarded = False
+    for batch in _chunks(values, batch_size):
+        stmt = _insert_statement(db, model, batch, update_columns, user_id)
+        if stmt is not None:
+            db.execute(stmt)
+            guarded = True
+            continue
+        # 其他数据库退化为逐条 merge
+        for row in batch:
+            if row["id"] in existing:
+                row = {k: v for k, v in row.items() if k != "created_at"}
+            db.merge(model(**row))
+
+    if guarded:
+        # 检查之后才被其他用户插入的 id：语句没有改写它们，这里报告冲突
+        inserted_ids = [row["id"] for row in changed_rows if row["id"] not in existing]
+        _check_owner(fetch_existing(db, model, inserted_ids), user_id)
+
+    updated = sum(row["id"] in existing for row in changed_rows)
+    return len(changed_rows) - updated, updated, unchanged
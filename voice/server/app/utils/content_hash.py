@@ -0,0 +1,24 @@
+import hashlib
+import json
+
+from pydantic import BaseModel
+
+# 不参与哈希的字段：主键、哈希本身、服务端维护的时间
+HASH_EXCLUDED_FIELDS = {"id", "content_hash", "last_modified_at"}
+
+
+def compute_content_hash(item: BaseModel) -> str:
+    """
+    计算同步数据的内容哈希
+
+    对同步模型的字段（不含 HASH_EXCLUDED_FIELDS）按 JSON 序列化，
+    键排序、无空白、非 ASCII 字符不转义，取 UTF-8 编码的 SHA-256 十六进制摘要。
+
+    哈希只由服务端计算，客户端不需要（也不应尝试）复现：序列化细节
+    （时间格式、浮点数表示等）在不同平台上很难保证逐字节一致。
+    客户端保存上传响应（voice_record_hashes / autobiography_hashes）或下载数据中的
+    content_hash，本地修改后清空，比对清单时原样发回即可。
+    """
+    data = item.model_dump(mode="json", exclude=HASH_EXCLUDED_FIELDS)
+    raw = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
@@ -0,0 +1,56 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, or_
+
+
+class InvalidPageToken(ValueError):
+    """分页标记无法解析"""
+
+
+def encode_page_token(state: Dict[str, Any]) -> str:
+    """分页状态 -> 不透明的分页标记（URL 安全的 base64）"""
+    raw = json.dumps(state, separators=(",", ":"), default=lambda v: v.isoformat())
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_token(token: str) -> Dict[str, Any]:
+    """
+    分页标记 -> 分页状态
+
+    Raises:
+        InvalidPageToken: 标记被篡改或格式不对
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        state = json.loads(raw)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidPageToken(str(e)) from e
+    if not isinstance(state, dict):
+        raise InvalidPageToken("分页标记格式错误")
+    return state
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """解析分页状态中的时间"""
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError) as e:
+        raise InvalidPageToken(str(e)) from e
+
+
+def keyset_after(model, updated_at: datetime, last_id: str):
+    """
+    (updated_at, id) 严格大于上一页最后一行的条件
+
+    配合 ORDER BY updated_at, id 使用，可以走 (user_id, updated_at) 索引
+    （InnoDB 二级索引隐含主键 id），翻页代价与页码无关。
+    """
+    return or_(
+        model.updated_at > updated_at,
+        and_(model.updated_at == updated_at, model.id > last_id)
+    )
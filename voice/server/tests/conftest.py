@@ -0,0 +1,63 @@
+"""
+测试环境：SQLite 内存数据库代替 MySQL，跳过 JWT 认证
+
+通过 dependency_overrides 替换 get_db 和 get_current_user，
+不会触发应用启动时的 init_db（TestClient 不进入 with 块时不运行 startup 事件）。
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, get_db, get_session_factory
+from app.main import app
+from app.models.user import User
+from app.routers.auth import get_current_user
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as db:
+        db.add_all([User(id="user-1"), User(id="user-2")])
+        db.commit()
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    with session_factory() as session:
+        yield session
+
+
+@pytest.fixture
+def current_user():
+    """修改 current_user["id"] 切换请求的用户"""
+    return {"id": "user-1"}
+
+
+@pytest.fixture
+def client(session_factory, current_user):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def override_get_current_user():
+        return User(id=current_user["id"])
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    yield TestClient(app)
+    app.dependency_overrides.clear()
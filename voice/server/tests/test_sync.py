@@ -0,0 +1,221 @@
+"""数据同步接口测试"""
+import json
+from datetime import datetime
+
+from app.models.voice_record import VoiceRecord
+from app.utils.bulk_upsert import _insert_statement
+
+EPOCH = "2000-01-01T00:00:00"
+
+
+def voice_record(i, **overrides):
+    record = {
+        "id": f"record-{i}",
+        "title": f"记录{i}",
+        "content": "今天讲了小时候的事",
+        "transcription": None,
+        "duration": 1000,
+        "audio_url": None,
+        "is_processed": False,
+        "confidence": None,
+        "note": None,
+        "is_included_in_bio": False,
+        "tags": ["童年"],
+        "timestamp": "2024-01-01T08:00:00"
+    }
+    record.update(overrides)
+    return record
+
+
+def autobiography(i, **overrides):
+    bio = {
+        "id": f"bio-{i}",
+        "title": "我的故事",
+        "content": "第一章",
+        "summary": None,
+        "word_count": 3,
+        "version": 1,
+        "status": "draft",
+        "style": None,
+        "voice_record_ids": [],
+        "tags": [],
+        "chapters": [],
+        "generated_at": "2024-01-01T08:00:00",
+        "last_modified_at": "2024-01-01T08:00:00"
+    }
+    bio.update(overrides)
+    return bio
+
+
+def upload(client, voice_records=(), autobiographies=(), **deleted):
+    return client.post("/sync/upload", json={
+        "voice_records": list(voice_records),
+        "autobiographies": list(autobiographies),
+        **deleted
+    })
+
+
+def test_upload_counts_inserted_updated_unchanged(client):
+    body = upload(client, [voice_record(1), voice_record(2)], [autobiography(1)]).json()
+    assert (body["inserted_count"], body["updated_count"], body["unchanged_count"]) == (3, 0, 0)
+
+    body = upload(client, [voice_record(1), voice_record(2)], [autobiography(1)]).json()
+    assert (body["inserted_count"], body["updated_count"], body["unchanged_count"]) == (0, 0, 3)
+
+    body = upload(client, [voice_record(1, title="改过的标题"), voice_record(2)]).json()
+    assert (body["inserted_count"], body["updated_count"], body["unchanged_count"]) == (0, 1, 1)
+
+
+def test_upload_of_other_users_id_is_conflict(client, current_user, db):
+    upload(client, [voice_record(1)])
+    current_user["id"] = "user-2"
+
+    response = upload(client, [voice_record(1, title="抢占")])
+
+    assert response.status_code == 409
+    assert db.get(VoiceRecord, "record-1").title == "记录1"
+
+
+def test_upsert_statement_does_not_overwrite_other_users_row(db):
+    """事先检查之后才被其他用户占用的 id：冲突时语句本身也不改写这一行"""
+    db.add(VoiceRecord(id="record-1", user_id="user-1", title="原标题", timestamp=datetime(2024, 1, 1)))
+    db.commit()
+
+    now = datetime.utcnow()
+    row = {"id": "record-1", "user_id": "user-2", "title": "抢占", "timestamp": now,
+           "created_at": now, "updated_at": now}
+    db.execute(_insert_statement(db, VoiceRecord, [row], ["title", "updated_at"], "user-2"))
+    db.commit()
+
+    db.expire_all()
+    assert db.get(VoiceRecord, "record-1").title == "原标题"
+
+
+def test_deleted_ids_are_returned_after_since(client):
+    upload(client, [voice_record(1), voice_record(2)], [autobiography(1)])
+    body = upload(client, deleted_voice_record_ids=["record-1", "missing"],
+                  deleted_autobiography_ids=["bio-1"]).json()
+    assert body["deleted_count"] == 2
+
+    body = client.get("/sync/download", params={"since": EPOCH}).json()
+    assert body["deleted_voice_record_ids"] == ["record-1"]
+    assert body["deleted_autobiography_ids"] == ["bio-1"]
+    assert [r["id"] for r in body["voice_records"]] == ["record-2"]
+
+    # 重新上传后不再视为已删除
+    upload(client, [voice_record(1)])
+    body = client.get("/sync/download", params={"since": EPOCH}).json()
+    assert body["deleted_voice_record_ids"] == []
+
+
+def test_keyset_paging_covers_both_kinds(client):
+    upload(client, [voice_record(i) for i in range(5)], [autobiography(i) for i in range(3)])
+
+    seen, token, pages = [], None, 0
+    while True:
+        params = {"page_size": 3}
+        if token:
+            params["page_token"] = token
+        body = client.get("/sync/download", params=params).json()
+        seen += [r["id"] for r in body["voice_records"]] + [a["id"] for a in body["autobiographies"]]
+        pages += 1
+        token = body.get("next_page_token")
+        if not token:
+            break
+
+    assert pages == 3
+    assert sorted(seen) == sorted([f"record-{i}" for i in range(5)] + [f"bio-{i}" for i in range(3)])
+    assert len(seen) == len(set(seen))
+
+
+def test_invalid_page_token_is_rejected(client):
+    response = client.get("/sync/download", params={"page_token": "not-a-token"})
+    assert response.status_code == 400
+
+
+def test_ndjson_streams_rows_tombstones_and_end(client):
+    upload(client, [voice_record(1), voice_record(2)], [autobiography(1)])
+    upload(client, deleted_voice_record_ids=["record-1"])
+
+    response = client.get("/sync/download", params={"since": EPOCH, "format": "ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert [(line["type"], line["data"]["id"]) for line in lines[:2]] == [
+        ("voice_record", "record-2"), ("autobiography", "bio-1")
+    ]
+    assert lines[2] == {"type": "deleted", "entity_type": "voice_record", "id": "record-1"}
+    assert lines[3]["type"] == "end" and lines[3]["synced_at"]
+    assert len(lines) == 4
+
+
+def test_ndjson_rejects_page_size(client):
+    response = client.get("/sync/download", params={"format": "ndjson", "page_size": 10})
+    assert response.status_code == 400
+
+
+def test_metadata_fields_omit_large_text(client):
+    upload(client, [voice_record(1, transcription="转写")], [autobiography(1, chapters=[{"title": "童年"}])])
+
+    body = client.get("/sync/download", params={"fields": "metadata"}).json()
+    record, bio = body["voice_records"][0], body["autobiographies"][0]
+    assert record["title"] == "记录1" and "content" not in record and "transcription" not in record
+    assert bio["title"] == "我的故事" and "content" not in bio and "chapters" not in bio
+
+
+def test_named_fields_include_last_modified_at(client):
+    upload(client, [voice_record(1)], [autobiography(1)])
+
+    body = client.get("/sync/download", params={"fields": "title,last_modified_at"}).json()
+    assert body["voice_records"] == [{"id": "record-1", "title": "记录1"}]
+    bio = body["autobiographies"][0]
+    assert set(bio) == {"id", "title", "last_modified_at"}
+    assert bio["last_modified_at"]
+
+
+def test_unknown_field_is_rejected(client):
+    response = client.get("/sync/download", params={"fields": "title,password"})
+    assert response.status_code == 400
+
+
+def test_bodies_ignore_other_users_ids(client, current_user):
+    upload(client, [voice_record(1)], [autobiography(1)])
+    current_user["id"] = "user-2"
+    upload(client, [voice_record(2)])
+
+    body = client.post("/sync/bodies", json={
+        "voice_record_ids": ["record-1", "record-2", "missing"],
+        "autobiography_ids": ["bio-1"]
+    }).json()
+    assert [r["id"] for r in body["voice_records"]] == ["record-2"]
+    assert body["voice_records"][0]["content"] == "今天讲了小时候的事"
+    assert body["autobiographies"] == []
+
+
+def test_upload_returns_hashes_for_manifest(client):
+    body = upload(client, [voice_record(1), voice_record(2)], [autobiography(1)]).json()
+    hashes = body["voice_record_hashes"]
+    assert set(hashes) == {"record-1", "record-2"}
+    assert set(body["autobiography_hashes"]) == {"bio-1"}
+
+    # 未修改的带上次返回的哈希，本地修改过的不带哈希
+    response = client.post("/sync/manifest", json={
+        "voice_records": [
+            {"id": "record-1", "content_hash": hashes["record-1"]},
+            {"id": "record-2"},
+            {"id": "record-3"}
+        ],
+        "autobiographies": [{"id": "bio-1", "content_hash": body["autobiography_hashes"]["bio-1"]}]
+    })
+    assert response.json() == {"changed_voice_record_ids": ["record-2", "record-3"], "changed_autobiography_ids": []}
+
+
+def test_etag_changes_after_quick_successive_updates(client):
+    upload(client, [voice_record(1)])
+    etag = client.get("/sync/download").headers["ETag"]
+    assert client.get("/sync/download", headers={"If-None-Match": etag}).status_code == 304
+
+    upload(client, [voice_record(1, title="马上又改了")])
+    response = client.get("/sync/download", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag